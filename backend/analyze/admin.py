@@ -1,8 +1,10 @@
-from django.contrib import admin
+from django.contrib import admin, messages
 from django.utils.html import format_html
 from django.urls import reverse
 from django.utils.safestring import mark_safe
-from .models import Complaint
+from .bulk_status import set_complaints_status
+from .email_service import send_status_update_emails
+from .models import EMAIL_SUBMISSION_SOURCES, Complaint
 import logging
 
 logger = logging.getLogger(__name__)
@@ -139,75 +141,73 @@ class ComplaintAdmin(admin.ModelAdmin):
     def save_model(self, request, obj, form, change):
         """Override save to log admin actions"""
         if change:
-            # Get the old instance to check what changed
-            try:
-                old_obj = Complaint.objects.get(pk=obj.pk)
-                changes = []
-                
-                if old_obj.status != obj.status:
-                    old_status_text = dict(obj.STATUS_CHOICES).get(old_obj.status, old_obj.status)
-                    new_status_text = dict(obj.STATUS_CHOICES).get(obj.status, obj.status)
-                    changes.append(f"статус: {old_status_text} → {new_status_text}")
-                
-                if old_obj.importance != obj.importance:
-                    old_importance_text = dict(obj.IMPORTANCE_CHOICES).get(old_obj.importance, old_obj.importance)
-                    new_importance_text = dict(obj.IMPORTANCE_CHOICES).get(obj.importance, obj.importance)
-                    changes.append(f"приоритет: {old_importance_text} → {new_importance_text}")
-                
-                if old_obj.notes != obj.notes:
-                    changes.append("заметки обновлены")
-                
-                if changes:
-                    logger.info(f"Admin {request.user.email} updated complaint {obj.firestore_id}: {', '.join(changes)}")
-                    
-                    # Add admin action to notes if status changed
-                    if old_obj.status != obj.status:
-                        admin_note = f"\n\n[{request.user.email}] Статус изменен с '{old_status_text}' на '{new_status_text}'"
-                        if obj.notes:
-                            obj.notes += admin_note
-                        else:
-                            obj.notes = admin_note.strip()
+            # Compare with the values the object was loaded with, no extra query
+            old_status = obj.get_loaded_value('status', obj.status)
+            old_importance = obj.get_loaded_value('importance', obj.importance)
+            old_notes = obj.get_loaded_value('notes', obj.notes)
+            changes = []
+            
+            if old_status != obj.status:
+                old_status_text = dict(obj.STATUS_CHOICES).get(old_status, old_status)
+                new_status_text = dict(obj.STATUS_CHOICES).get(obj.status, obj.status)
+                changes.append(f"статус: {old_status_text} → {new_status_text}")
             
-            except Complaint.DoesNotExist:
-                pass
+            if old_importance != obj.importance:
+                old_importance_text = dict(obj.IMPORTANCE_CHOICES).get(old_importance, old_importance)
+                new_importance_text = dict(obj.IMPORTANCE_CHOICES).get(obj.importance, obj.importance)
+                changes.append(f"приоритет: {old_importance_text} → {new_importance_text}")
+            
+            if old_notes != obj.notes:
+                changes.append("заметки обновлены")
+            
+            if changes:
+                logger.info(f"Admin {request.user.email} updated complaint {obj.firestore_id}: {', '.join(changes)}")
+                
+                # Add admin action to notes if status changed
+                if old_status != obj.status:
+                    admin_note = f"\n\n[{request.user.email}] Статус изменен с '{old_status_text}' на '{new_status_text}'"
+                    if obj.notes:
+                        obj.notes += admin_note
+                    else:
+                        obj.notes = admin_note.strip()
         
         super().save_model(request, obj, form, change)
     
     # Admin actions
+    def _mark_as(self, request, queryset, status):
+        """Set the status of the selected complaints and report what was done"""
+        status_text = dict(Complaint.STATUS_CHOICES)[status]
+        result = set_complaints_status(queryset, status)
+        logger.info(
+            f"Admin {request.user.email} marked {result.updated} complaints as {status}"
+        )
+        
+        message = f'{result.updated} обращений помечены как "{status_text}"'
+        if result.queued:
+            message += '. Синхронизация с Firestore и email уведомления поставлены в очередь'
+        elif result.updated:
+            message += (
+                f'. Firestore: обновлено {result.firestore_written}'
+                f', ошибок {result.firestore_failed}'
+                f'. Email: отправлено {result.emails_sent}, ошибок {result.emails_failed}'
+            )
+        
+        failed = result.firestore_failed or result.emails_failed
+        self.message_user(request, message, level=messages.WARNING if failed else messages.INFO)
+    
     def mark_as_pending(self, request, queryset):
         """Mark selected complaints as pending"""
-        updated = 0
-        for complaint in queryset:
-            if complaint.status != 'pending':
-                complaint.status = 'pending'
-                complaint.save()
-                updated += 1
-        
-        self.message_user(request, f'{updated} обращений помечены как "В процессе"')
+        self._mark_as(request, queryset, 'pending')
     mark_as_pending.short_description = 'Пометить как "В процессе"'
     
     def mark_as_resolved(self, request, queryset):
         """Mark selected complaints as resolved"""
-        updated = 0
-        for complaint in queryset:
-            if complaint.status != 'resolved':
-                complaint.status = 'resolved'
-                complaint.save()
-                updated += 1
-        
-        self.message_user(request, f'{updated} обращений помечены как "Решено"')
+        self._mark_as(request, queryset, 'resolved')
     mark_as_resolved.short_description = 'Пометить как "Решено"'
     
     def mark_as_cancelled(self, request, queryset):
         """Mark selected complaints as cancelled"""
-        updated = 0
-        for complaint in queryset:
-            if complaint.status != 'cancelled':
-                complaint.status = 'cancelled'
-                complaint.save()
-                updated += 1
-        
-        self.message_user(request, f'{updated} обращений помечены как "Отклонено"')
+        self._mark_as(request, queryset, 'cancelled')
     mark_as_cancelled.short_description = 'Пометить как "Отклонено"'
     
     def sync_from_firestore(self, request, queryset):
@@ -225,16 +225,20 @@ class ComplaintAdmin(admin.ModelAdmin):
     
     def send_email_notifications(self, request, queryset):
         """Send email notifications for selected complaints"""
-        sent = 0
-        for complaint in queryset:
-            if complaint.submission_source in ['website', 'mobile'] and complaint.email:
-                try:
-                    complaint.send_status_update_email()
-                    sent += 1
-                except Exception as e:
-                    logger.error(f"Error sending email for complaint {complaint.firestore_id}: {e}")
+        notifications = [
+            (complaint.get_email_data(), complaint.status, complaint.language)
+            for complaint in queryset
+            if complaint.submission_source in EMAIL_SUBMISSION_SOURCES and complaint.email
+        ]
+        # One connection for the whole selection, failures are logged per recipient
+        results = send_status_update_emails(notifications)
+        sent = sum(results)
+        failed = len(results) - sent
         
-        self.message_user(request, f'Email уведомления отправлены для {sent} обращений')
+        message = f'Email уведомления отправлены для {sent} обращений'
+        if failed:
+            message += f', не удалось отправить: {failed}'
+        self.message_user(request, message, level=messages.WARNING if failed else messages.INFO)
     send_email_notifications.short_description = 'Отправить email уведомления'
 
 
@@ -0,0 +1,88 @@
+"""
+Status changes of many complaints at once (the admin "mark as" actions).
+
+The selected rows are changed with one UPDATE instead of a save() per row.
+The Firestore mirror is updated with WriteBatch commits of up to 500 writes
+and the status emails go out over one SMTP connection. With OUTBOX_ENABLED
+both are queued as outbox messages in the same transaction and delivered in
+bulk in the background, so the action returns right away; the emails then
+follow the outbox digest window and rate limits.
+"""
+import logging
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .email_service import get_recipient_email, send_status_update_emails
+from .models import EMAIL_SUBMISSION_SOURCES, Complaint, OutboxMessage
+from .outbox import FIRESTORE_UPDATE, dispatch_documents_in_background, enqueue_status_emails
+from .services import update_reports
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class BulkStatusResult:
+    updated: int = 0
+    firestore_written: int = 0
+    firestore_failed: int = 0
+    emails_sent: int = 0
+    emails_failed: int = 0
+    # Side effects handed to the outbox instead of being delivered here
+    queued: bool = False
+
+
+def set_complaints_status(queryset, status):
+    """Set ``status`` on every complaint of the queryset that has another one"""
+    result = BulkStatusResult()
+    now = timezone.now()
+
+    with transaction.atomic():
+        complaints = list(queryset.exclude(status=status).select_for_update())
+        if not complaints:
+            return result
+        result.updated = Complaint.objects.filter(pk__in=[c.pk for c in complaints]).update(
+            status=status, updated_at=now
+        )
+        previous_statuses = {complaint.pk: complaint.status for complaint in complaints}
+        for complaint in complaints:
+            complaint.status = status
+            complaint.updated_at = now
+        notify = [c for c in complaints if c.submission_source in EMAIL_SUBMISSION_SOURCES]
+
+        if settings.OUTBOX_ENABLED:
+            _enqueue(complaints, notify, status, previous_statuses)
+            result.queued = True
+            return result
+
+    updates = [(c.firestore_id, {'status': status}) for c in complaints]
+    result.firestore_written, error = update_reports(updates)
+    if error is not None:
+        result.firestore_failed = len(updates) - result.firestore_written
+        logger.error(f"Error syncing {result.firestore_failed} status changes to Firestore: {error}")
+
+    notifications = []
+    for complaint in notify:
+        complaint_data = complaint.get_email_data()
+        if get_recipient_email(complaint_data):
+            notifications.append((complaint_data, status, complaint.language))
+    sent = send_status_update_emails(notifications)
+    result.emails_sent = sum(sent)
+    result.emails_failed = len(sent) - result.emails_sent
+    return result
+
+
+def _enqueue(complaints, notify, status, previous_statuses):
+    messages = [
+        OutboxMessage(kind=FIRESTORE_UPDATE, document_id=c.firestore_id, payload={'status': status})
+        for c in complaints
+    ]
+    OutboxMessage.objects.bulk_create(messages, batch_size=500)
+    dispatch_documents_in_background([c.firestore_id for c in complaints])
+    # Coalesced with other recent changes and sent after the digest window
+    enqueue_status_emails([
+        (c.firestore_id, c.get_email_data(), status, c.language, previous_statuses[c.pk])
+        for c in notify
+    ])
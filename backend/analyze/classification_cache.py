@@ -0,0 +1,71 @@
+"""
+Content-addressed cache for report classifications.
+
+Entries are keyed on the normalized report text plus a version string that
+changes whenever the prompt, model or agency list changes, so a prompt edit
+never serves stale answers. An in-process LRU with TTL sits in front of an
+optional persistent store (SQLite file or a Django cache alias), both from
+analyze/ttl_cache.py.
+"""
+import hashlib
+import re
+import threading
+
+from django.conf import settings
+
+from .ttl_cache import TTLCache, make_store
+
+_PUNCTUATION_RE = re.compile(r"[^\w\s]+")
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_report_text(text):
+    """Collapse case, punctuation and whitespace so near-duplicates share a key."""
+    text = (text or "").casefold().replace("ё", "е")
+    text = _PUNCTUATION_RE.sub(" ", text)
+    return _WHITESPACE_RE.sub(" ", text).strip()
+
+
+def make_cache_key(text, version):
+    """Build the cache key for a report text under a prompt/model version."""
+    normalized = normalize_report_text(text)
+    return hashlib.sha256(f"{version}\x00{normalized}".encode("utf-8")).hexdigest()
+
+
+class ClassificationCache(TTLCache):
+    """Cache of classification results keyed on report text and version."""
+
+    def __init__(self, version, max_entries=10000, ttl=30 * 24 * 3600, store=None):
+        super().__init__("classification", max_entries, ttl, store)
+        self.version = version
+
+    def get(self, text):
+        """Return the cached result for a report text, or None."""
+        return self.get_key(make_cache_key(text, self.version))
+
+    def set(self, text, result):
+        """Store a classification result for a report text."""
+        self.set_key(make_cache_key(text, self.version), result)
+
+    def stats(self):
+        return {**super().stats(), "version": self.version}
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_classification_cache(version):
+    """Return the process-wide cache configured by ``settings.CLASSIFICATION_CACHE``."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                config = settings.CLASSIFICATION_CACHE
+                _cache = ClassificationCache(
+                    version,
+                    max_entries=config.get("MAX_ENTRIES", 10000),
+                    ttl=config.get("TTL", 30 * 24 * 3600),
+                    store=make_store(config, "classification", 10000),
+                )
+    return _cache
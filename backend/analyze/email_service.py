@@ -1,79 +1,139 @@
 import os
 import logging
-from django.core.mail import send_mail
+import re
+from html import escape
+from django.core.mail import EmailMultiAlternatives
 from django.template.loader import render_to_string
-from django.utils.html import strip_tags
 from django.conf import settings
 from firebase_admin import firestore
+from .mail_sender import get_mail_sender
 
 logger = logging.getLogger(__name__)
 
+EMAIL_PATTERN = re.compile(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b')
 
-def get_email_template_content(status, language='ru'):
-    """Get email template content based on status and language"""
-    
-    if language == 'ky':
-        templates = {
-            'pending': {
-                'subject': 'Арызыңыз каралууда - PublicPulse',
-                'title': 'Арызыңыз каралууда',
-                'message': 'Урматтуу жарандар! Сиздин арызыңыз биздин тарабыбызга келип жетти жана азыр каралууда.'
-            },
-            'resolved': {
-                'subject': 'Арызыңыз чечилди - PublicPulse',
-                'title': 'Арызыңыз ийгиликтүү чечилди',
-                'message': 'Урматтуу жарандар! Сиздин арызыңыз ийгиликтүү каралып, тийиштүү чаралар көрүлдү.'
-            },
-            'cancelled': {
-                'subject': 'Арызыңыз четке кагылды - PublicPulse',
-                'title': 'Арызыңыз четке кагылды',
-                'message': 'Урматтуу жарандар! Тилекке каршы, сиздин арызыңыз четке кагылды.'
-            }
+SITE_URL = 'https://publicpulse-front-739844766362.asia-southeast2.run.app/'
+
+EMAIL_LANGUAGES = ('ru', 'ky')
+EMAIL_STATUSES = ('pending', 'resolved', 'cancelled')
+
+EMAIL_TEXTS = {
+    'ky': {
+        'pending': {
+            'subject': 'Арызыңыз каралууда - PublicPulse',
+            'title': 'Арызыңыз каралууда',
+            'message': 'Урматтуу жарандар! Сиздин арызыңыз биздин тарабыбызга келип жетти жана азыр каралууда.'
+        },
+        'resolved': {
+            'subject': 'Арызыңыз чечилди - PublicPulse',
+            'title': 'Арызыңыз ийгиликтүү чечилди',
+            'message': 'Урматтуу жарандар! Сиздин арызыңыз ийгиликтүү каралып, тийиштүү чаралар көрүлдү.'
+        },
+        'cancelled': {
+            'subject': 'Арызыңыз четке кагылды - PublicPulse',
+            'title': 'Арызыңыз четке кагылды',
+            'message': 'Урматтуу жарандар! Тилекке каршы, сиздин арызыңыз четке кагылды.'
         }
-    else:  # default Russian
-        templates = {
-            'pending': {
-                'subject': 'Ваше обращение обрабатывается - PublicPulse',
-                'title': 'Ваше обращение принято в обработку',
-                'message': 'Уважаемый гражданин! Ваше обращение поступило к нам и находится в процессе рассмотрения.'
-            },
-            'resolved': {
-                'subject': 'Ваше обращение решено - PublicPulse',
-                'title': 'Ваше обращение успешно решено',
-                'message': 'Уважаемый гражданин! Ваше обращение было успешно рассмотрено и по нему приняты соответствующие меры.'
-            },
-            'cancelled': {
-                'subject': 'Ваше обращение отклонено - PublicPulse',
-                'title': 'Ваше обращение отклонено',
-                'message': 'Уважаемый гражданин! К сожалению, ваше обращение было отклонено.'
-            }
+    },
+    'ru': {
+        'pending': {
+            'subject': 'Ваше обращение обрабатывается - PublicPulse',
+            'title': 'Ваше обращение принято в обработку',
+            'message': 'Уважаемый гражданин! Ваше обращение поступило к нам и находится в процессе рассмотрения.'
+        },
+        'resolved': {
+            'subject': 'Ваше обращение решено - PublicPulse',
+            'title': 'Ваше обращение успешно решено',
+            'message': 'Уважаемый гражданин! Ваше обращение было успешно рассмотрено и по нему приняты соответствующие меры.'
+        },
+        'cancelled': {
+            'subject': 'Ваше обращение отклонено - PublicPulse',
+            'title': 'Ваше обращение отклонено',
+            'message': 'Уважаемый гражданин! К сожалению, ваше обращение было отклонено.'
         }
-    
+    },
+}
+
+EMAIL_LABELS = {
+    'ru': {
+        'status': 'Статус',
+        'pending': 'В процессе',
+        'resolved': 'Решено',
+        'cancelled': 'Отклонено',
+        'details': 'Детали обращения',
+        'created_at': 'Дата подачи',
+        'report_type': 'Тип обращения',
+        'region': 'Регион',
+        'city': 'Город',
+        'service': 'Услуга',
+        'agency': 'Ведомство',
+        'report_text': 'Текст обращения',
+        'notes': 'Примечания',
+        'regards': 'С уважением',
+        'team': 'Команда PublicPulse',
+        'automatic': 'Это автоматическое уведомление. Не отвечайте на данное письмо.',
+        'site': 'Перейти на сайт',
+    },
+    'ky': {
+        'status': 'Абал',
+        'pending': 'Каралууда',
+        'resolved': 'Чечилди',
+        'cancelled': 'Четке кагылды',
+        'details': 'Арыздын чоо-жайы',
+        'created_at': 'Берилген күнү',
+        'report_type': 'Арыздын түрү',
+        'region': 'Аймак',
+        'city': 'Шаар',
+        'service': 'Кызмат',
+        'agency': 'Мекеме',
+        'report_text': 'Арыздын тексти',
+        'notes': 'Эскертүүлөр',
+        'regards': 'Сый менен',
+        'team': 'PublicPulse командасы',
+        'automatic': 'Бул автоматтык билдирүү. Бул катка жооп бербеңиз.',
+        'site': 'Сайтка өтүү',
+    },
+}
+
+# Status color mapping
+STATUS_COLORS = {
+    'pending': '#fbbf24',  # amber
+    'resolved': '#10b981',  # green
+    'cancelled': '#ef4444'  # red
+}
+
+
+def normalize_email_language(language):
+    """Language of the email templates for a complaint language ('kg' is Kyrgyz too)"""
+    return 'ky' if language in ('ky', 'kg') else 'ru'
+
+
+def get_email_template_content(status, language='ru'):
+    """Get email template content based on status and language"""
+    templates = EMAIL_TEXTS[normalize_email_language(language)]
     return templates.get(status, templates['pending'])
 
 
-def create_email_html_content(complaint_data, status, language='ru'):
-    """Create HTML email content"""
-    
+# Compiled templates mark the per-complaint fields with \0name\0
+def _slot(name):
+    return f'\0{name}\0'
+
+
+def _compile(source):
+    """Split a template into static text and field names, alternating"""
+    return tuple(source.split('\0'))
+
+
+def _render(parts, values):
+    return ''.join([part if index % 2 == 0 else values[part] for index, part in enumerate(parts)])
+
+
+def _build_html(status, language):
     template_content = get_email_template_content(status, language)
+    labels = EMAIL_LABELS[language]
+    status_text = labels.get(status, labels['pending'])
     
-    # Get status text in the appropriate language
-    status_texts = {
-        'pending': 'В процессе' if language == 'ru' else 'Каралууда',
-        'resolved': 'Решено' if language == 'ru' else 'Чечилди', 
-        'cancelled': 'Отклонено' if language == 'ru' else 'Четке кагылды'
-    }
-    
-    status_text = status_texts.get(status, status_texts['pending'])
-    
-    # Status color mapping
-    status_colors = {
-        'pending': '#fbbf24',  # amber
-        'resolved': '#10b981',  # green
-        'cancelled': '#ef4444'  # red
-    }
-    
-    html_content = f"""
+    return f"""
     <!DOCTYPE html>
     <html lang="{language}">
     <head>
@@ -121,7 +181,7 @@ def create_email_html_content(complaint_data, status, language='ru'):
                 color: white;
                 font-weight: 500;
                 font-size: 14px;
-                background-color: {status_colors.get(status, '#6b7280')};
+                background-color: {STATUS_COLORS.get(status, '#6b7280')};
                 margin-bottom: 20px;
             }}
             .message {{
@@ -180,7 +240,7 @@ def create_email_html_content(complaint_data, status, language='ru'):
             <div class="header">
                 <div class="logo">🏛️ PublicPulse</div>
                 <div class="title">{template_content['title']}</div>
-                <div class="status-badge">{'Статус' if language == 'ru' else 'Абал'}: {status_text}</div>
+                <div class="status-badge">{labels['status']}: {status_text}</div>
             </div>
             
             <div class="message">
@@ -188,128 +248,266 @@ def create_email_html_content(complaint_data, status, language='ru'):
             </div>
             
             <div class="complaint-details">
-                <h3 style="margin-top: 0; color: #374151;">{'Детали обращения' if language == 'ru' else 'Арыздын чоо-жайы'}:</h3>
+                <h3 style="margin-top: 0; color: #374151;">{labels['details']}:</h3>
                 
                 <div class="detail-row">
                     <div class="detail-label">ID:</div>
-                    <div class="detail-value">#{complaint_data.get('id', 'N/A')}</div>
+                    <div class="detail-value">#{_slot('id')}</div>
                 </div>
                 
                 <div class="detail-row">
-                    <div class="detail-label">{'Дата подачи' if language == 'ru' else 'Берилген күнү'}:</div>
-                    <div class="detail-value">{complaint_data.get('created_at', 'N/A')}</div>
+                    <div class="detail-label">{labels['created_at']}:</div>
+                    <div class="detail-value">{_slot('created_at')}</div>
                 </div>
                 
                 <div class="detail-row">
-                    <div class="detail-label">{'Тип обращения' if language == 'ru' else 'Арыздын түрү'}:</div>
-                    <div class="detail-value">{complaint_data.get('report_type', 'N/A')}</div>
+                    <div class="detail-label">{labels['report_type']}:</div>
+                    <div class="detail-value">{_slot('report_type')}</div>
                 </div>
                 
                 <div class="detail-row">
-                    <div class="detail-label">{'Регион' if language == 'ru' else 'Аймак'}:</div>
-                    <div class="detail-value">{complaint_data.get('region', 'N/A')}</div>
+                    <div class="detail-label">{labels['region']}:</div>
+                    <div class="detail-value">{_slot('region')}</div>
                 </div>
                 
                 <div class="detail-row">
-                    <div class="detail-label">{'Город' if language == 'ru' else 'Шаар'}:</div>
-                    <div class="detail-value">{complaint_data.get('city', 'N/A')}</div>
+                    <div class="detail-label">{labels['city']}:</div>
+                    <div class="detail-value">{_slot('city')}</div>
                 </div>
                 
-                {f'''<div class="detail-row">
-                    <div class="detail-label">{'Услуга' if language == 'ru' else 'Кызмат'}:</div>
-                    <div class="detail-value">{complaint_data.get('service', 'N/A')}</div>
-                </div>''' if complaint_data.get('service') else ''}
+                {_slot('service_row')}
                 
-                {f'''<div class="detail-row">
-                    <div class="detail-label">{'Ведомство' if language == 'ru' else 'Мекеме'}:</div>
-                    <div class="detail-value">{complaint_data.get('agency', 'N/A')}</div>
-                </div>''' if complaint_data.get('agency') else ''}
+                {_slot('agency_row')}
             </div>
             
             <div class="complaint-text">
-                <strong>{'Текст обращения' if language == 'ru' else 'Арыздын тексти'}:</strong><br>
-                {complaint_data.get('report_text', 'N/A')}
+                <strong>{labels['report_text']}:</strong><br>
+                {_slot('report_text')}
             </div>
             
-            {f'''<div style="margin-top: 20px; padding: 15px; background: #fef3c7; border-radius: 8px; border-left: 4px solid #f59e0b;">
-                <strong>{'Примечания' if language == 'ru' else 'Эскертүүлөр'}:</strong><br>
-                {complaint_data.get('notes', '')}
-            </div>''' if complaint_data.get('notes') else ''}
+            {_slot('notes_block')}
             
             <div class="footer">
-                <p>{'С уважением' if language == 'ru' else 'Сый менен'},<br>
-                {'Команда PublicPulse' if language == 'ru' else 'PublicPulse командасы'}</p>
+                <p>{labels['regards']},<br>
+                {labels['team']}</p>
                 
                 <p style="margin-top: 15px;">
-                    {'Это автоматическое уведомление. Не отвечайте на данное письмо.' if language == 'ru' else 'Бул автоматтык билдирүү. Бул катка жооп бербеңиз.'}
+                    {labels['automatic']}
                 </p>
                 
                 <p style="margin-top: 10px;">
-                    <a href="https://publicpulse-front-739844766362.asia-southeast2.run.app/">{'Перейти на сайт' if language == 'ru' else 'Сайтка өтүү'}</a>
+                    <a href="{SITE_URL}">{labels['site']}</a>
                 </p>
             </div>
         </div>
     </body>
     </html>
     """
+
+
+def _build_html_optional(language):
+    labels = EMAIL_LABELS[language]
+    return {
+        'service_row': f'''<div class="detail-row">
+                    <div class="detail-label">{labels['service']}:</div>
+                    <div class="detail-value">{_slot('service')}</div>
+                </div>''',
+        'agency_row': f'''<div class="detail-row">
+                    <div class="detail-label">{labels['agency']}:</div>
+                    <div class="detail-value">{_slot('agency')}</div>
+                </div>''',
+        'notes_block': f'''<div style="margin-top: 20px; padding: 15px; background: #fef3c7; border-radius: 8px; border-left: 4px solid #f59e0b;">
+                <strong>{labels['notes']}:</strong><br>
+                {_slot('notes')}
+            </div>''',
+    }
+
+
+def _build_text(status, language):
+    template_content = get_email_template_content(status, language)
+    labels = EMAIL_LABELS[language]
+    status_text = labels.get(status, labels['pending'])
     
-    return html_content
+    return (
+        f"{template_content['title']}\n"
+        f"{labels['status']}: {status_text}\n"
+        f"\n"
+        f"{template_content['message']}\n"
+        f"\n"
+        f"{labels['details']}:\n"
+        f"ID: #{_slot('id')}\n"
+        f"{labels['created_at']}: {_slot('created_at')}\n"
+        f"{labels['report_type']}: {_slot('report_type')}\n"
+        f"{labels['region']}: {_slot('region')}\n"
+        f"{labels['city']}: {_slot('city')}\n"
+        f"{_slot('service_row')}"
+        f"{_slot('agency_row')}"
+        f"\n"
+        f"{labels['report_text']}:\n"
+        f"{_slot('report_text')}\n"
+        f"{_slot('notes_block')}"
+        f"\n"
+        f"{labels['regards']},\n"
+        f"{labels['team']}\n"
+        f"\n"
+        f"{labels['automatic']}\n"
+        f"{labels['site']}: {SITE_URL}\n"
+    )
 
 
-def send_status_update_email(complaint_data, new_status, language='ru'):
-    """Send email notification when complaint status is updated"""
+def _build_text_optional(language):
+    labels = EMAIL_LABELS[language]
+    return {
+        'service_row': f"{labels['service']}: {_slot('service')}\n",
+        'agency_row': f"{labels['agency']}: {_slot('agency')}\n",
+        'notes_block': f"\n{labels['notes']}:\n{_slot('notes')}\n",
+    }
+
+
+class EmailTemplate:
+    """Status email for one (status, language), compiled once
     
-    try:
-        email = None
+    Only the complaint fields are filled in per message: HTML-escaped for
+    the HTML part, as is for the plain-text part.
+    """
+    
+    # Optional blocks, shown only when their field is set
+    OPTIONAL_FIELDS = {'service_row': 'service', 'agency_row': 'agency', 'notes_block': 'notes'}
+    
+    def __init__(self, status, language):
+        self.subject = get_email_template_content(status, language)['subject']
+        self.html = _compile(_build_html(status, language))
+        self.text = _compile(_build_text(status, language))
+        self.html_optional = {name: _compile(source) for name, source in _build_html_optional(language).items()}
+        self.text_optional = {name: _compile(source) for name, source in _build_text_optional(language).items()}
+    
+    def render(self, complaint_data):
+        """Return ``(subject, plain_text, html)`` for a complaint"""
+        values = {
+            field: str(complaint_data.get(field) or 'N/A')
+            for field in ('id', 'created_at', 'report_type', 'region', 'city', 'report_text')
+        }
+        for field in self.OPTIONAL_FIELDS.values():
+            values[field] = str(complaint_data.get(field) or '')
+        html_values = {field: escape(value) for field, value in values.items()}
         
-        # First, try to get email from the dedicated email field
-        email = complaint_data.get('email')
+        for block, field in self.OPTIONAL_FIELDS.items():
+            if values[field]:
+                values[block] = _render(self.text_optional[block], values)
+                html_values[block] = _render(self.html_optional[block], html_values)
+            else:
+                values[block] = html_values[block] = ''
         
-        # If no email in the dedicated field, try to extract from contact_info as fallback
-        if not email:
-            contact_info = complaint_data.get('contact_info', '')
-            import re
-            email_pattern = r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b'
-            email_matches = re.findall(email_pattern, contact_info)
-            
-            if email_matches:
-                email = email_matches[0]
+        return self.subject, _render(self.text, values), _render(self.html, html_values)
+
+
+# Compiled at import, once per process
+EMAIL_TEMPLATES = {
+    (status, language): EmailTemplate(status, language)
+    for language in EMAIL_LANGUAGES
+    for status in EMAIL_STATUSES
+}
+
+
+def get_email_template(status, language='ru'):
+    """Compiled template for a status and complaint language"""
+    language = normalize_email_language(language)
+    return EMAIL_TEMPLATES.get((status, language)) or EMAIL_TEMPLATES[('pending', language)]
+
+
+def create_email_html_content(complaint_data, status, language='ru'):
+    """Create HTML email content"""
+    return get_email_template(status, language).render(complaint_data)[2]
+
+
+def get_recipient_email(complaint_data):
+    """Email address to notify for a complaint, or None"""
+    # First, try to get email from the dedicated email field
+    email = complaint_data.get('email')
+    
+    # If no email in the dedicated field, try to extract from contact_info as fallback
+    if not email:
+        contact_info = complaint_data.get('contact_info') or ''
+        email_match = EMAIL_PATTERN.search(contact_info)
         
-        if not email:
-            logger.warning(f"No email found for complaint {complaint_data.get('id')}")
+        if email_match:
+            email = email_match.group(0)
+    
+    return email or None
+
+
+def build_status_update_email(complaint_data, new_status, language='ru'):
+    """Build the status update message for a complaint, or None without an address"""
+    email = get_recipient_email(complaint_data)
+    
+    if not email:
+        logger.warning(f"No email found for complaint {complaint_data.get('id')}")
+        return None
+    
+    subject, plain_text, html_content = get_email_template(new_status, language).render(complaint_data)
+    
+    message = EmailMultiAlternatives(
+        subject=subject,
+        body=plain_text,
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=[email],
+    )
+    message.attach_alternative(html_content, 'text/html')
+    return message
+
+
+def send_status_update_email(complaint_data, new_status, language='ru'):
+    """Send email notification when complaint status is updated"""
+    
+    try:
+        message = build_status_update_email(complaint_data, new_status, language)
+        if message is None:
             return False
         
-        # Get template content
-        template_content = get_email_template_content(new_status, language)
-        
-        # Create HTML content
-        html_content = create_email_html_content(complaint_data, new_status, language)
-        
-        # Create plain text version
-        plain_text = strip_tags(html_content)
-        
-        # Send email
-        sent = send_mail(
-            subject=template_content['subject'],
-            message=plain_text,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[email],
-            html_message=html_content,
-            fail_silently=False
-        )
-        
-        if sent:
-            logger.info(f"Status update email sent successfully to {email} for complaint {complaint_data.get('id')}")
-            return True
-        else:
-            logger.error(f"Failed to send status update email to {email} for complaint {complaint_data.get('id')}")
-            return False
+        # Send over the shared persistent connection
+        get_mail_sender().send(message)
+        logger.info(f"Status update email sent successfully to {message.to[0]} for complaint {complaint_data.get('id')}")
+        return True
             
     except Exception as e:
         logger.error(f"Error sending status update email: {str(e)}")
         return False
 
 
+def send_status_update_emails(notifications):
+    """Send many status update emails over one SMTP connection
+    
+    ``notifications`` is a list of ``(complaint_data, new_status, language)``.
+    Returns a list with True or False for every notification; failures are
+    logged per recipient.
+    """
+    if not notifications:
+        return []
+    results = [False] * len(notifications)
+    messages = []
+    for index, (complaint_data, new_status, language) in enumerate(notifications):
+        try:
+            message = build_status_update_email(complaint_data, new_status, language)
+        except Exception as e:
+            logger.error(f"Error building status update email for complaint {complaint_data.get('id')}: {str(e)}")
+            continue
+        if message is not None:
+            messages.append((index, complaint_data, message))
+    
+    errors = get_mail_sender().send_many([message for _, _, message in messages])
+    for (index, complaint_data, message), error in zip(messages, errors):
+        if error is None:
+            results[index] = True
+        else:
+            logger.error(
+                f"Failed to send status update email to {message.to[0]} "
+                f"for complaint {complaint_data.get('id')}: {str(error)}"
+            )
+    
+    logger.info(f"Sent {sum(results)} of {len(notifications)} status update emails")
+    return results
+
+
 def send_complaint_received_email(complaint_data, language='ru'):
     """Send confirmation email when complaint is first received"""
     
@@ -0,0 +1,222 @@
+"""
+Bulk application of Firestore report documents to the Complaint table.
+
+Used by ``sync_firestore --bulk/--incremental`` and ``listen_firestore``.
+Rows are written with bulk_create/bulk_update, which bypass Complaint.save,
+so nothing is echoed back to Firestore; status-change emails are sent
+separately through ``send_status_change_emails`` once the writes have
+committed.
+"""
+import json
+import logging
+from dataclasses import dataclass, field
+
+from django.conf import settings
+from django.db import DataError, IntegrityError, transaction
+from django.utils import timezone
+
+from .email_service import send_status_update_emails
+from .models import EMAIL_SUBMISSION_SOURCES, Complaint, QuarantinedDocument, SyncState, firestore_version
+from .outbox import enqueue_status_emails
+
+logger = logging.getLogger(__name__)
+
+# Statuses whose change is reported to the author by email
+EMAIL_STATUSES = ('pending', 'resolved', 'cancelled')
+
+
+@dataclass
+class ApplyResult:
+    created: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    deleted: int = 0
+    # (complaint, old_status) for every existing row whose status changed
+    status_changes: list = field(default_factory=list)
+    # (firestore_id, error) for every document skipped because its data can
+    # not be stored
+    invalid: list = field(default_factory=list)
+
+
+def apply_firestore_documents(documents, update_existing=True, existing_ids=None, deleted_ids=()):
+    """Create or update complaints from ``{firestore_id: document data}``
+
+    ``existing_ids`` (a set, updated in place) lets callers that already know
+    which ids exist skip the lookup query. Every document goes through
+    Complaint.clean_firestore_fields first; one that can not be stored is
+    logged, listed in ``result.invalid`` and skipped, so it does not fail the
+    bulk writes of the others. When a bulk write is still rejected by the
+    database, the rows are written one at a time and only the rejected ones
+    are skipped. Call inside a transaction.
+    """
+    result = ApplyResult()
+    documents = clean_documents(documents, result.invalid)
+    if existing_ids is None:
+        existing_ids = set(
+            Complaint.objects
+            .filter(firestore_id__in=list(documents))
+            .values_list('firestore_id', flat=True)
+        )
+
+    new_complaints = []
+    documents_to_update = {}
+    for firestore_id, data in documents.items():
+        if firestore_id in existing_ids:
+            documents_to_update[firestore_id] = data
+        else:
+            new_complaints.append(Complaint.from_firestore_data(firestore_id, data))
+
+    changed_complaints = []
+    if update_existing and documents_to_update:
+        now = timezone.now()
+        existing = Complaint.objects.in_bulk(list(documents_to_update), field_name='firestore_id')
+        for firestore_id, complaint in existing.items():
+            data = documents_to_update[firestore_id]
+            version = firestore_version(data)
+            if version and complaint.firestore_updated_at and version < complaint.firestore_updated_at:
+                # Older than what is already applied (e.g. via the webhook)
+                continue
+            old_status = complaint.status
+            changed = complaint.apply_firestore_data(data)
+            if version and version != complaint.firestore_updated_at:
+                complaint.firestore_updated_at = version
+                changed.append('firestore_updated_at')
+            if changed:
+                complaint.updated_at = now
+                changed_complaints.append(complaint)
+                if complaint.status != old_status:
+                    result.status_changes.append((complaint, old_status))
+
+    result.unchanged = len(documents_to_update) - len(changed_complaints)
+    try:
+        with transaction.atomic():
+            write_complaints(new_complaints, changed_complaints)
+    except (DataError, IntegrityError) as e:
+        logger.warning(f"Bulk write of Firestore documents failed ({e}), writing them one at a time")
+        new_complaints = [c for c in new_complaints if write_isolated(c, [c], [], result.invalid)]
+        changed_complaints = [c for c in changed_complaints if write_isolated(c, [], [c], result.invalid)]
+        written = {c.firestore_id for c in changed_complaints}
+        result.status_changes = [
+            (complaint, old_status) for complaint, old_status in result.status_changes
+            if complaint.firestore_id in written
+        ]
+    if deleted_ids:
+        result.deleted, _ = Complaint.objects.filter(firestore_id__in=list(deleted_ids)).delete()
+        existing_ids.difference_update(deleted_ids)
+
+    existing_ids.update(c.firestore_id for c in new_complaints)
+    result.created = len(new_complaints)
+    result.updated = len(changed_complaints)
+    return result
+
+
+def write_complaints(new_complaints, changed_complaints):
+    if new_complaints:
+        # Rows created concurrently (e.g. by the webhook) are left alone
+        Complaint.objects.bulk_create(new_complaints, ignore_conflicts=True)
+    if changed_complaints:
+        Complaint.objects.bulk_update(
+            changed_complaints,
+            list(Complaint.FIRESTORE_FIELD_DEFAULTS) + ['firestore_updated_at', 'updated_at'],
+        )
+
+
+def write_isolated(complaint, new_complaints, changed_complaints, invalid):
+    """Write one row in its own savepoint, return whether the database accepted it"""
+    try:
+        with transaction.atomic():
+            write_complaints(new_complaints, changed_complaints)
+    except (DataError, IntegrityError) as e:
+        logger.error(f"Skipping Firestore document {complaint.firestore_id}: {e}")
+        invalid.append((complaint.firestore_id, str(e)))
+        return False
+    return True
+
+
+def quarantine_documents(source, failures, documents):
+    """Record (firestore_id, error) failures with the data of their documents
+
+    Firestore values JSON can not hold (timestamps, references) are stored
+    as strings.
+    """
+    QuarantinedDocument.objects.bulk_create([
+        QuarantinedDocument(
+            source=source,
+            document_id=firestore_id,
+            data=json.loads(json.dumps(documents.get(firestore_id), default=str)),
+            error=error,
+        )
+        for firestore_id, error in failures
+    ])
+
+
+def advance_sync_watermark(name, updated_at, document_id, synced=0):
+    """Move a SyncState watermark forward to (updated_at, document_id)
+
+    The row is re-read under a lock and only moved forward, so concurrent
+    syncs and the listener never move it back. Call inside a transaction;
+    returns the current state.
+    """
+    state, _ = SyncState.objects.select_for_update().get_or_create(name=name)
+    fields = ['last_run_at']
+    if state.watermark_updated_at is None or (updated_at, document_id) > (
+            state.watermark_updated_at, state.watermark_document_id):
+        state.watermark_updated_at = updated_at
+        state.watermark_document_id = document_id
+        fields += ['watermark_updated_at', 'watermark_document_id']
+    if synced:
+        state.documents_synced += synced
+        fields.append('documents_synced')
+    state.save(update_fields=fields)
+    return state
+
+
+def clean_documents(documents, invalid):
+    """Documents with their mirrored fields coerced to column values
+
+    Documents that can not be stored are left out and appended to
+    ``invalid`` as (firestore_id, error).
+    """
+    max_id_length = Complaint._meta.get_field('firestore_id').max_length
+    cleaned = {}
+    for firestore_id, data in documents.items():
+        try:
+            if len(firestore_id) > max_id_length:
+                raise ValueError(f"document id is longer than {max_id_length} characters")
+            if not isinstance(data, dict):
+                raise ValueError("document data must be an object")
+            # An updated_at that is not a valid date raises ValueError
+            firestore_version(data)
+            cleaned[firestore_id] = {**data, **Complaint.clean_firestore_fields(data)}
+        except ValueError as e:
+            logger.error(f"Skipping Firestore document {firestore_id}: {e}")
+            invalid.append((firestore_id, str(e)))
+    return cleaned
+
+
+def send_status_change_emails(status_changes):
+    """Email authors of complaints whose status changed
+
+    With OUTBOX_ENABLED the emails are queued (coalesced and rate-limited by
+    the outbox) and the number queued is returned, otherwise the number sent.
+    """
+    changes = []
+    for complaint, old_status in status_changes:
+        if (complaint.submission_source not in EMAIL_SUBMISSION_SOURCES
+                or complaint.status not in EMAIL_STATUSES):
+            continue
+        logger.info(
+            f"Status changed for complaint {complaint.firestore_id}: {old_status} -> {complaint.status}"
+        )
+        changes.append((complaint, old_status))
+
+    if settings.OUTBOX_ENABLED:
+        return enqueue_status_emails([
+            (complaint.firestore_id, complaint.get_email_data(), complaint.status, complaint.language, old_status)
+            for complaint, old_status in changes
+        ])
+
+    # Sent over one connection; failures are logged per recipient
+    return sum(send_status_update_emails([
+        (complaint.get_email_data(), complaint.status, complaint.language) for complaint, _ in changes
+    ]))
@@ -0,0 +1,87 @@
+"""
+Normalization of report photos before they are stored.
+
+Phone photos arrive as multi-megabyte JPEG/HEIC-derived files with EXIF
+metadata (including GPS position). Every photo is decoded, rotated according
+to its EXIF orientation, downscaled, and re-encoded as a progressive JPEG
+without metadata. A small thumbnail is produced alongside it for list views.
+"""
+from dataclasses import dataclass
+from io import BytesIO
+
+from django.conf import settings
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+# Formats phones and browsers actually send; anything else is rejected
+ACCEPTED_FORMATS = {"JPEG", "MPO", "PNG", "WEBP", "GIF", "BMP", "TIFF"}
+
+
+@dataclass
+class NormalizedPhoto:
+    data: bytes
+    thumbnail: bytes
+    width: int
+    height: int
+    source_format: str
+    content_type: str = "image/jpeg"
+    extension: str = "jpg"
+
+
+def _encode_jpeg(image, quality):
+    buffer = BytesIO()
+    # No exif= argument, so no metadata is carried over
+    image.save(buffer, format="JPEG", quality=quality, optimize=True, progressive=True)
+    return buffer.getvalue()
+
+
+def _to_rgb(image):
+    if image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info):
+        image = image.convert("RGBA")
+        background = Image.new("RGB", image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel("A"))
+        return background
+    if image.mode != "RGB":
+        return image.convert("RGB")
+    return image
+
+
+def normalize_photo(source):
+    """Decode, orient, downscale and re-encode a photo plus its thumbnail.
+
+    ``source`` is a file-like object or bytes. Raises ValueError when the
+    data is not an image in one of ACCEPTED_FORMATS.
+    """
+    if isinstance(source, (bytes, bytearray)):
+        source = BytesIO(source)
+
+    max_dimension = settings.PHOTO_MAX_DIMENSION
+    try:
+        image = Image.open(source)
+        source_format = image.format
+        if source_format not in ACCEPTED_FORMATS:
+            raise ValueError(f"Unsupported image format: {source_format}")
+        # Let the JPEG decoder scale down while decoding, which keeps memory
+        # proportional to the output size rather than the camera resolution
+        image.draft("RGB", (max_dimension, max_dimension))
+        image = ImageOps.exif_transpose(image)
+        image = _to_rgb(image)
+    except UnidentifiedImageError as e:
+        raise ValueError("Uploaded file is not a valid image") from e
+    except (OSError, Image.DecompressionBombError) as e:
+        raise ValueError(f"Could not decode image: {e}") from e
+
+    image.thumbnail((max_dimension, max_dimension), Image.Resampling.LANCZOS)
+    data = _encode_jpeg(image, settings.PHOTO_JPEG_QUALITY)
+
+    thumbnail_dimension = settings.PHOTO_THUMBNAIL_DIMENSION
+    thumbnail_image = image.copy()
+    thumbnail_image.thumbnail((thumbnail_dimension, thumbnail_dimension), Image.Resampling.LANCZOS)
+    thumbnail = _encode_jpeg(thumbnail_image, settings.PHOTO_THUMBNAIL_QUALITY)
+
+    return NormalizedPhoto(
+        data=data,
+        thumbnail=thumbnail,
+        width=image.width,
+        height=image.height,
+        source_format=source_format,
+    )
@@ -0,0 +1,334 @@
+"""
+Offline agency classifier used as a fast path before OpenAI.
+
+A hashed n-gram TF-IDF representation feeds multinomial logistic
+regressions for the agency, the service and the importance, trained on the
+labels already stored in the Complaint table. Prediction is a sparse dot product over a few hundred
+weights, so it runs in-process in well under a millisecond and keeps working
+when OpenAI is unreachable.
+
+The model is stored as a gzipped JSON artifact with a format version and a
+model version; it is loaded lazily on first use.
+"""
+import gzip
+import json
+import logging
+import math
+import random
+import statistics
+import threading
+import time
+import zlib
+from collections import Counter
+from datetime import datetime, timezone
+
+from django.conf import settings
+
+from .classification_cache import normalize_report_text
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 2
+DEFAULT_N_FEATURES = 2 ** 18
+STEM_LENGTH = 5
+
+
+def _feature_keys(text):
+    """Word unigrams, crude stems and stem bigrams of a report text."""
+    tokens = normalize_report_text(text).split()
+    stems = [token[:STEM_LENGTH] for token in tokens]
+    keys = [f"w:{token}" for token in tokens]
+    keys.extend(f"s:{stem}" for token, stem in zip(tokens, stems) if len(token) > STEM_LENGTH)
+    keys.extend(f"b:{a} {b}" for a, b in zip(stems, stems[1:]))
+    return keys
+
+
+def hash_features(text, n_features=DEFAULT_N_FEATURES):
+    """Return ``{bucket: log-scaled term frequency}`` for a text."""
+    counts = Counter(
+        zlib.crc32(key.encode("utf-8")) & (n_features - 1) for key in _feature_keys(text)
+    )
+    return {bucket: 1.0 + math.log(count) for bucket, count in counts.items()}
+
+
+class LocalAgencyClassifier:
+    """Hashed n-gram TF-IDF + one softmax regression head per label.
+
+    The agency, service and importance heads share the vectorization; each
+    head is ``{"classes": [...], "weights": {bucket: [...]}, "bias": [...]}``.
+    """
+
+    def __init__(self, heads, idf, n_features=DEFAULT_N_FEATURES, model_version=None, metrics=None):
+        self.heads = heads
+        self.idf = idf
+        self.n_features = n_features
+        self.model_version = model_version
+        self.metrics = metrics or {}
+
+    @property
+    def classes(self):
+        return self.heads["agency"]["classes"]
+
+    def vectorize(self, text):
+        """L2-normalized TF-IDF vector restricted to buckets seen in training."""
+        vector = {}
+        for bucket, tf in hash_features(text, self.n_features).items():
+            idf = self.idf.get(bucket)
+            if idf:
+                vector[bucket] = tf * idf
+        norm = math.sqrt(sum(v * v for v in vector.values()))
+        if norm:
+            for bucket in vector:
+                vector[bucket] /= norm
+        return vector
+
+    def predict_proba(self, text, head="agency"):
+        """Return class probabilities aligned with the head's classes."""
+        return _head_proba(self.vectorize(text), self.heads[head])
+
+    def predict(self, text):
+        """Return ``(result, confidence)`` where result has service/agency/importance.
+
+        The confidence is the lowest of the three heads, so a report whose
+        service or importance the model is unsure about goes to OpenAI even
+        when its agency is clear.
+        """
+        vector = self.vectorize(text)
+        agency, confidence = _head_best(vector, self.heads["agency"])
+        if agency == "Spam":
+            return {"service": "Spam", "agency": "Spam", "importance": "low"}, confidence
+
+        result = {"agency": agency}
+        for head, default in (("service", agency), ("importance", "medium")):
+            if self.heads.get(head):
+                result[head], head_confidence = _head_best(vector, self.heads[head])
+            else:
+                # Trained without these labels: only good as a fallback
+                result[head], head_confidence = default, 0.0
+            confidence = min(confidence, head_confidence)
+        return result, confidence
+
+    def to_dict(self):
+        return {
+            "format_version": FORMAT_VERSION,
+            "model_version": self.model_version,
+            "n_features": self.n_features,
+            "metrics": self.metrics,
+            "idf": {str(k): round(v, 5) for k, v in self.idf.items()},
+            "heads": {
+                name: {
+                    "classes": head["classes"],
+                    "bias": [round(b, 5) for b in head["bias"]],
+                    "weights": {
+                        str(k): [round(w, 5) for w in row] for k, row in head["weights"].items()
+                    },
+                }
+                for name, head in self.heads.items() if head
+            },
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        if data.get("format_version") != FORMAT_VERSION:
+            raise ValueError(
+                f"Unsupported classifier format version: {data.get('format_version')}, "
+                f"retrain it with train_classifier"
+            )
+        return cls(
+            heads={
+                name: {
+                    "classes": head["classes"],
+                    "bias": head["bias"],
+                    "weights": {int(k): v for k, v in head["weights"].items()},
+                }
+                for name, head in data["heads"].items()
+            },
+            idf={int(k): v for k, v in data["idf"].items()},
+            n_features=data["n_features"],
+            model_version=data.get("model_version"),
+            metrics=data.get("metrics"),
+        )
+
+    def save(self, path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(path.name + ".tmp")
+        with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, separators=(",", ":"))
+        # Atomic swap so a running process never reads a half-written model
+        tmp_path.replace(path)
+
+    @classmethod
+    def load(cls, path):
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            return cls.from_dict(json.load(f))
+
+
+def _head_proba(vector, head):
+    return _softmax(_scores(vector, head["weights"], head["bias"]))
+
+
+def _head_best(vector, head):
+    probs = _head_proba(vector, head)
+    best = max(range(len(probs)), key=probs.__getitem__)
+    return head["classes"][best], probs[best]
+
+
+def _scores(vector, weights, bias):
+    scores = list(bias)
+    for bucket, value in vector.items():
+        row = weights.get(bucket)
+        if row is not None:
+            for c, w in enumerate(row):
+                scores[c] += w * value
+    return scores
+
+
+def _softmax(scores):
+    top = max(scores)
+    exps = [math.exp(s - top) for s in scores]
+    total = sum(exps)
+    return [e / total for e in exps]
+
+
+def train_classifier(samples, n_features=DEFAULT_N_FEATURES, epochs=12,
+                     learning_rate=0.5, l2=1e-5, seed=13):
+    """Fit a classifier on ``(report_text, agency, service, importance)`` samples.
+
+    The service and importance heads are trained on the samples that have
+    those labels; a head without labelled samples is left out.
+    """
+    # Inverse document frequency over hashed buckets
+    doc_freq = Counter()
+    raw = []
+    for text, _, _, _ in samples:
+        tf = hash_features(text, n_features)
+        doc_freq.update(tf.keys())
+        raw.append(tf)
+    n_docs = len(samples)
+    idf = {
+        bucket: math.log((1 + n_docs) / (1 + df)) + 1.0 for bucket, df in doc_freq.items()
+    }
+
+    vectors = []
+    for tf in raw:
+        vector = {bucket: value * idf[bucket] for bucket, value in tf.items()}
+        norm = math.sqrt(sum(v * v for v in vector.values())) or 1.0
+        vectors.append({bucket: v / norm for bucket, v in vector.items()})
+
+    heads = {}
+    for index, name in enumerate(("agency", "service", "importance"), start=1):
+        labelled = [
+            (vector, sample[index]) for vector, sample in zip(vectors, samples)
+            # Spam has a fixed service and importance, it would only add noise
+            if sample[index] and (name == "agency" or sample[1] != "Spam")
+        ]
+        if labelled:
+            heads[name] = _fit_head(labelled, epochs, learning_rate, l2, seed)
+
+    return LocalAgencyClassifier(
+        heads=heads,
+        idf=idf,
+        n_features=n_features,
+        model_version=datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ"),
+    )
+
+
+def _fit_head(labelled, epochs, learning_rate, l2, seed):
+    """Softmax regression over ``(vector, label)`` pairs by SGD."""
+    classes = sorted({label for _, label in labelled})
+    class_index = {label: i for i, label in enumerate(classes)}
+    n_classes = len(classes)
+    data = [(vector, class_index[label]) for vector, label in labelled]
+
+    weights = {}
+    bias = [0.0] * n_classes
+    rng = random.Random(seed)
+
+    for epoch in range(epochs):
+        rng.shuffle(data)
+        lr = learning_rate / (1.0 + 0.5 * epoch)
+        for vector, label in data:
+            probs = _softmax(_scores(vector, weights, bias))
+            probs[label] -= 1.0
+            # Skip classes whose gradient is negligible to keep updates sparse
+            active = [(c, g) for c, g in enumerate(probs) if abs(g) > 1e-4]
+            for bucket, value in vector.items():
+                row = weights.get(bucket)
+                if row is None:
+                    row = weights[bucket] = [0.0] * n_classes
+                for c, g in active:
+                    row[c] -= lr * (g * value + l2 * row[c])
+            for c, g in active:
+                bias[c] -= lr * g
+
+    return {"classes": classes, "weights": weights, "bias": bias}
+
+
+def evaluate_classifier(classifier, samples, threshold, latency_rounds=5):
+    """Accuracy, coverage at ``threshold`` and per-prediction latency on samples.
+
+    ``accuracy`` is the agency accuracy; a confident answer only counts as
+    correct when its service and importance match too.
+    """
+    correct = Counter()
+    labelled = Counter()
+    confident = 0
+    confident_correct = 0
+    for text, agency, service, importance in samples:
+        result, confidence = classifier.predict(text)
+        hit = True
+        for field, expected in (("agency", agency), ("service", service), ("importance", importance)):
+            if expected:
+                labelled[field] += 1
+                correct[field] += result[field] == expected
+                hit = hit and result[field] == expected
+        if confidence >= threshold:
+            confident += 1
+            confident_correct += hit
+
+    timings = []
+    for _ in range(latency_rounds):
+        for text, _, _, _ in samples:
+            started = time.perf_counter()
+            classifier.predict(text)
+            timings.append((time.perf_counter() - started) * 1e6)
+    timings.sort()
+
+    n = len(samples) or 1
+    return {
+        "samples": len(samples),
+        "accuracy": round(correct["agency"] / n, 4),
+        "service_accuracy": round(correct["service"] / labelled["service"], 4) if labelled["service"] else None,
+        "importance_accuracy": (
+            round(correct["importance"] / labelled["importance"], 4) if labelled["importance"] else None
+        ),
+        "threshold": threshold,
+        "coverage": round(confident / n, 4),
+        "confident_accuracy": round(confident_correct / confident, 4) if confident else None,
+        "latency_us_p50": round(statistics.median(timings), 1) if timings else None,
+        "latency_us_p99": round(timings[int(len(timings) * 0.99) - 1], 1) if timings else None,
+    }
+
+
+_classifier = None
+_classifier_loaded = False
+_classifier_lock = threading.Lock()
+
+
+def get_local_classifier():
+    """Return the trained classifier, loading it on first use (None if absent)."""
+    global _classifier, _classifier_loaded
+    if not _classifier_loaded:
+        with _classifier_lock:
+            if not _classifier_loaded:
+                path = settings.LOCAL_CLASSIFIER_PATH
+                if settings.LOCAL_CLASSIFIER_ENABLED and path.exists():
+                    try:
+                        _classifier = LocalAgencyClassifier.load(path)
+                        logger.info(
+                            f"Loaded local classifier {_classifier.model_version} from {path}"
+                        )
+                    except Exception as e:
+                        logger.error(f"Could not load local classifier from {path}: {e}")
+                _classifier_loaded = True
+    return _classifier
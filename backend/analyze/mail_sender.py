@@ -0,0 +1,206 @@
+"""
+Long-lived SMTP connections for outgoing email.
+
+``send_mail`` opens, authenticates and closes a TLS connection for every
+message, which dominates the cost of sending status emails. MailSender keeps
+up to MAIL_POOL_SIZE authenticated connections open and reuses them:
+
+- a connection idle for more than MAIL_KEEPALIVE_INTERVAL seconds is checked
+  with NOOP before reuse and replaced when the server has dropped it;
+- a connection lost while sending is reopened and the message retried once;
+- a connection is rotated after MAIL_MAX_MESSAGES_PER_CONNECTION messages,
+  since providers limit how much one session may send.
+
+Any Django email backend works; the checks above only apply to SMTP.
+"""
+import logging
+import queue
+import smtplib
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.mail import get_connection
+
+logger = logging.getLogger(__name__)
+
+# Errors after which the connection is unusable and is reopened
+CONNECTION_ERRORS = (smtplib.SMTPServerDisconnected, ConnectionError, TimeoutError)
+
+
+class _PooledConnection:
+    def __init__(self):
+        self.backend = get_connection(fail_silently=False)
+        self.last_used = time.monotonic()
+        self.sent = 0
+
+    def open(self):
+        self.backend.open()
+        self.last_used = time.monotonic()
+        self.sent = 0
+
+    def close(self):
+        try:
+            self.backend.close()
+        except Exception:
+            pass
+
+    def is_open(self):
+        # Backends without a connection (console, locmem) are always usable
+        return getattr(self.backend, 'connection', True) is not None
+
+    def is_alive(self):
+        smtp = getattr(self.backend, 'connection', None)
+        if not isinstance(smtp, smtplib.SMTP):
+            return True
+        try:
+            return smtp.noop()[0] == 250
+        except (smtplib.SMTPException, OSError):
+            return False
+
+    def send(self, message):
+        self.backend.send_messages([message])
+        self.last_used = time.monotonic()
+        self.sent += 1
+
+
+class MailSender:
+    """A small pool of persistent connections to the mail server."""
+
+    def __init__(self, pool_size=None, keepalive_interval=None, max_messages=None):
+        self.pool_size = pool_size or settings.MAIL_POOL_SIZE
+        self.keepalive_interval = keepalive_interval or settings.MAIL_KEEPALIVE_INTERVAL
+        self.max_messages = max_messages or settings.MAIL_MAX_MESSAGES_PER_CONNECTION
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(self.pool_size)
+        self._lock = threading.Lock()
+        self._stats = {'connections_opened': 0, 'reconnects': 0, 'sent': 0, 'failed': 0}
+
+    @contextmanager
+    def _connection(self):
+        """Borrow an open connection, waiting while all of them are busy"""
+        self._slots.acquire()
+        try:
+            try:
+                connection = self._idle.get_nowait()
+            except queue.Empty:
+                connection = None
+
+            if connection is not None and (
+                connection.sent >= self.max_messages
+                or (time.monotonic() - connection.last_used > self.keepalive_interval
+                    and not connection.is_alive())
+            ):
+                connection.close()
+                connection = None
+            if connection is None:
+                connection = self._open()
+
+            healthy = True
+            try:
+                yield connection
+            except CONNECTION_ERRORS:
+                healthy = False
+                raise
+            finally:
+                if healthy and connection.is_open():
+                    self._idle.put(connection)
+                else:
+                    connection.close()
+        finally:
+            self._slots.release()
+
+    def _open(self):
+        connection = _PooledConnection()
+        connection.open()
+        with self._lock:
+            self._stats['connections_opened'] += 1
+        return connection
+
+    def _send_on(self, connection, message):
+        try:
+            connection.send(message)
+        except CONNECTION_ERRORS as e:
+            # Dropped by the server between messages: reconnect and retry once
+            logger.info(f"Mail connection lost ({e}), reconnecting")
+            with self._lock:
+                self._stats['reconnects'] += 1
+            connection.close()
+            connection.open()
+            connection.send(message)
+
+    def send(self, message):
+        """Send one EmailMessage, raising on failure"""
+        try:
+            with self._connection() as connection:
+                self._send_on(connection, message)
+        except Exception:
+            self._count('failed')
+            raise
+        self._count('sent')
+
+    def send_many(self, messages):
+        """Send EmailMessages over one connection
+
+        Returns a list with None for every delivered message and the
+        exception for every failed one; a refused recipient does not stop the
+        rest of the messages.
+        """
+        if not messages:
+            # No connection is opened (or waited for) when there is nothing to send
+            return []
+        errors = []
+        try:
+            with self._connection() as connection:
+                for message in messages:
+                    if connection.sent >= self.max_messages:
+                        connection.close()
+                        connection.open()
+                    try:
+                        self._send_on(connection, message)
+                    except CONNECTION_ERRORS:
+                        raise
+                    except Exception as e:
+                        errors.append(e)
+                        self._count('failed')
+                    else:
+                        errors.append(None)
+                        self._count('sent')
+        except Exception as e:
+            # Could not connect, or the connection failed even after a reconnect
+            remaining = len(messages) - len(errors)
+            errors.extend([e] * remaining)
+            with self._lock:
+                self._stats['failed'] += remaining
+        return errors
+
+    def close(self):
+        """Close the idle connections"""
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats)
+
+    def _count(self, key):
+        with self._lock:
+            self._stats[key] += 1
+
+
+_mail_sender = None
+_mail_sender_lock = threading.Lock()
+
+
+def get_mail_sender():
+    """Return the process-wide mail sender."""
+    global _mail_sender
+    if _mail_sender is None:
+        with _mail_sender_lock:
+            if _mail_sender is None:
+                _mail_sender = MailSender()
+    return _mail_sender
@@ -0,0 +1,69 @@
+from django.core.management.base import BaseCommand
+from analyze.email_service import (
+    EMAIL_TEMPLATES,
+    EmailTemplate,
+    build_status_update_email,
+    get_email_template,
+)
+import time
+
+SAMPLE_COMPLAINT = {
+    'id': 'report_20250601_101500_ab12cd34',
+    'email': 'citizen@example.kg',
+    'created_at': '2025-06-01T10:15:00+06:00',
+    'report_type': 'Жалоба',
+    'region': 'Чуйская область',
+    'city': 'Бишкек',
+    'service': 'Ремонт дорог',
+    'agency': 'Мэрия города Бишкек',
+    'report_text': 'На улице Киевской уже месяц не работает освещение, вечером <темно> & опасно.',
+    'notes': 'Передано в профильную службу',
+}
+
+
+class Command(BaseCommand):
+    help = 'Measure status email renders per second with the compiled templates'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--iterations',
+            type=int,
+            default=20000,
+            help='Renders per measurement'
+        )
+
+    def handle(self, *args, **options):
+        iterations = options['iterations']
+        self.stdout.write(f'Rendering {iterations} emails per measurement...')
+
+        results = {
+            'Render (compiled template)': self._measure(
+                iterations, lambda: get_email_template('resolved', 'ru').render(SAMPLE_COMPLAINT)
+            ),
+            'Render, Kyrgyz without optional fields': self._measure(
+                iterations,
+                lambda: get_email_template('pending', 'kg').render({**SAMPLE_COMPLAINT, 'service': '', 'notes': ''}),
+            ),
+            'Message build (render + MIME message)': self._measure(
+                iterations, lambda: build_status_update_email(SAMPLE_COMPLAINT, 'resolved', 'ru').message()
+            ),
+            'Template compile (once per status/language)': self._measure(
+                max(1, iterations // 100), lambda: EmailTemplate('resolved', 'ru')
+            ),
+        }
+
+        lines = '\n'.join(f'{name}: {rate:,.0f}/s' for name, rate in results.items())
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'\nEmail template benchmark ({len(EMAIL_TEMPLATES)} compiled templates):\n{lines}'
+            )
+        )
+
+    def _measure(self, iterations, render):
+        # Warm up before timing
+        for _ in range(min(100, iterations)):
+            render()
+        started = time.perf_counter()
+        for _ in range(iterations):
+            render()
+        return iterations / (time.perf_counter() - started)
@@ -0,0 +1,128 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from django.utils import timezone
+from analyze.models import Complaint
+from analyze.services import (
+    classify_reports_batch,
+    get_cache,
+    update_reports,
+)
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Re-classify complaints whose agency is "Spam" or empty using batched model requests'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=None,
+            help='Reports per model request (defaults to CLASSIFICATION_BATCH_SIZE)'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=200,
+            help='Complaints loaded and written per database round trip'
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=None,
+            help='Limit number of complaints to re-classify'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Classify and print results without saving anything'
+        )
+        parser.add_argument(
+            '--skip-firestore',
+            action='store_true',
+            help='Only update the Django database, not the Firestore documents'
+        )
+
+    def handle(self, *args, **options):
+        queryset = (
+            Complaint.objects
+            .filter(Q(agency__isnull=True) | Q(agency='') | Q(agency='Spam'))
+            .order_by('pk')
+            .only('pk', 'firestore_id', 'report_text')
+        )
+        if options['limit']:
+            queryset = queryset[:options['limit']]
+
+        complaints = list(queryset)
+        total = len(complaints)
+        self.stdout.write(f'Found {total} complaints to re-classify')
+
+        chunk_size = options['chunk_size']
+        reclassified = 0
+        still_spam = 0
+        errors = 0
+        started = time.monotonic()
+
+        for start in range(0, total, chunk_size):
+            chunk = complaints[start:start + chunk_size]
+            try:
+                results = classify_reports_batch(
+                    [c.report_text for c in chunk],
+                    batch_size=options['batch_size'],
+                )
+            except Exception as e:
+                errors += len(chunk)
+                self.stdout.write(self.style.ERROR(f'Error classifying chunk at {start}: {str(e)}'))
+                logger.error(f'Error classifying backlog chunk at {start}: {e}')
+                continue
+
+            now = timezone.now()
+            for complaint, result in zip(chunk, results):
+                complaint.service = result['service']
+                complaint.agency = result['agency']
+                complaint.importance = result['importance']
+                complaint.updated_at = now
+                if result['agency'] == 'Spam':
+                    still_spam += 1
+                else:
+                    reclassified += 1
+                if options['dry_run']:
+                    self.stdout.write(f'{complaint.firestore_id}: {result["agency"]} / {result["service"]}')
+
+            if options['dry_run']:
+                continue
+
+            # bulk_update bypasses Complaint.save, so each row is not echoed
+            # back to Firestore one by one; Firestore gets batched writes below.
+            Complaint.objects.bulk_update(
+                chunk, ['service', 'agency', 'importance', 'updated_at']
+            )
+            if not options['skip_firestore']:
+                _, error = update_reports([
+                    (c.firestore_id, {
+                        'service': c.service,
+                        'agency': c.agency,
+                        'importance': c.importance,
+                    })
+                    for c in chunk
+                ])
+                if error is not None:
+                    self.stdout.write(self.style.ERROR(f'Error writing chunk at {start} to Firestore: {str(error)}'))
+                    logger.error(f'Error writing backlog chunk at {start} to Firestore: {error}')
+
+            self.stdout.write(f'Processed {min(start + chunk_size, total)}/{total}')
+
+        elapsed = time.monotonic() - started
+        cache_stats = get_cache().stats()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'\nRe-classification completed in {elapsed:.1f}s!\n'
+                f'Assigned to an agency: {reclassified}\n'
+                f'Still spam: {still_spam}\n'
+                f'Errors: {errors}\n'
+                f'Cache hits: {cache_stats["hits"]}, misses: {cache_stats["misses"]}'
+            )
+        )
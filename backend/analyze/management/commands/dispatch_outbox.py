@@ -0,0 +1,99 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+from analyze.outbox import claim_messages, deliver_in_order
+from concurrent.futures import ThreadPoolExecutor
+from zlib import crc32
+import logging
+import signal
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Deliver queued Firestore updates, status emails and report processing jobs from the outbox'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=4,
+            help='Number of concurrent delivery workers'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=settings.OUTBOX_BATCH_SIZE,
+            help='Messages claimed per round'
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=1.0,
+            help='Seconds to wait before polling again when the outbox is empty'
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Deliver everything that is due and exit'
+        )
+
+    def handle(self, *args, **options):
+        self.stop = threading.Event()
+        self.stats = {'delivered': 0, 'failed': 0}
+        self.stats_lock = threading.Lock()
+
+        signal.signal(signal.SIGINT, self._request_stop)
+        signal.signal(signal.SIGTERM, self._request_stop)
+
+        workers = max(1, options['workers'])
+        self.stdout.write(self.style.SUCCESS(f'Dispatching outbox messages with {workers} workers...'))
+
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='outbox-dispatch') as executor:
+            while not self.stop.is_set():
+                close_old_connections()
+                messages = claim_messages(options['batch_size'])
+                if not messages:
+                    if options['once']:
+                        break
+                    self.stop.wait(options['poll_interval'])
+                    continue
+
+                # Group by document and give every document to one worker,
+                # which delivers its messages in order
+                lanes = [[] for _ in range(workers)]
+                documents = {}
+                for message in messages:
+                    documents.setdefault(message.document_id, []).append(message)
+                for document_id, document_messages in documents.items():
+                    lanes[crc32(document_id.encode()) % workers].append(document_messages)
+
+                # Wait for the round so a document is never in two rounds at once
+                list(executor.map(self._deliver_lane, [lane for lane in lanes if lane]))
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'\nOutbox dispatch finished!\n'
+                f'Messages delivered: {self.stats["delivered"]}\n'
+                f'Failed attempts: {self.stats["failed"]}'
+            )
+        )
+
+    def _request_stop(self, signum, frame):
+        self.stop.set()
+
+    def _deliver_lane(self, groups):
+        try:
+            for messages in groups:
+                try:
+                    delivered, failed = deliver_in_order(messages)
+                except Exception as e:
+                    # Left locked; claimed again once OUTBOX_LOCK_TIMEOUT expires
+                    logger.error(f'Error delivering outbox messages of {messages[0].document_id}: {e}')
+                    continue
+                with self.stats_lock:
+                    self.stats['delivered'] += delivered
+                    self.stats['failed'] += failed
+        finally:
+            connection.close()
@@ -0,0 +1,295 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, transaction
+from firebase_admin import firestore
+from google.cloud.firestore_v1.base_query import FieldFilter
+from google.cloud.firestore_v1.watch import ChangeType
+from analyze.firestore_sync import (
+    advance_sync_watermark, apply_firestore_documents, quarantine_documents, send_status_change_emails,
+)
+from analyze.management.commands.sync_firestore import INCREMENTAL_SYNC_NAME
+from analyze.models import SyncState
+from datetime import datetime, timezone
+import logging
+import queue
+import signal
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Listen to Firestore report changes and apply them to the Django database in real time'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--window',
+            type=float,
+            default=1.0,
+            help='Seconds to collect change events before applying them in one batch'
+        )
+        parser.add_argument(
+            '--max-batch',
+            type=int,
+            default=500,
+            help='Apply a batch early once it holds this many documents'
+        )
+        parser.add_argument(
+            '--no-emails',
+            action='store_true',
+            help='Do not send status-change emails'
+        )
+        parser.add_argument(
+            '--max-retries',
+            type=int,
+            default=5,
+            help='Retries of a batch that failed to apply before its documents are applied one at a time '
+                 'and the ones that still fail are quarantined'
+        )
+        parser.add_argument(
+            '--retry-delay',
+            type=float,
+            default=2.0,
+            help='Seconds before the first retry of a failed batch, doubled on every retry'
+        )
+
+    def handle(self, *args, **options):
+        self.events = queue.Queue()
+        self.stop = threading.Event()
+        self.options = options
+        self.stats = {
+            'batches': 0, 'created': 0, 'updated': 0, 'deleted': 0, 'emails': 0, 'retries': 0, 'quarantined': 0,
+        }
+        # Changes of a batch that failed to apply, retried after retry_at
+        self.unapplied = {}
+        self.retry_attempts = 0
+        self.retry_at = 0.0
+
+        signal.signal(signal.SIGINT, self._request_stop)
+        signal.signal(signal.SIGTERM, self._request_stop)
+
+        state, _ = SyncState.objects.get_or_create(name=INCREMENTAL_SYNC_NAME)
+        # Start from the incremental sync watermark so nothing changed while
+        # the listener was down is missed, without replaying the whole collection
+        since = state.watermark_updated_at or datetime.now(timezone.utc)
+        self.stdout.write(self.style.SUCCESS(f'Listening to Firestore report changes after {since}...'))
+
+        query = (
+            firestore.client()
+            .collection('reports')
+            .where(filter=FieldFilter('updated_at', '>', since))
+        )
+        watch = query.on_snapshot(self._on_snapshot)
+
+        try:
+            while not self.stop.is_set():
+                batch = self._collect_batch()
+                if self.unapplied:
+                    # Newer events for the same documents replace the failed ones
+                    self.unapplied.update(batch)
+                    if time.monotonic() >= self.retry_at:
+                        self._apply_batch(self.unapplied)
+                elif batch:
+                    self._apply_batch(batch)
+                elif not watch.is_active and not self.stop.is_set():
+                    # The client retries transient errors itself; this only
+                    # happens when the stream was closed for good
+                    logger.warning('Firestore listener stopped, reopening it')
+                    watch.unsubscribe()
+                    since = SyncState.objects.get(name=INCREMENTAL_SYNC_NAME).watermark_updated_at or since
+                    query = (
+                        firestore.client()
+                        .collection('reports')
+                        .where(filter=FieldFilter('updated_at', '>', since))
+                    )
+                    watch = query.on_snapshot(self._on_snapshot)
+        finally:
+            watch.unsubscribe()
+
+        # Apply whatever arrived before the listener was closed
+        self._flush()
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'\nListener stopped!\n'
+                f'Batches applied: {self.stats["batches"]}\n'
+                f'Complaints created: {self.stats["created"]}\n'
+                f'Complaints updated: {self.stats["updated"]}\n'
+                f'Complaints deleted: {self.stats["deleted"]}\n'
+                f'Batch retries: {self.stats["retries"]}\n'
+                f'Documents quarantined: {self.stats["quarantined"]}\n'
+                f'Status emails sent: {self.stats["emails"]}'
+            )
+        )
+
+    def _request_stop(self, signum, frame):
+        self.stop.set()
+
+    def _on_snapshot(self, snapshot, changes, read_time):
+        """Runs on the listener thread: hand the whole snapshot to the main loop
+
+        A snapshot is queued as one item so a batch never splits it, which
+        keeps the watermark advanced by _apply_batch consistent.
+        """
+        events = []
+        for change in changes:
+            if change.type == ChangeType.REMOVED:
+                events.append((change.document.id, None))
+            else:
+                events.append((change.document.id, change.document.to_dict()))
+        if events:
+            self.events.put(events)
+
+    def _collect_batch(self, wait=True):
+        """Coalesce snapshots for up to --window seconds, last change per document wins
+
+        Waits up to a second for the first snapshot so the main loop can check
+        for shutdown and listener health; with wait=False only drains the queue.
+        """
+        batch = {}
+        try:
+            batch.update(self.events.get(timeout=1.0) if wait else self.events.get_nowait())
+        except queue.Empty:
+            return batch
+
+        deadline = time.monotonic() + (self.options['window'] if wait else 0)
+        while len(batch) < self.options['max_batch']:
+            remaining = deadline - time.monotonic()
+            try:
+                events = self.events.get(timeout=remaining) if remaining > 0 else self.events.get_nowait()
+            except queue.Empty:
+                break
+            batch.update(events)
+        return batch
+
+    def _flush(self):
+        """Apply the queued and unapplied changes, waiting out retry delays"""
+        while True:
+            batch = self._collect_batch(wait=False)
+            if self.unapplied:
+                self.unapplied.update(batch)
+                batch = self.unapplied
+                time.sleep(max(0.0, self.retry_at - time.monotonic()))
+            if not batch:
+                return
+            self._apply_batch(batch)
+
+    def _apply_batch(self, batch):
+        """Apply a batch and advance the watermark in one transaction
+
+        A batch that fails is kept in self.unapplied and retried with backoff;
+        newer events are merged into it and nothing else is applied meanwhile,
+        so the watermark can never move past a change that was not applied.
+        Once --max-retries are used up the batch is applied one document at a
+        time (see _apply_isolated). Documents that can not be stored are
+        quarantined with the batch.
+        """
+        close_old_connections()
+        documents = {doc_id: data for doc_id, data in batch.items() if data is not None}
+        deleted_ids = {doc_id for doc_id, data in batch.items() if data is None}
+
+        try:
+            with transaction.atomic():
+                result = apply_firestore_documents(documents, deleted_ids=deleted_ids)
+                self._quarantine(result.invalid, documents)
+                self._advance_watermark(documents)
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(f'Error applying {len(batch)} changes: {str(e)}'))
+            logger.error(f'Error applying Firestore listener batch: {e}')
+            self._retry_later(batch, e)
+            return
+
+        self._applied(batch, [result], result.invalid)
+
+    def _apply_isolated(self, batch):
+        """Apply a batch that keeps failing one document at a time
+
+        Documents that still fail are quarantined and the watermark moves
+        past them, so a restart does not replay the same failure forever.
+        Raises CommandError when even that can not be written, e.g. while
+        the database is down.
+        """
+        close_old_connections()
+        results = []
+        failures = []
+        for doc_id, data in batch.items():
+            try:
+                with transaction.atomic():
+                    if data is None:
+                        result = apply_firestore_documents({}, deleted_ids={doc_id})
+                    else:
+                        result = apply_firestore_documents({doc_id: data})
+                    failures.extend(result.invalid)
+                    results.append(result)
+            except Exception as e:
+                logger.error(f'Error applying Firestore document {doc_id}: {e}')
+                failures.append((doc_id, str(e)))
+
+        documents = {doc_id: data for doc_id, data in batch.items() if data is not None}
+        try:
+            with transaction.atomic():
+                self._quarantine(failures, documents)
+                self._advance_watermark(documents)
+        except Exception as e:
+            raise CommandError(f'Could not quarantine {len(failures)} Firestore documents: {e}')
+
+        self._applied(batch, results, failures)
+
+    def _applied(self, batch, results, quarantined):
+        self.unapplied = {}
+        self.retry_attempts = 0
+        self.stats['quarantined'] += len(quarantined)
+        for doc_id, error in quarantined:
+            self.stdout.write(self.style.ERROR(f'Quarantined document {doc_id}: {error}'))
+
+        if not self.options['no_emails']:
+            self.stats['emails'] += send_status_change_emails(
+                [change for result in results for change in result.status_changes]
+            )
+
+        created = sum(result.created for result in results)
+        updated = sum(result.updated for result in results)
+        deleted = sum(result.deleted for result in results)
+        self.stats['batches'] += 1
+        self.stats['created'] += created
+        self.stats['updated'] += updated
+        self.stats['deleted'] += deleted
+        logger.info(
+            f'Applied {len(batch)} Firestore changes: {created} created, '
+            f'{updated} updated, {deleted} deleted'
+        )
+
+    def _quarantine(self, failures, documents):
+        if failures:
+            quarantine_documents('listen_firestore', failures, documents)
+
+    def _retry_later(self, batch, error):
+        self.retry_attempts += 1
+        if self.retry_attempts > self.options['max_retries']:
+            logger.error(
+                f'Applying {len(batch)} Firestore changes failed {self.retry_attempts} times '
+                f'({error}), applying them one at a time'
+            )
+            self._apply_isolated(batch)
+            return
+        delay = self.options['retry_delay'] * 2 ** (self.retry_attempts - 1)
+        self.unapplied = batch
+        self.retry_at = time.monotonic() + delay
+        self.stats['retries'] += 1
+        logger.warning(
+            f'Retrying {len(batch)} Firestore changes in {delay:g}s '
+            f'(attempt {self.retry_attempts + 1} of {self.options["max_retries"] + 1})'
+        )
+
+    def _advance_watermark(self, documents):
+        """Move the shared incremental sync watermark past the applied documents"""
+        latest = max(
+            (
+                (data['updated_at'], doc_id)
+                for doc_id, data in documents.items()
+                if isinstance(data.get('updated_at'), datetime)
+            ),
+            default=None,
+        )
+        if latest is not None:
+            advance_sync_watermark(INCREMENTAL_SYNC_NAME, *latest)
@@ -0,0 +1,132 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from analyze.local_classifier import evaluate_classifier, train_classifier
+from analyze.models import Complaint
+from analyze.services import AGENCIES
+from pathlib import Path
+import logging
+import random
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def _percent(value):
+    return 'n/a' if value is None else f'{value:.1%}'
+
+
+class Command(BaseCommand):
+    help = 'Train the offline agency/service/importance classifier from existing complaints and benchmark it'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--holdout',
+            type=float,
+            default=0.2,
+            help='Fraction of complaints held out for the accuracy/latency benchmark'
+        )
+        parser.add_argument(
+            '--epochs',
+            type=int,
+            default=12,
+            help='Training passes over the data'
+        )
+        parser.add_argument(
+            '--threshold',
+            type=float,
+            default=None,
+            help='Confidence threshold to report coverage for (defaults to LOCAL_CLASSIFIER_THRESHOLD)'
+        )
+        parser.add_argument(
+            '--min-samples',
+            type=int,
+            default=50,
+            help='Refuse to train with fewer labelled complaints than this'
+        )
+        parser.add_argument(
+            '--output',
+            type=str,
+            default=None,
+            help='Where to write the model artifact (defaults to LOCAL_CLASSIFIER_PATH)'
+        )
+        parser.add_argument(
+            '--benchmark-only',
+            action='store_true',
+            help='Evaluate on the held-out split without writing an artifact'
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=13,
+            help='Seed for the train/holdout split and training order'
+        )
+
+    def handle(self, *args, **options):
+        labels = set(AGENCIES) | {'Spam'}
+        samples = [
+            (text, agency, service or '', importance or '')
+            for text, agency, service, importance in Complaint.objects
+            .filter(agency__in=labels)
+            .exclude(report_text='')
+            .values_list('report_text', 'agency', 'service', 'importance')
+        ]
+
+        if len(samples) < options['min_samples']:
+            raise CommandError(
+                f'Only {len(samples)} labelled complaints found, '
+                f'need at least {options["min_samples"]}'
+            )
+
+        threshold = options['threshold']
+        if threshold is None:
+            threshold = settings.LOCAL_CLASSIFIER_THRESHOLD
+
+        rng = random.Random(options['seed'])
+        rng.shuffle(samples)
+        split = int(len(samples) * (1 - options['holdout']))
+        train, holdout = samples[:split], samples[split:]
+
+        self.stdout.write(
+            f'Training on {len(train)} complaints, holding out {len(holdout)} '
+            f'({len({s[1] for s in samples})} classes)'
+        )
+
+        started = time.monotonic()
+        classifier = train_classifier(train, epochs=options['epochs'], seed=options['seed'])
+        self.stdout.write(f'Trained in {time.monotonic() - started:.1f}s')
+
+        metrics = {}
+        if holdout:
+            metrics = evaluate_classifier(classifier, holdout, threshold)
+            if metrics['confident_accuracy'] is not None:
+                local_line = (
+                    f'{metrics["coverage"]:.1%} '
+                    f'(accuracy {metrics["confident_accuracy"]:.1%})'
+                )
+            else:
+                local_line = 'none'
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f'\nHeld-out benchmark:\n'
+                    f'Accuracy: {metrics["accuracy"]:.1%}\n'
+                    f'Service accuracy: {_percent(metrics["service_accuracy"])}, '
+                    f'importance accuracy: {_percent(metrics["importance_accuracy"])}\n'
+                    f'Answered locally at {threshold:.2f}: {local_line}\n'
+                    f'Latency p50: {metrics["latency_us_p50"]}µs, '
+                    f'p99: {metrics["latency_us_p99"]}µs'
+                )
+            )
+
+        if options['benchmark_only']:
+            return
+
+        # Refit on everything so the shipped model sees all labelled data
+        if holdout:
+            classifier = train_classifier(samples, epochs=options['epochs'], seed=options['seed'])
+        classifier.metrics = {**metrics, 'train_samples': len(samples)}
+
+        output = Path(options['output']) if options['output'] else settings.LOCAL_CLASSIFIER_PATH
+        classifier.save(output)
+        self.stdout.write(
+            self.style.SUCCESS(f'\nSaved model {classifier.model_version} to {output}')
+        )
@@ -0,0 +1,28 @@
+# Generated by Django 5.0.1 on 2026-10-18 04:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analyze', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SyncState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True, verbose_name='Синхронизация')),
+                ('watermark_updated_at', models.DateTimeField(blank=True, null=True, verbose_name='Последнее обновление')),
+                ('watermark_document_id', models.CharField(blank=True, default='', max_length=255, verbose_name='Последний документ')),
+                ('documents_synced', models.PositiveBigIntegerField(default=0, verbose_name='Синхронизировано документов')),
+                ('last_run_at', models.DateTimeField(auto_now=True, verbose_name='Последний запуск')),
+            ],
+            options={
+                'verbose_name': 'Состояние синхронизации',
+                'verbose_name_plural': 'Состояния синхронизации',
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.1 on 2026-10-18 04:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analyze', '0002_syncstate'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='complaint',
+            name='firestore_updated_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Версия в Firestore'),
+        ),
+    ]
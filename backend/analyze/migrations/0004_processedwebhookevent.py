@@ -0,0 +1,24 @@
+# Generated by Django 5.0.1 on 2026-10-18 04:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analyze', '0003_complaint_firestore_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProcessedWebhookEvent',
+            fields=[
+                ('event_id', models.CharField(max_length=128, primary_key=True, serialize=False)),
+                ('processed_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+            options={
+                'verbose_name': 'Обработанное событие webhook',
+                'verbose_name_plural': 'Обработанные события webhook',
+            },
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.0.1 on 2026-10-18 04:41
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analyze', '0004_processedwebhookevent'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutboxMessage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('firestore_update', 'Обновление Firestore'), ('status_email', 'Письмо о статусе')], max_length=30, verbose_name='Тип')),
+                ('document_id', models.CharField(db_index=True, max_length=255, verbose_name='ID документа')),
+                ('payload', models.JSONField(default=dict, verbose_name='Данные')),
+                ('dedupe_key', models.CharField(blank=True, db_index=True, default='', max_length=255, verbose_name='Ключ дедупликации')),
+                ('status', models.CharField(choices=[('pending', 'Ожидает'), ('processing', 'Отправляется'), ('sent', 'Отправлено'), ('failed', 'Ошибка')], default='pending', max_length=20, verbose_name='Статус')),
+                ('attempts', models.PositiveIntegerField(default=0, verbose_name='Попытки')),
+                ('available_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Доступно с')),
+                ('lock_token', models.CharField(blank=True, default='', max_length=32, verbose_name='Токен блокировки')),
+                ('locked_until', models.DateTimeField(blank=True, null=True, verbose_name='Заблокировано до')),
+                ('last_error', models.TextField(blank=True, default='', verbose_name='Последняя ошибка')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')),
+                ('sent_at', models.DateTimeField(blank=True, null=True, verbose_name='Дата отправки')),
+            ],
+            options={
+                'verbose_name': 'Сообщение outbox',
+                'verbose_name_plural': 'Сообщения outbox',
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['status', 'available_at'], name='analyze_out_status_d0c4a3_idx')],
+            },
+        ),
+    ]
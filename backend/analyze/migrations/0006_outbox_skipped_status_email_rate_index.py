@@ -0,0 +1,22 @@
+# Generated by Django 5.0.1 on 2026-10-18 04:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analyze', '0005_outboxmessage'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='outboxmessage',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Ожидает'), ('processing', 'Отправляется'), ('sent', 'Отправлено'), ('skipped', 'Пропущено'), ('failed', 'Ошибка')], default='pending', max_length=20, verbose_name='Статус'),
+        ),
+        migrations.AddIndex(
+            model_name='outboxmessage',
+            index=models.Index(fields=['kind', 'status', 'sent_at'], name='analyze_out_kind_1fb824_idx'),
+        ),
+    ]
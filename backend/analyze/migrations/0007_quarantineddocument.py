@@ -0,0 +1,29 @@
+# Generated by Django 5.0.1 on 2026-10-18 05:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analyze', '0006_outbox_skipped_status_email_rate_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuarantinedDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(max_length=50, verbose_name='Источник')),
+                ('document_id', models.CharField(db_index=True, max_length=1500, verbose_name='ID документа')),
+                ('data', models.JSONField(blank=True, null=True, verbose_name='Данные')),
+                ('error', models.TextField(verbose_name='Ошибка')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата')),
+            ],
+            options={
+                'verbose_name': 'Пропущенный документ',
+                'verbose_name_plural': 'Пропущенные документы',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.1 on 2026-10-18 05:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analyze', '0007_quarantineddocument'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='outboxmessage',
+            name='kind',
+            field=models.CharField(choices=[('firestore_update', 'Обновление Firestore'), ('status_email', 'Письмо о статусе'), ('process_report', 'Обработка обращения')], max_length=30, verbose_name='Тип'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.0.1 on 2026-10-18 05:28
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analyze', '0008_outbox_process_report_kind'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='outboxmessage',
+            name='dedupe_key',
+        ),
+    ]
@@ -1,12 +1,31 @@
-from django.db import models
+from django.conf import settings
+from django.db import models, transaction
 from django.dispatch import receiver
 from django.db.models.signals import post_save, pre_save
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from firebase_admin import firestore
+from datetime import datetime, timedelta, timezone as dt_timezone
 from .email_service import send_status_update_email
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Submissions whose authors get status update emails
+EMAIL_SUBMISSION_SOURCES = ('website', 'mobile')
+
+
+def firestore_version(data):
+    """The updated_at of a Firestore document as an aware datetime, or None"""
+    value = data.get('updated_at')
+    if isinstance(value, str):
+        value = parse_datetime(value)
+    if not isinstance(value, datetime):
+        return None
+    if timezone.is_naive(value):
+        value = timezone.make_aware(value, dt_timezone.utc)
+    return value
+
 
 class Complaint(models.Model):
     """Django model for managing complaints through admin interface"""
@@ -58,6 +77,27 @@ class Complaint(models.Model):
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата создания")
     updated_at = models.DateTimeField(auto_now=True, verbose_name="Дата обновления")
     
+    # updated_at of the Firestore document last applied, so stale events are ignored
+    firestore_updated_at = models.DateTimeField(blank=True, null=True, verbose_name="Версия в Firestore")
+    
+    # Fields mirrored from the Firestore document, with the value used when
+    # the document lacks them
+    FIRESTORE_FIELD_DEFAULTS = {
+        'report_type': 'Жалоба',
+        'region': '',
+        'city': '',
+        'report_text': '',
+        'contact_info': '',
+        'email': '',
+        'status': 'new',
+        'importance': 'medium',
+        'notes': '',
+        'service': '',
+        'agency': '',
+        'submission_source': 'website',
+        'language': 'ru',
+    }
+    
     class Meta:
         verbose_name = "Обращение"
         verbose_name_plural = "Обращения"
@@ -66,60 +106,158 @@ class Complaint(models.Model):
     def __str__(self):
         return f"#{self.firestore_id[:8]} - {self.report_text[:50]}..."
     
-    def save(self, *args, **kwargs):
-        """Override save to sync with Firestore"""
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """Remember the loaded values so changes can be found without a query"""
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+    
+    def get_loaded_value(self, field, default=None):
+        """Value of a field as it was read from the database"""
+        return getattr(self, '_loaded_values', {}).get(field, default)
+    
+    def get_dirty_fields(self):
+        """Names of loaded fields changed since the row was read, None if it was not read from the database"""
+        loaded = getattr(self, '_loaded_values', None)
+        if loaded is None:
+            return None
+        return {field for field, value in loaded.items() if getattr(self, field) != value}
+    
+    def save(self, *args, sync_firestore=True, **kwargs):
+        """Override save to sync with Firestore
+
+        Rows read from the database only write their changed fields, to the
+        database and to Firestore, and nothing at all when nothing changed.
+        Pass sync_firestore=False when the new values came from Firestore.
+        With OUTBOX_ENABLED the Firestore update and status email are queued
+        in the same transaction instead of being sent here.
+        """
         # Check if this is an update (not a new instance)
         is_update = self.pk is not None
         old_status = None
+        dirty = self.get_dirty_fields()
         
         if is_update:
-            try:
-                old_instance = Complaint.objects.get(pk=self.pk)
-                old_status = old_instance.status
-            except Complaint.DoesNotExist:
-                pass
+            if dirty is not None:
+                old_status = self.get_loaded_value('status')
+            else:
+                # Built by hand with a pk, so the stored status is unknown
+                try:
+                    old_status = Complaint.objects.only('status').get(pk=self.pk).status
+                except Complaint.DoesNotExist:
+                    pass
+        
+        if is_update and dirty is not None and 'update_fields' not in kwargs:
+            if not dirty:
+                logger.debug(f"Complaint {self.firestore_id} unchanged, skipping save")
+                return
+            kwargs['update_fields'] = dirty | {'updated_at'}
+        
+        status_changed = (
+            is_update and old_status and old_status != self.status
+            and self.submission_source in EMAIL_SUBMISSION_SOURCES
+        )
+        
+        if settings.OUTBOX_ENABLED:
+            from .outbox import dispatch_after_commit, enqueue_firestore_update, enqueue_status_email
+            
+            # The side effects are recorded with the change and delivered after commit
+            with transaction.atomic():
+                super().save(*args, **kwargs)
+                if sync_firestore:
+                    enqueue_firestore_update(self.firestore_id, self.get_firestore_data(dirty if is_update else None))
+                if status_changed:
+                    enqueue_status_email(
+                        self.firestore_id, self.get_email_data(), self.status, self.language,
+                        previous_status=old_status,
+                    )
+                dispatch_after_commit(self.firestore_id)
+            self._loaded_values = {
+                field.attname: getattr(self, field.attname) for field in self._meta.concrete_fields
+            }
+            return
         
         # Save to Django database
         super().save(*args, **kwargs)
+        self._loaded_values = {
+            field.attname: getattr(self, field.attname) for field in self._meta.concrete_fields
+        }
         
         # Sync with Firestore
         try:
-            self.sync_to_firestore()
+            if sync_firestore:
+                self.sync_to_firestore(fields=dirty if is_update else None)
             
             # Send email notification if status changed
-            if is_update and old_status and old_status != self.status and self.submission_source in ['website', 'mobile']:
+            if status_changed:
                 self.send_status_update_email()
                 
         except Exception as e:
             logger.error(f"Error syncing complaint {self.firestore_id} to Firestore: {e}")
     
-    def sync_to_firestore(self):
-        """Sync this complaint data to Firestore"""
+    @classmethod
+    def clean_firestore_fields(cls, data):
+        """Mirrored fields present in a Firestore payload, coerced to column values
+
+        A null in a NOT NULL column becomes its FIRESTORE_FIELD_DEFAULTS value
+        and numbers become strings. Raises ValueError for values that can not
+        be stored (objects, lists, booleans, NUL characters, strings over
+        max_length).
+        """
+        cleaned = {}
+        for field, default in cls.FIRESTORE_FIELD_DEFAULTS.items():
+            if field not in data:
+                continue
+            value = data[field]
+            model_field = cls._meta.get_field(field)
+            if value is None:
+                cleaned[field] = None if model_field.null else default
+                continue
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                value = str(value)
+            if not isinstance(value, str):
+                raise ValueError(f"{field} must be a string")
+            if '\x00' in value:
+                raise ValueError(f"{field} contains a NUL character")
+            if model_field.max_length and len(value) > model_field.max_length:
+                raise ValueError(f"{field} is longer than {model_field.max_length} characters")
+            cleaned[field] = value
+        return cleaned
+    
+    @classmethod
+    def from_firestore_data(cls, firestore_id, data):
+        """Build an unsaved complaint from a Firestore document"""
+        return cls(
+            firestore_id=firestore_id,
+            firestore_updated_at=firestore_version(data),
+            **{field: data.get(field, default) for field, default in cls.FIRESTORE_FIELD_DEFAULTS.items()}
+        )
+    
+    def apply_firestore_data(self, data):
+        """Copy the fields present in a Firestore document, return the changed field names"""
+        changed = []
+        for field in self.FIRESTORE_FIELD_DEFAULTS:
+            if field in data and getattr(self, field) != data[field]:
+                setattr(self, field, data[field])
+                changed.append(field)
+        return changed
+    
+    def sync_to_firestore(self, fields=None):
+        """Sync this complaint data to Firestore
+
+        With ``fields``, only those mirrored fields are sent; nothing is
+        written when none of them is mirrored.
+        """
         try:
+            firestore_data = self.get_firestore_data(fields)
+            if not firestore_data:
+                return
+            firestore_data['updated_at'] = firestore.SERVER_TIMESTAMP
+            
             db = firestore.client()
             doc_ref = db.collection('reports').document(self.firestore_id)
             
-            # Prepare data for Firestore
-            firestore_data = {
-                'report_type': self.report_type,
-                'region': self.region,
-                'city': self.city,
-                'report_text': self.report_text,
-                'contact_info': self.contact_info,
-                'email': self.email or '',
-                'status': self.status,
-                'importance': self.importance,
-                'notes': self.notes or '',
-                'service': self.service or '',
-                'agency': self.agency or '',
-                'submission_source': self.submission_source,
-                'language': self.language,
-                'updated_at': self.updated_at.isoformat() if self.updated_at else None,
-            }
-            
-            # Remove None values
-            firestore_data = {k: v for k, v in firestore_data.items() if v is not None}
-            
             # Update Firestore document
             doc_ref.update(firestore_data)
             logger.info(f"Successfully synced complaint {self.firestore_id} to Firestore")
@@ -128,23 +266,66 @@ class Complaint(models.Model):
             logger.error(f"Error syncing to Firestore: {e}")
             raise
     
-    def send_status_update_email(self):
-        """Send email notification for status update"""
+    def get_firestore_data(self, fields=None):
+        """Mirrored fields as written to Firestore, optionally only ``fields``"""
+        # Prepare data for Firestore
+        firestore_data = {
+            'report_type': self.report_type,
+            'region': self.region,
+            'city': self.city,
+            'report_text': self.report_text,
+            'contact_info': self.contact_info,
+            'email': self.email or '',
+            'status': self.status,
+            'importance': self.importance,
+            'notes': self.notes or '',
+            'service': self.service or '',
+            'agency': self.agency or '',
+            'submission_source': self.submission_source,
+            'language': self.language,
+        }
+        
+        if fields is not None:
+            firestore_data = {k: v for k, v in firestore_data.items() if k in fields}
+        
+        # Remove None values
+        return {k: v for k, v in firestore_data.items() if v is not None}
+    
+    def get_email_data(self):
+        """Complaint data for the email service"""
+        return {
+            'id': self.firestore_id,
+            'report_text': self.report_text,
+            'contact_info': self.contact_info,
+            'email': self.email,
+            'service': self.service,
+            'agency': self.agency,
+            'region': self.region,
+            'city': self.city,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'notes': self.notes,
+            'submission_source': self.submission_source,
+        }
+    
+    def send_status_update_email(self, previous_status=None):
+        """Send email notification for status update
+        
+        With OUTBOX_ENABLED the email is queued, coalesced with other
+        changes of the complaint and rate-limited (see analyze.outbox).
+        """
         try:
             # Prepare complaint data for email service
-            complaint_data = {
-                'id': self.firestore_id,
-                'report_text': self.report_text,
-                'contact_info': self.contact_info,
-                'email': self.email,
-                'service': self.service,
-                'agency': self.agency,
-                'region': self.region,
-                'city': self.city,
-                'created_at': self.created_at.isoformat() if self.created_at else None,
-                'notes': self.notes,
-                'submission_source': self.submission_source,
-            }
+            complaint_data = self.get_email_data()
+            
+            if settings.OUTBOX_ENABLED:
+                from .outbox import enqueue_status_email
+                
+                enqueue_status_email(
+                    self.firestore_id, complaint_data, self.status, self.language,
+                    previous_status=previous_status,
+                )
+                logger.info(f"Email notification queued for complaint {self.firestore_id}")
+                return
             
             # Send email
             email_sent = send_status_update_email(complaint_data, self.status, self.language)
@@ -171,42 +352,16 @@ class Complaint(models.Model):
             
             data = doc.to_dict()
             
-            # Get or create complaint
-            complaint, created = cls.objects.get_or_create(
-                firestore_id=firestore_id,
-                defaults={
-                    'report_type': data.get('report_type', 'Жалоба'),
-                    'region': data.get('region', ''),
-                    'city': data.get('city', ''),
-                    'report_text': data.get('report_text', ''),
-                    'contact_info': data.get('contact_info', ''),
-                    'email': data.get('email', ''),
-                    'status': data.get('status', 'new'),
-                    'importance': data.get('importance', 'medium'),
-                    'notes': data.get('notes', ''),
-                    'service': data.get('service', ''),
-                    'agency': data.get('agency', ''),
-                    'submission_source': data.get('submission_source', 'website'),
-                    'language': data.get('language', 'ru'),
-                }
-            )
+            complaint = cls.objects.filter(firestore_id=firestore_id).first()
+            created = complaint is None
+            if created:
+                complaint = cls.from_firestore_data(firestore_id, data)
+            else:
+                complaint.apply_firestore_data(data)
+            complaint.firestore_updated_at = firestore_version(data) or complaint.firestore_updated_at
             
-            # Update existing complaint
-            if not created:
-                complaint.report_type = data.get('report_type', complaint.report_type)
-                complaint.region = data.get('region', complaint.region)
-                complaint.city = data.get('city', complaint.city)
-                complaint.report_text = data.get('report_text', complaint.report_text)
-                complaint.contact_info = data.get('contact_info', complaint.contact_info)
-                complaint.email = data.get('email', complaint.email)
-                complaint.status = data.get('status', complaint.status)
-                complaint.importance = data.get('importance', complaint.importance)
-                complaint.notes = data.get('notes', complaint.notes)
-                complaint.service = data.get('service', complaint.service)
-                complaint.agency = data.get('agency', complaint.agency)
-                complaint.submission_source = data.get('submission_source', complaint.submission_source)
-                complaint.language = data.get('language', complaint.language)
-                complaint.save()
+            # The values came from Firestore, writing them back would only echo them
+            complaint.save(sync_firestore=False)
             
             logger.info(f"{'Created' if created else 'Updated'} complaint {firestore_id} from Firestore")
             return complaint
@@ -214,3 +369,119 @@ class Complaint(models.Model):
         except Exception as e:
             logger.error(f"Error syncing from Firestore: {e}")
             return None
+
+
+class SyncState(models.Model):
+    """High-water mark of an incremental Firestore sync"""
+    
+    name = models.CharField(max_length=100, unique=True, verbose_name="Синхронизация")
+    
+    # Last synced document, ordered by (updated_at, document id)
+    watermark_updated_at = models.DateTimeField(blank=True, null=True, verbose_name="Последнее обновление")
+    watermark_document_id = models.CharField(max_length=255, blank=True, default='', verbose_name="Последний документ")
+    
+    documents_synced = models.PositiveBigIntegerField(default=0, verbose_name="Синхронизировано документов")
+    last_run_at = models.DateTimeField(auto_now=True, verbose_name="Последний запуск")
+    
+    class Meta:
+        verbose_name = "Состояние синхронизации"
+        verbose_name_plural = "Состояния синхронизации"
+    
+    def __str__(self):
+        return f"{self.name}: {self.watermark_updated_at} / {self.watermark_document_id}"
+
+
+class QuarantinedDocument(models.Model):
+    """A Firestore document a sync could not apply, skipped so the sync can move on"""
+    
+    source = models.CharField(max_length=50, verbose_name="Источник")
+    document_id = models.CharField(max_length=1500, db_index=True, verbose_name="ID документа")
+    data = models.JSONField(blank=True, null=True, verbose_name="Данные")
+    error = models.TextField(verbose_name="Ошибка")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата")
+    
+    class Meta:
+        verbose_name = "Пропущенный документ"
+        verbose_name_plural = "Пропущенные документы"
+        ordering = ['-created_at']
+    
+    def __str__(self):
+        return f"{self.document_id}: {self.error[:50]}"
+
+
+class ProcessedWebhookEvent(models.Model):
+    """Id of an already applied webhook event, kept for WEBHOOK_EVENT_TTL seconds"""
+    
+    event_id = models.CharField(max_length=128, primary_key=True)
+    processed_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    
+    class Meta:
+        verbose_name = "Обработанное событие webhook"
+        verbose_name_plural = "Обработанные события webhook"
+    
+    def __str__(self):
+        return self.event_id
+    
+    @classmethod
+    def purge_expired(cls, ttl):
+        """Delete event ids older than ttl seconds, return the number deleted"""
+        deleted, _ = cls.objects.filter(
+            processed_at__lt=timezone.now() - timedelta(seconds=ttl)
+        ).delete()
+        return deleted
+
+
+class OutboxMessage(models.Model):
+    """A side effect of a complaint change, written in the same transaction
+    and delivered by the outbox dispatcher (see analyze.outbox)"""
+    
+    KIND_CHOICES = [
+        ('firestore_update', 'Обновление Firestore'),
+        ('status_email', 'Письмо о статусе'),
+        ('process_report', 'Обработка обращения'),
+    ]
+    
+    STATUS_CHOICES = [
+        ('pending', 'Ожидает'),
+        ('processing', 'Отправляется'),
+        ('sent', 'Отправлено'),
+        ('skipped', 'Пропущено'),
+        ('failed', 'Ошибка'),
+    ]
+    
+    kind = models.CharField(max_length=30, choices=KIND_CHOICES, verbose_name="Тип")
+    document_id = models.CharField(max_length=255, db_index=True, verbose_name="ID документа")
+    payload = models.JSONField(default=dict, verbose_name="Данные")
+    
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending', verbose_name="Статус")
+    attempts = models.PositiveIntegerField(default=0, verbose_name="Попытки")
+    available_at = models.DateTimeField(default=timezone.now, verbose_name="Доступно с")
+    
+    # Set while a dispatcher delivers the message; expired locks are reclaimed
+    lock_token = models.CharField(max_length=32, blank=True, default='', verbose_name="Токен блокировки")
+    locked_until = models.DateTimeField(blank=True, null=True, verbose_name="Заблокировано до")
+    
+    last_error = models.TextField(blank=True, default='', verbose_name="Последняя ошибка")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата создания")
+    sent_at = models.DateTimeField(blank=True, null=True, verbose_name="Дата отправки")
+    
+    class Meta:
+        verbose_name = "Сообщение outbox"
+        verbose_name_plural = "Сообщения outbox"
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['status', 'available_at']),
+            # Sending rate of status emails
+            models.Index(fields=['kind', 'status', 'sent_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.kind} {self.document_id} ({self.status})"
+    
+    def is_due(self, now):
+        """Whether a dispatcher may claim this message now"""
+        if self.status == 'pending':
+            return self.available_at <= now
+        if self.status == 'processing':
+            return self.locked_until is None or self.locked_until < now
+        return False
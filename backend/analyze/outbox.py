@@ -0,0 +1,570 @@
+"""
+Transactional outbox for the side effects of complaint changes.
+
+Complaint.save records the Firestore update and the status email as
+OutboxMessage rows in the same transaction as the complaint itself, so a side
+effect exists exactly when the change commits and is never lost when
+Firestore or SMTP is slow or down. Messages are delivered by the
+``dispatch_outbox`` command and, with OUTBOX_DISPATCH_INLINE, right after the
+commit by a small background pool.
+
+Delivery is ordered per document and kind: a message is only claimed when
+every earlier undelivered message of the same kind for its document is
+claimed along with it. Failed deliveries are retried with exponential backoff
+and marked failed after OUTBOX_MAX_ATTEMPTS.
+
+Status emails are the notification queue: every source of status changes
+(Complaint.save, the Firestore webhook and listener, StatusUpdateEmailView)
+queues them here. Changes of one complaint within EMAIL_DIGEST_WINDOW seconds
+are coalesced into a single email about the latest status, and delivery is
+held back to EMAIL_RATE_LIMIT_PER_MINUTE and EMAIL_DAILY_QUOTA so bursts stay
+within the SMTP provider's sending limits.
+
+Reports submitted in asynchronous mode queue their photo upload and
+classification here as well (see analyze.tasks), retried after
+REPORT_PROCESSING_RETRY_DELAY * 2^n seconds up to
+REPORT_PROCESSING_MAX_ATTEMPTS times.
+"""
+import heapq
+import itertools
+import json
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+from firebase_admin import firestore
+
+from .email_service import get_recipient_email, send_status_update_email, send_status_update_emails
+from .models import OutboxMessage
+from .services import update_reports
+
+logger = logging.getLogger(__name__)
+
+FIRESTORE_UPDATE = 'firestore_update'
+STATUS_EMAIL = 'status_email'
+PROCESS_REPORT = 'process_report'
+
+PENDING = 'pending'
+PROCESSING = 'processing'
+SENT = 'sent'
+SKIPPED = 'skipped'
+FAILED = 'failed'
+UNSENT_STATUSES = (PENDING, PROCESSING)
+
+# Complaint fields a queued status email keeps (see Complaint.get_email_data)
+EMAIL_DATA_FIELDS = (
+    'id', 'report_text', 'contact_info', 'email', 'report_type', 'service', 'agency',
+    'region', 'city', 'created_at', 'notes', 'submission_source',
+)
+
+
+class DeliveryDeferred(Exception):
+    """Raised by a handler that may not run before ``until`` (rate limits)"""
+
+    def __init__(self, until):
+        super().__init__(f"Deferred until {until}")
+        self.until = until
+
+
+def enqueue_firestore_update(document_id, fields):
+    """Queue a Firestore update of ``fields``, call inside the saving transaction
+
+    Merged into the document's last queued update when that one has not been
+    picked up yet, so a burst of saves costs one Firestore write.
+    """
+    if not fields:
+        return None
+    queued = (
+        OutboxMessage.objects
+        .filter(kind=FIRESTORE_UPDATE, document_id=document_id, status=PENDING, attempts=0)
+        .order_by('-id')
+        .first()
+    )
+    # No other update of the document may be queued after it, or merging would reorder
+    if queued and not OutboxMessage.objects.filter(
+        kind=FIRESTORE_UPDATE, document_id=document_id, status__in=UNSENT_STATUSES, id__gt=queued.id
+    ).exists():
+        # Conditional, so a message claimed meanwhile is left alone
+        if OutboxMessage.objects.filter(pk=queued.pk, status=PENDING).update(
+            payload={**queued.payload, **fields}
+        ):
+            return queued
+    return OutboxMessage.objects.create(kind=FIRESTORE_UPDATE, document_id=document_id, payload=fields)
+
+
+def enqueue_status_email(document_id, complaint_data, status, language, previous_status=None):
+    """Queue a status email, call inside the transaction of the change"""
+    return enqueue_status_emails([(document_id, complaint_data, status, language, previous_status)])
+
+
+def enqueue_status_emails(notifications):
+    """Queue status emails for ``(document_id, complaint_data, status, language, previous_status)``
+
+    An email still waiting out its EMAIL_DIGEST_WINDOW is updated to the
+    latest status instead of queueing another one, and dropped when the
+    complaint is back at the status it had before the first change.
+    Returns the number of emails queued or updated.
+    """
+    if not notifications:
+        return 0
+    available_at = timezone.now() + timedelta(seconds=settings.EMAIL_DIGEST_WINDOW)
+
+    with transaction.atomic():
+        # Locked so a dispatcher cannot claim them while they are updated
+        queued = {
+            message.document_id: message
+            for message in OutboxMessage.objects.select_for_update()
+            .filter(
+                kind=STATUS_EMAIL,
+                status=PENDING,
+                document_id__in={notification[0] for notification in notifications},
+            )
+            .order_by('id')
+        }
+        new, changed, dropped = [], {}, []
+        for document_id, complaint_data, status, language, previous_status in notifications:
+            payload = {
+                'complaint': _json_safe({field: complaint_data.get(field) for field in EMAIL_DATA_FIELDS}),
+                'status': status,
+                'language': language,
+            }
+            message = queued.get(document_id)
+            if message is None:
+                message = OutboxMessage(
+                    kind=STATUS_EMAIL,
+                    document_id=document_id,
+                    payload={**payload, 'previous_status': previous_status},
+                    available_at=available_at,
+                )
+                new.append(message)
+                queued[document_id] = message
+            elif message.payload.get('previous_status') == status:
+                # Changed back within the window, there is nothing to tell
+                if message.pk:
+                    dropped.append(message.pk)
+                    changed.pop(message.pk, None)
+                else:
+                    new.remove(message)
+                del queued[document_id]
+            else:
+                message.payload = {**payload, 'previous_status': message.payload.get('previous_status')}
+                if message.pk:
+                    changed[message.pk] = message
+
+        if dropped:
+            OutboxMessage.objects.filter(pk__in=dropped).delete()
+        if changed:
+            OutboxMessage.objects.bulk_update(list(changed.values()), ['payload'], batch_size=500)
+        if new:
+            OutboxMessage.objects.bulk_create(new, batch_size=500)
+
+        document_ids = [message.document_id for message in new]
+        if document_ids:
+            transaction.on_commit(lambda: schedule_dispatch(document_ids, available_at))
+    return len(new) + len(changed)
+
+
+def _json_safe(data):
+    # Firestore documents carry datetimes, JSONField only takes plain JSON
+    return json.loads(json.dumps(data, cls=DjangoJSONEncoder))
+
+
+def _deliver_firestore_update(message):
+    from google.api_core.exceptions import NotFound
+
+    db = firestore.client()
+    try:
+        db.collection('reports').document(message.document_id).update(
+            {**message.payload, 'updated_at': firestore.SERVER_TIMESTAMP}
+        )
+    except NotFound:
+        # Deleted from Firestore since, there is nothing left to update
+        logger.warning(f"Report {message.document_id} no longer exists, dropping outbox update")
+
+
+def _deliver_status_email(message):
+    payload = message.payload
+    if not get_recipient_email(payload['complaint']):
+        logger.info(f"No email address for complaint {message.document_id}, skipping status email")
+        return SKIPPED
+    allowance, retry_at = email_allowance(message.lock_token)
+    if allowance < 1:
+        raise DeliveryDeferred(retry_at)
+    if not send_status_update_email(payload['complaint'], payload['status'], payload['language']):
+        raise RuntimeError('Status email was not sent')
+
+
+def email_allowance(lock_token=''):
+    """How many status emails may be sent now, and when more may if none
+
+    Counts the emails sent within the last minute and day against
+    EMAIL_RATE_LIMIT_PER_MINUTE and EMAIL_DAILY_QUOTA (0 disables a limit),
+    plus the ones other dispatchers are sending right now.
+    """
+    now = timezone.now()
+    in_flight = (
+        OutboxMessage.objects
+        .filter(kind=STATUS_EMAIL, status=PROCESSING)
+        .exclude(lock_token=lock_token)
+        .count()
+    )
+    allowance, retry_at = None, now
+    for limit, window in (
+        (settings.EMAIL_RATE_LIMIT_PER_MINUTE, 60),
+        (settings.EMAIL_DAILY_QUOTA, 24 * 3600),
+    ):
+        if not limit:
+            continue
+        recent = OutboxMessage.objects.filter(
+            kind=STATUS_EMAIL, status=SENT, sent_at__gte=now - timedelta(seconds=window)
+        )
+        left = limit - recent.count() - in_flight
+        if left < 1:
+            # Room frees up as the oldest sends leave the window
+            oldest = recent.order_by('sent_at').values_list('sent_at', flat=True).first()
+            retry_at = max(retry_at, (oldest or now) + timedelta(seconds=window))
+        allowance = left if allowance is None else min(allowance, left)
+    return (float('inf') if allowance is None else max(allowance, 0)), retry_at
+
+
+def _deliver_process_report(message):
+    from .tasks import process_report_message
+
+    process_report_message(message)
+
+
+HANDLERS = {
+    FIRESTORE_UPDATE: _deliver_firestore_update,
+    STATUS_EMAIL: _deliver_status_email,
+    PROCESS_REPORT: _deliver_process_report,
+}
+
+
+def _retry_policy(kind):
+    """(max attempts, first retry delay in seconds) of a message kind"""
+    if kind == PROCESS_REPORT:
+        return settings.REPORT_PROCESSING_MAX_ATTEMPTS, settings.REPORT_PROCESSING_RETRY_DELAY
+    return settings.OUTBOX_MAX_ATTEMPTS, settings.OUTBOX_RETRY_DELAY
+
+
+def _due_filter(now):
+    return (
+        Q(status=PENDING, available_at__lte=now)
+        | Q(status=PROCESSING, locked_until__isnull=True)
+        | Q(status=PROCESSING, locked_until__lt=now)
+    )
+
+
+def claim_messages(limit, document_ids=None):
+    """Claim up to ``limit`` due messages, return them in delivery order
+
+    For every document and kind only the run of due messages from its oldest
+    undelivered one is claimed; a message waiting for a retry blocks the
+    messages of its kind queued after it.
+    """
+    now = timezone.now()
+    due = OutboxMessage.objects.filter(_due_filter(now))
+    if document_ids is not None:
+        due = due.filter(document_id__in=list(document_ids))
+    candidate_documents = set(due.order_by('id').values_list('document_id', flat=True)[:limit])
+    if not candidate_documents:
+        return []
+
+    claimable = []
+    blocked = set()
+    unsent = (
+        OutboxMessage.objects
+        .filter(document_id__in=candidate_documents, status__in=UNSENT_STATUSES)
+        .order_by('id')
+        .only('id', 'document_id', 'kind', 'status', 'available_at', 'locked_until')
+    )
+    for message in unsent:
+        lane = (message.document_id, message.kind)
+        if lane in blocked:
+            continue
+        if not message.is_due(now):
+            blocked.add(lane)
+            continue
+        claimable.append((message.id, message.document_id))
+        if len(claimable) >= limit:
+            break
+
+    token = uuid.uuid4().hex
+    OutboxMessage.objects.filter(_due_filter(now), id__in=[message_id for message_id, _ in claimable]).update(
+        status=PROCESSING,
+        lock_token=token,
+        locked_until=now + timedelta(seconds=settings.OUTBOX_LOCK_TIMEOUT),
+    )
+    claimed = {message.id: message for message in OutboxMessage.objects.filter(lock_token=token)}
+
+    # Another dispatcher may have taken some of them in between; keep each
+    # document's messages only up to the first one that was missed
+    messages, released, missed = [], [], set()
+    for message_id, document_id in claimable:
+        if message_id not in claimed:
+            missed.add(document_id)
+        elif document_id in missed:
+            released.append(message_id)
+        else:
+            messages.append(claimed[message_id])
+    if released:
+        _release(released, token)
+    return messages
+
+
+def _release(message_ids, token):
+    OutboxMessage.objects.filter(id__in=message_ids, lock_token=token).update(
+        status=PENDING, lock_token='', locked_until=None
+    )
+
+
+def _mark_sent(message, status=SENT):
+    OutboxMessage.objects.filter(pk=message.pk, lock_token=message.lock_token).update(
+        status=status,
+        attempts=message.attempts + 1,
+        sent_at=timezone.now(),
+        lock_token='',
+        locked_until=None,
+        last_error='',
+    )
+
+
+def _mark_failed(message, error):
+    """Schedule a retry with exponential backoff, or give up after the kind's max attempts"""
+    now = timezone.now()
+    attempts = message.attempts + 1
+    max_attempts, retry_delay = _retry_policy(message.kind)
+    if attempts >= max_attempts:
+        status, available_at = FAILED, now
+        logger.error(f"Outbox message {message.id} ({message.kind} {message.document_id}) failed for good: {error}")
+    else:
+        delay = min(retry_delay * 2 ** (attempts - 1), settings.OUTBOX_RETRY_MAX_DELAY)
+        status, available_at = PENDING, now + timedelta(seconds=delay)
+        logger.warning(
+            f"Outbox message {message.id} ({message.kind} {message.document_id}) failed, "
+            f"retrying in {delay}s: {error}"
+        )
+    OutboxMessage.objects.filter(pk=message.pk, lock_token=message.lock_token).update(
+        status=status,
+        attempts=attempts,
+        available_at=available_at,
+        lock_token='',
+        locked_until=None,
+        last_error=str(error),
+    )
+    if status == PENDING:
+        schedule_dispatch([message.document_id], available_at)
+
+
+def _defer(messages, until):
+    """Put claimed messages back until ``until`` without counting an attempt"""
+    for message in messages:
+        OutboxMessage.objects.filter(pk=message.pk, lock_token=message.lock_token).update(
+            status=PENDING, available_at=until, lock_token='', locked_until=None
+        )
+    if messages:
+        logger.info(f"Deferred {len(messages)} outbox messages until {until}")
+        schedule_dispatch({message.document_id for message in messages}, until)
+
+
+def deliver(message):
+    """Run a claimed message, return True when it was delivered"""
+    try:
+        outcome = HANDLERS[message.kind](message)
+    except DeliveryDeferred as e:
+        _defer([message], e.until)
+        return False
+    except Exception as e:
+        _mark_failed(message, e)
+        return False
+    _mark_sent(message, status=outcome or SENT)
+    return True
+
+
+def deliver_in_order(messages):
+    """Deliver claimed messages of one document, stopping at the first failure
+
+    Returns ``(delivered, failed)``; messages after a failure are released
+    unattempted so they go out after the failed one is retried.
+    """
+    delivered = 0
+    for index, message in enumerate(messages):
+        if not deliver(message):
+            remaining = messages[index + 1:]
+            if remaining:
+                _release([m.id for m in remaining], message.lock_token)
+            return delivered, 1
+        delivered += 1
+    return delivered, 0
+
+
+def deliver_many(messages):
+    """Deliver claimed messages in bulk, return ``(delivered, failed)``
+
+    Firestore updates go out in WriteBatch commits and status emails over one
+    SMTP connection. After a failed commit the remaining updates fall back to
+    one-by-one delivery, still in order per document. Other kinds (report
+    processing) are delivered one by one.
+    """
+    updates = [m for m in messages if m.kind == FIRESTORE_UPDATE]
+    emails = [m for m in messages if m.kind == STATUS_EMAIL]
+    delivered = failed = 0
+
+    for message in messages:
+        if message.kind not in (FIRESTORE_UPDATE, STATUS_EMAIL):
+            # One message per report, there is no order to keep
+            if deliver(message):
+                delivered += 1
+            else:
+                failed += 1
+
+    written, error = update_reports([(m.document_id, m.payload) for m in updates])
+    for message in updates[:written]:
+        _mark_sent(message)
+    delivered += written
+    if error is not None:
+        logger.warning(f"Batched Firestore update failed, delivering the rest one by one: {error}")
+        documents = {}
+        for message in updates[written:]:
+            documents.setdefault(message.document_id, []).append(message)
+        for document_messages in documents.values():
+            document_delivered, document_failed = deliver_in_order(document_messages)
+            delivered += document_delivered
+            failed += document_failed
+
+    with_recipient = []
+    for message in emails:
+        if get_recipient_email(message.payload['complaint']):
+            with_recipient.append(message)
+        else:
+            _mark_sent(message, status=SKIPPED)
+            delivered += 1
+    if with_recipient:
+        allowance, retry_at = email_allowance(with_recipient[0].lock_token)
+        if allowance < len(with_recipient):
+            _defer(with_recipient[int(allowance):], retry_at)
+            with_recipient = with_recipient[:int(allowance)]
+    if not with_recipient:
+        # Firestore-only work never touches SMTP
+        return delivered, failed
+
+    results = send_status_update_emails([
+        (m.payload['complaint'], m.payload['status'], m.payload['language']) for m in with_recipient
+    ])
+    for message, sent in zip(with_recipient, results):
+        if sent:
+            _mark_sent(message)
+            delivered += 1
+        else:
+            _mark_failed(message, 'Status email was not sent')
+            failed += 1
+
+    return delivered, failed
+
+
+def dispatch_documents(document_ids):
+    """Claim and deliver every due message of the documents in bulk"""
+    delivered = failed = 0
+    document_ids = list(document_ids)
+    # 500 documents per round, the most one Firestore WriteBatch takes
+    for start in range(0, len(document_ids), 500):
+        chunk = document_ids[start:start + 500]
+        # Messages left unclaimed (not due, taken by a dispatcher) go out with dispatch_outbox
+        chunk_delivered, chunk_failed = deliver_many(claim_messages(len(chunk) * 4, document_ids=chunk))
+        delivered += chunk_delivered
+        failed += chunk_failed
+    logger.info(
+        f"Delivered {delivered} outbox messages of {len(document_ids)} complaints, {failed} failed"
+    )
+    return delivered, failed
+
+
+def dispatch_documents_in_background(document_ids):
+    """Run dispatch_documents on the inline pool once the transaction commits"""
+    document_ids = list(document_ids)
+    transaction.on_commit(lambda: schedule_dispatch(document_ids))
+
+
+def schedule_dispatch(document_ids, at=None):
+    """Dispatch the documents' messages on the inline pool, now or at ``at``
+
+    Does nothing without OUTBOX_DISPATCH_INLINE; whatever is not delivered
+    inline (e.g. after a restart) is left to dispatch_outbox.
+    """
+    if not settings.OUTBOX_DISPATCH_INLINE:
+        return
+    document_ids = list(document_ids)
+    if at is None or at <= timezone.now():
+        _get_executor().submit(_dispatch_documents_job, document_ids)
+    else:
+        _scheduler.schedule(document_ids, at.timestamp())
+
+
+def _dispatch_documents_job(document_ids):
+    try:
+        dispatch_documents(document_ids)
+    except Exception as e:
+        logger.error(f"Error dispatching outbox messages of {len(document_ids)} complaints: {e}")
+    finally:
+        connection.close()
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=settings.OUTBOX_INLINE_WORKERS,
+                    thread_name_prefix="outbox-worker",
+                )
+    return _executor
+
+
+class _DispatchScheduler:
+    """One thread that hands delayed dispatches to the inline pool when due"""
+
+    def __init__(self):
+        self._heap = []
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+        self._thread = None
+
+    def schedule(self, document_ids, when):
+        with self._condition:
+            heapq.heappush(self._heap, (when, next(self._counter), document_ids))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="outbox-scheduler", daemon=True)
+                self._thread.start()
+            self._condition.notify()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._heap or self._heap[0][0] > time.time():
+                    self._condition.wait(self._heap[0][0] - time.time() if self._heap else None)
+                # Everything due goes out in one dispatch
+                due = {}
+                while self._heap and self._heap[0][0] <= time.time():
+                    due.update(dict.fromkeys(heapq.heappop(self._heap)[2]))
+            _get_executor().submit(_dispatch_documents_job, list(due))
+
+
+_scheduler = _DispatchScheduler()
+
+
+def dispatch_after_commit(document_id):
+    """Deliver the document's messages in the background once the transaction commits"""
+    dispatch_documents_in_background([document_id])
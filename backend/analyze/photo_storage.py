@@ -0,0 +1,279 @@
+"""
+Storage backends for report photos.
+
+Every backend offers put / put_stream / get / url / delete on paths such as
+``reports/20250601/20250601_101500_ab12cd34.jpg``. Backends whose
+``supports_resumable`` is true also offer create_upload_session. The backend is chosen by
+``settings.PHOTO_STORAGE_BACKEND`` (a dotted class path):
+
+- ``GCSPhotoStorage`` stores photos in the public Google Cloud Storage bucket.
+- ``LocalPhotoStorage`` stores them under a directory on disk, so the
+  submission path can be benchmarked and load-tested without cloud
+  credentials.
+
+With ``PHOTO_LOCAL_TIER`` on, a size-bounded local copy of recently stored
+photos sits in front of the configured backend and serves reads.
+"""
+import logging
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+
+class GCSPhotoStorage:
+    """Photos in a public Google Cloud Storage bucket."""
+
+    supports_resumable = True
+
+    def __init__(self, bucket_name=None, chunk_size=None):
+        self.bucket_name = bucket_name or settings.PHOTO_BUCKET_NAME
+        self.chunk_size = chunk_size or settings.PHOTO_UPLOAD_CHUNK_SIZE
+        self._bucket = None
+
+    @property
+    def bucket(self):
+        # Resolved lazily so importing this module never needs Firebase
+        if self._bucket is None:
+            from firebase_admin import storage
+
+            self._bucket = storage.bucket(self.bucket_name)
+        return self._bucket
+
+    def put(self, path, data, content_type):
+        self.bucket.blob(path).upload_from_string(data, content_type=content_type)
+
+    def put_stream(self, path, fileobj, content_type, size=None):
+        """Files up to chunk_size go up in a single request; larger or
+        unknown-size files use a chunked resumable upload, so memory use stays
+        bounded by the chunk size whatever the photo size."""
+        blob = self.bucket.blob(path)
+        if size is not None and size <= self.chunk_size:
+            blob.upload_from_file(fileobj, size=size, content_type=content_type)
+        else:
+            with blob.open("wb", chunk_size=self.chunk_size, content_type=content_type) as out:
+                shutil.copyfileobj(fileobj, out, 256 * 1024)
+
+    def get(self, path):
+        from google.api_core.exceptions import NotFound
+
+        try:
+            return self.bucket.blob(path).download_as_bytes()
+        except NotFound as e:
+            raise FileNotFoundError(path) from e
+
+    def url(self, path):
+        # Note: Public access to bucket or blob must be configured in GCP
+        return f"https://storage.googleapis.com/{self.bucket_name}/{path}"
+
+    def delete(self, path):
+        from google.api_core.exceptions import NotFound
+
+        try:
+            self.bucket.blob(path).delete()
+        except NotFound:
+            pass
+
+    def create_upload_session(self, path, content_type, size=None, origin=None):
+        """Start a resumable upload the client can send bytes to directly."""
+        return self.bucket.blob(path).create_resumable_upload_session(
+            content_type=content_type, size=size, origin=origin
+        )
+
+
+class LocalPhotoStorage:
+    """Photos in a directory on local disk, served by PhotoFileView."""
+
+    supports_resumable = False
+
+    def __init__(self, root=None, base_url=None):
+        self.root = Path(root or settings.PHOTO_LOCAL_ROOT)
+        self.base_url = (base_url or settings.PHOTO_LOCAL_BASE_URL).rstrip("/")
+
+    def local_path(self, path):
+        """Absolute file path for a photo path, refusing paths outside root."""
+        full_path = (self.root / path).resolve()
+        if not full_path.is_relative_to(self.root.resolve()):
+            raise ValueError(f"Invalid photo path: {path}")
+        return full_path
+
+    def _write(self, path, write):
+        full_path = self.local_path(path)
+        full_path.parent.mkdir(parents=True, exist_ok=True)
+        # Write to a temporary file first so readers never see a partial photo
+        fd, tmp_path = tempfile.mkstemp(dir=full_path.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as out:
+                write(out)
+            os.replace(tmp_path, full_path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        return full_path
+
+    def put(self, path, data, content_type=None):
+        return self._write(path, lambda out: out.write(data))
+
+    def put_stream(self, path, fileobj, content_type=None, size=None):
+        return self._write(path, lambda out: shutil.copyfileobj(fileobj, out, 256 * 1024))
+
+    def get(self, path):
+        with open(self.local_path(path), "rb") as f:
+            return f.read()
+
+    def exists(self, path):
+        return self.local_path(path).is_file()
+
+    def url(self, path):
+        return f"{self.base_url}/{path}"
+
+    def delete(self, path):
+        try:
+            self.local_path(path).unlink()
+        except FileNotFoundError:
+            pass
+
+
+class TieredPhotoStorage:
+    """A size-bounded local copy of recent photos in front of another backend.
+
+    Writes go to both tiers, reads are served locally when possible, and the
+    oldest local copies are dropped once the tier exceeds ``max_bytes``. URLs
+    always come from the backing storage.
+
+    The local tier is walked once, at startup; after that the size of every
+    local copy is kept in an index ordered oldest first, so trimming after a
+    write never rescans the directory.
+    """
+
+    def __init__(self, backing, local, max_bytes):
+        self.backing = backing
+        self.local = local
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._stats = {"local_hits": 0, "local_misses": 0, "evictions": 0}
+        self._index = OrderedDict()
+        self._total = 0
+        self._load_index()
+
+    def put(self, path, data, content_type):
+        self.backing.put(path, data, content_type)
+        self._keep_local(path, len(data), lambda: self.local.put(path, data, content_type))
+
+    def put_stream(self, path, fileobj, content_type, size=None):
+        # The stream can only be read once: spool it to the local tier and
+        # upload from there.
+        self.local.put_stream(path, fileobj, content_type, size)
+        try:
+            with open(self.local.local_path(path), "rb") as f:
+                self.backing.put_stream(path, f, content_type, size)
+        except Exception:
+            self.local.delete(path)
+            raise
+        self._add(path, os.path.getsize(self.local.local_path(path)))
+
+    def get(self, path):
+        try:
+            data = self.local.get(path)
+        except FileNotFoundError:
+            pass
+        else:
+            with self._lock:
+                self._stats["local_hits"] += 1
+            return data
+
+        with self._lock:
+            self._stats["local_misses"] += 1
+        data = self.backing.get(path)
+        self._keep_local(path, len(data), lambda: self.local.put(path, data))
+        return data
+
+    def url(self, path):
+        return self.backing.url(path)
+
+    def delete(self, path):
+        self.local.delete(path)
+        with self._lock:
+            self._total -= self._index.pop(path, 0)
+        self.backing.delete(path)
+
+    @property
+    def supports_resumable(self):
+        return self.backing.supports_resumable
+
+    def create_upload_session(self, path, content_type, size=None, origin=None):
+        return self.backing.create_upload_session(path, content_type, size, origin)
+
+    def stats(self):
+        with self._lock:
+            return {**self._stats, "local_files": len(self._index), "local_bytes": self._total}
+
+    def _keep_local(self, path, size, write):
+        # The local tier is only a cache, losing a copy is not an error
+        try:
+            write()
+        except Exception as e:
+            logger.warning(f"Could not keep local copy of {path}: {e}")
+            return
+        self._add(path, size)
+
+    def _load_index(self):
+        root = self.local.root
+        if not root.is_dir():
+            return
+        files = []
+        for entry in root.rglob("*"):
+            if entry.is_file() and entry.suffix != ".tmp":
+                stat = entry.stat()
+                files.append((stat.st_mtime, entry.relative_to(root).as_posix(), stat.st_size))
+        files.sort()
+        for _, path, size in files:
+            self._index[path] = size
+            self._total += size
+        self._trim()
+
+    def _add(self, path, size):
+        with self._lock:
+            self._total += size - self._index.pop(path, 0)
+            self._index[path] = size
+        self._trim()
+
+    def _trim(self):
+        # Pick the oldest copies under the lock, unlink them outside it
+        evicted = []
+        with self._lock:
+            while self._total > self.max_bytes and self._index:
+                path, size = self._index.popitem(last=False)
+                self._total -= size
+                self._stats["evictions"] += 1
+                evicted.append(path)
+        for path in evicted:
+            self.local.delete(path)
+
+
+_photo_storage = None
+_photo_storage_lock = threading.Lock()
+
+
+def get_photo_storage():
+    """Return the process-wide photo storage configured in settings."""
+    global _photo_storage
+    if _photo_storage is None:
+        with _photo_storage_lock:
+            if _photo_storage is None:
+                photo_storage = import_string(settings.PHOTO_STORAGE_BACKEND)()
+                if settings.PHOTO_LOCAL_TIER and not isinstance(photo_storage, LocalPhotoStorage):
+                    photo_storage = TieredPhotoStorage(
+                        photo_storage,
+                        LocalPhotoStorage(root=settings.PHOTO_LOCAL_TIER_ROOT),
+                        settings.PHOTO_LOCAL_TIER_MAX_BYTES,
+                    )
+                _photo_storage = photo_storage
+    return _photo_storage
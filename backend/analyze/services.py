@@ -2,11 +2,19 @@ import json
 import os
 import base64
 from openai import OpenAI
-from firebase_admin import firestore, storage
+from firebase_admin import firestore
 from dotenv import load_dotenv
 import requests
 from io import BytesIO
 from datetime import datetime
+import uuid
+import hashlib
+import mimetypes
+from django.conf import settings
+from .classification_cache import get_classification_cache, normalize_report_text
+from .images import normalize_photo
+from .local_classifier import get_local_classifier
+from .photo_storage import get_photo_storage
 
 
 load_dotenv()
@@ -45,11 +53,19 @@ def get_openai_client():
         )
     return OpenAI(api_key=api_key)
 
-def analyze_report_text(report_text):
-    """Analyze report text using OpenAI to determine the service and agency."""
-    # Create a prompt for OpenAI
-    agencies_list = "\n".join([f"- {agency}" for agency in AGENCIES])
-    prompt = f"""Given the following report text, determine which government agency it relates to from the list below.
+class ClassificationError(Exception):
+    """Raised when the model could not be reached or returned unusable output."""
+
+
+SPAM_RESULT = {"service": "Spam", "agency": "Spam", "importance": "low"}
+
+
+OPENAI_MODEL = "gpt-3.5-turbo"
+OPENAI_TEMPERATURE = 0.3
+
+SYSTEM_PROMPT = "You are a helpful assistant that categorizes citizen reports into government agencies. You must return only valid JSON."
+
+PROMPT_TEMPLATE = """Given the following report text, determine which government agency it relates to from the list below.
     You must return a valid JSON object with exactly these fields: service and agency.
     The agency must match exactly one of the agencies from the list below.
     The service should be a specific service or issue that the citizen is complaining about.
@@ -66,72 +82,311 @@ def analyze_report_text(report_text):
     {{"service": "Spam", "agency": "Spam", "importance": "low"}}
     """
 
+BATCH_PROMPT_TEMPLATE = """For each of the numbered citizen reports below, determine which government agency it relates to from the list below.
+    The agency must match exactly one of the agencies from the list below.
+    The service should be a specific service or issue that the citizen is complaining about.
+
+    Reports:
+    {reports}
+
+    Available agencies:
+    {agencies_list}
+
+    Return ONLY a JSON array with exactly {count} objects, one per report and in the same order, in this exact format:
+    [{{"index": 1, "service": "specific service the persons issue is related to, dont use issue as service name", "agency": "exact agency name from list", "importance": "low, medium, high"}}]
+
+    if you deem a report does not belong to any of the agencies, or does not contain any relevant information, use:
+    {{"index": <number>, "service": "Spam", "agency": "Spam", "importance": "low"}}
+    """
+
+IMPORTANCE_LEVELS = ("low", "medium", "high", "critical")
+
+# Changes whenever the prompts, model or agency list do, so cached
+# classifications from an older prompt are never served.
+PROMPT_VERSION = hashlib.sha256(
+    "\x00".join(
+        [
+            OPENAI_MODEL,
+            str(OPENAI_TEMPERATURE),
+            SYSTEM_PROMPT,
+            PROMPT_TEMPLATE,
+            BATCH_PROMPT_TEMPLATE,
+            *AGENCIES,
+        ]
+    ).encode("utf-8")
+).hexdigest()[:16]
+
+
+def _agencies_list():
+    return "\n".join([f"- {agency}" for agency in AGENCIES])
+
+
+def _request_completion(prompt):
+    """Send one prompt to OpenAI and return the raw response text."""
     try:
         # Get response from OpenAI
         client = get_openai_client()
         response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
+            model=OPENAI_MODEL,
             messages=[
                 {
                     "role": "system",
-                    "content": "You are a helpful assistant that categorizes citizen reports into government agencies. You must return only valid JSON.",
+                    "content": SYSTEM_PROMPT,
                 },
                 {"role": "user", "content": prompt},
             ],
-            temperature=0.3,
+            temperature=OPENAI_TEMPERATURE,
         )
+    except ValueError as e:
+        raise ClassificationError(f"OpenAI client error: {str(e)}") from e
+    except Exception as e:
+        raise ClassificationError(f"Unexpected error: {str(e)}") from e
 
-        # Get the response content
-        response_content = response.choices[0].message.content.strip()
-        print(f"OpenAI Response: {response_content}")
+    # Get the response content
+    response_content = response.choices[0].message.content.strip()
+    print(f"OpenAI Response: {response_content}")
+    return response_content
 
-        # Parse the response
-        try:
-            result = json.loads(response_content)
-            if (
-                not isinstance(result, dict)
-                or "service" not in result
-                or "agency" not in result
-            ):
-                print("Invalid response format - missing required fields")
-                return {"service": "Spam", "agency": "Spam", "importance": "low"}
-
-            # Verify the agency exists in our list
-            agency_exists = result["agency"] in AGENCIES
-
-            if not agency_exists:
-                print(f"Agency not found in our list: {result}")
-                return {"service": "Spam", "agency": "Spam", "importance": "low"}
-
-            return result
-        except json.JSONDecodeError as e:
-            print(f"JSON parsing error: {str(e)}")
-            return {"service": "Spam", "agency": "Spam", "importance": "low"}
-    except ValueError as e:
-        print(f"OpenAI client error: {str(e)}")
-        return {"service": "Spam", "agency": "Spam", "importance": "low"}
+
+def get_cache():
+    """Return the classification cache for the current prompt version."""
+    return get_classification_cache(PROMPT_VERSION)
+
+
+def classify_report_text(report_text):
+    """Ask OpenAI for the service and agency of a report.
+
+    Unlike analyze_report_text this raises ClassificationError when the API
+    call fails, so callers that retry can tell a transient failure apart from
+    a genuine "Spam" verdict. Answers are served from the classification
+    cache when the same (normalized) text was classified before.
+    """
+    cache = get_cache()
+    cached = cache.get(report_text)
+    if cached is not None:
+        return cached
+
+    # Answer locally when the offline model is confident enough
+    local_result = classify_locally(report_text, settings.LOCAL_CLASSIFIER_THRESHOLD)
+    if local_result is not None:
+        return local_result
+
+    # Create a prompt for OpenAI
+    prompt = PROMPT_TEMPLATE.format(
+        report_text=report_text, agencies_list=_agencies_list()
+    )
+    response_content = _request_completion(prompt)
+
+    # Parse the response
+    try:
+        result = json.loads(response_content)
+    except json.JSONDecodeError as e:
+        print(f"JSON parsing error: {str(e)}")
+        return dict(SPAM_RESULT)
+
+    if (
+        not isinstance(result, dict)
+        or "service" not in result
+        or "agency" not in result
+    ):
+        print("Invalid response format - missing required fields")
+        return dict(SPAM_RESULT)
+
+    # An explicit spam verdict is a real answer and worth caching
+    if result["agency"] == "Spam":
+        cache.set(report_text, SPAM_RESULT)
+        return dict(SPAM_RESULT)
+
+    # Verify the agency exists in our list
+    agency_exists = result["agency"] in AGENCIES
+
+    if not agency_exists:
+        print(f"Agency not found in our list: {result}")
+        return dict(SPAM_RESULT)
+
+    result.setdefault("importance", "medium")
+    cache.set(report_text, result)
+    return result
+
+
+def classify_locally(report_text, threshold=0.0):
+    """Classify with the offline model, or return None if it is missing or unsure."""
+    classifier = get_local_classifier()
+    if classifier is None:
+        return None
+    try:
+        result, confidence = classifier.predict(report_text)
     except Exception as e:
-        print(f"Unexpected error: {str(e)}")
-        return {"service": "Spam", "agency": "Spam", "importance": "low"}
+        print(f"Local classifier error: {str(e)}")
+        return None
+    if confidence < threshold:
+        return None
+    print(f"Local classifier: {result['agency']} ({confidence:.2f})")
+    return result
+
+
+def fallback_classification(report_text):
+    """Best answer available without OpenAI: the local model's guess, else Spam."""
+    return classify_locally(report_text) or dict(SPAM_RESULT)
+
+
+def analyze_report_text(report_text):
+    """Analyze report text using OpenAI to determine the service and agency."""
+    try:
+        return classify_report_text(report_text)
+    except ClassificationError as e:
+        print(str(e))
+        return fallback_classification(report_text)
+
+
+def _validate_batch_entry(entry):
+    """Return a clean classification for one batch entry, or None if unusable."""
+    if not isinstance(entry, dict) or "service" not in entry or "agency" not in entry:
+        return None
+    if entry["agency"] == "Spam":
+        return dict(SPAM_RESULT)
+    if entry["agency"] not in AGENCIES:
+        print(f"Agency not found in our list: {entry}")
+        return None
+
+    importance = entry.get("importance")
+    return {
+        "service": entry["service"],
+        "agency": entry["agency"],
+        "importance": importance if importance in IMPORTANCE_LEVELS else "medium",
+    }
+
+
+def _parse_batch_response(response_content, count):
+    """Map a model JSON array back onto ``count`` positions (None = unusable)."""
+    results = [None] * count
+    try:
+        entries = json.loads(response_content)
+    except json.JSONDecodeError as e:
+        print(f"JSON parsing error: {str(e)}")
+        return results
+
+    if isinstance(entries, dict):
+        entries = entries.get("results") or entries.get("reports") or []
+    if not isinstance(entries, list):
+        print("Invalid batch response format - expected a JSON array")
+        return results
+
+    for position, entry in enumerate(entries):
+        index = entry.get("index") if isinstance(entry, dict) else None
+        # Trust the echoed number when present, fall back to array order
+        slot = index - 1 if isinstance(index, int) and 1 <= index <= count else position
+        if slot < count and results[slot] is None:
+            results[slot] = _validate_batch_entry(entry)
+    return results
+
+
+def classify_reports_batch(report_texts, batch_size=None):
+    """Classify many reports with one model request per chunk.
+
+    Returns a list of results aligned with ``report_texts``. Cached texts,
+    texts the local model is confident about and duplicates within the input
+    cost nothing; entries the model skipped or
+    answered with an unknown agency are retried one by one. Raises
+    ClassificationError when the API cannot be reached.
+    """
+    batch_size = batch_size or settings.CLASSIFICATION_BATCH_SIZE
+    cache = get_cache()
+    results = [None] * len(report_texts)
+
+    # Group identical (normalized) texts so each is sent only once
+    pending = {}
+    for i, text in enumerate(report_texts):
+        cached = cache.get(text)
+        if cached is None:
+            cached = classify_locally(text, settings.LOCAL_CLASSIFIER_THRESHOLD)
+        if cached is not None:
+            results[i] = cached
+        else:
+            pending.setdefault(normalize_report_text(text), []).append(i)
+
+    groups = list(pending.values())
+    for start in range(0, len(groups), batch_size):
+        chunk = groups[start : start + batch_size]
+        texts = [report_texts[indexes[0]] for indexes in chunk]
+        numbered = "\n".join(
+            f"{n}. {' '.join(text.split())}" for n, text in enumerate(texts, start=1)
+        )
+        prompt = BATCH_PROMPT_TEMPLATE.format(
+            reports=numbered, agencies_list=_agencies_list(), count=len(texts)
+        )
+        parsed = _parse_batch_response(_request_completion(prompt), len(texts))
+
+        for text, indexes, result in zip(texts, chunk, parsed):
+            if result is None:
+                result = classify_report_text(text)
+            else:
+                cache.set(text, result)
+            for i in indexes:
+                results[i] = dict(result)
+
+    return results
+
+
+def update_reports(updates):
+    """Write field updates to many reports with batched commits.
+
+    Used for classifications, the outbox and bulk status changes.
+    ``updates`` is a list of ``(document_id, fields)`` pairs, written in
+    order; ``updated_at`` is set on every document. Stops at the first failed
+    commit and returns ``(written, error)``: the first ``written`` pairs are
+    stored, ``error`` is the exception of the failed commit or None.
+    """
+    if not updates:
+        return 0, None
+    db = firestore.client()
+    written = 0
+    # Firestore allows at most 500 writes per batch
+    for start in range(0, len(updates), 500):
+        chunk = updates[start : start + 500]
+        batch = db.batch()
+        for document_id, fields in chunk:
+            batch.update(
+                db.collection("reports").document(document_id),
+                {**fields, "updated_at": firestore.SERVER_TIMESTAMP},
+            )
+        try:
+            batch.commit()
+        except Exception as e:
+            return written, e
+        written += len(chunk)
+    return written, None
+
+
+def generate_report_id():
+    """Generate a unique Firestore document ID for a report without an ``rpt``."""
+    return f"report_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}"
+
 
+def validate_report(report_data):
+    """Check the minimum a report needs before it can be accepted."""
+    report_text = report_data.get("report_text")
+    if not isinstance(report_text, str) or not report_text.strip():
+        raise ValueError("report_text is required")
 
-def save_to_firebase(report_data):
+
+def save_to_firebase(report_data, document_id=None):
     """Save the report data to Firebase Firestore."""
     try:
         # Get Firestore client
         db = firestore.client()
 
         # Use the provided ID if available, otherwise generate a unique one
-        document_id = (
-            report_data.get("rpt")
-            or f"report_{datetime.now().strftime('%Y%m%d_%H%m%S')}"
-        )
+        document_id = document_id or report_data.get("rpt") or generate_report_id()
         print("report_data", report_data)
         print("report_data rpt", report_data.get("rpt"))
         
 
-        # Add the report to the 'reports' collection with the specified document ID
-        db.collection("reports").document(document_id).set(report_data)
+        # Add the report to the 'reports' collection with the specified document ID;
+        # updated_at drives incremental sync (sync_firestore --incremental)
+        db.collection("reports").document(document_id).set(
+            {**report_data, "updated_at": firestore.SERVER_TIMESTAMP}
+        )
 
         return True
     except Exception as e:
@@ -139,65 +394,164 @@ def save_to_firebase(report_data):
         return False
 
 
+def decode_photo_data(photo_data_url):
+    """Decode a base64 data URL into ``(photo_bytes, content_type)``.
+
+    Returns ``(None, None)`` when the value is not a base64 data URL and
+    raises ValueError when the base64 payload itself is broken.
+    """
+    # Extract base64 string from data URL (e.g., remove 'data:image/jpeg;base64,')
+    if ";base64," not in photo_data_url:
+        # If not a data URL with base64, assume it's not a valid photo data to upload
+        print("Photo data is not a valid base64 data URL. Skipping upload.")
+        return None, None
+
+    header, base64_string = photo_data_url.split(",", 1)
+    # Attempt to decode base64 string
+    try:
+        photo_bytes = base64.b64decode(base64_string)
+        print("Successfully decoded base64 photo data")
+    except Exception as decode_error:
+        print(f"Base64 decode error: {str(decode_error)}")
+        raise ValueError("Invalid base64 data")  # Raise error for invalid data
+
+    # Determine content type from header if possible, otherwise default
+    content_type = "image/jpeg"  # Default
+    if header.startswith("data:") and ";" in header:
+        content_type_part = header[5 : header.index(";")]
+        if "/" in content_type_part:
+            content_type = content_type_part
+    print(f"Determined content type: {content_type}")
+
+    return photo_bytes, content_type
+
+
+def _new_photo_stem():
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    date_path = datetime.now().strftime("%Y%m%d")
+    return f"reports/{date_path}/{timestamp}_{uuid.uuid4().hex[:8]}"
+
+
+def _photo_extension(content_type):
+    extension = mimetypes.guess_extension(content_type or "") or ".jpg"
+    return ".jpg" if extension in (".jpe", ".jpeg") else extension
+
+
+def _new_photo_path(content_type=None):
+    return _new_photo_stem() + _photo_extension(content_type)
+
+
+def is_own_photo_url(photo_url):
+    """True if the URL points at a report photo in our own photo storage."""
+    return isinstance(photo_url, str) and photo_url.startswith(
+        get_photo_storage().url("reports/")
+    )
+
+
+def drop_foreign_photo_url(report_data):
+    """A photo uploaded beforehand may only come from our own storage."""
+    for field in ("photo_url", "photo_thumbnail_url"):
+        if report_data.get(field) and not is_own_photo_url(report_data[field]):
+            print(f"Ignoring foreign {field}: {report_data[field]}")
+            report_data[field] = None
+
+
+def upload_photo(photo_bytes, content_type=None):
+    """Store photo bytes in the photo storage and return the public URL."""
+    photo_storage = get_photo_storage()
+    photo_path = _new_photo_path(content_type)
+    print(f"Uploading to photo path: {photo_path}")
+
+    # Upload from bytes
+    photo_storage.put(
+        photo_path, photo_bytes, content_type or "image/jpeg"
+    )  # Use determined content type or default
+    print("Successfully uploaded photo")
+
+    public_url = photo_storage.url(photo_path)
+    print(f"Generated public URL: {public_url}")
+    return public_url
+
+
+def upload_photo_stream(fileobj, content_type=None, size=None):
+    """Stream a file-like object to the photo storage and return the public URL.
+
+    Memory use stays bounded by PHOTO_UPLOAD_CHUNK_SIZE whatever the photo size.
+    """
+    photo_storage = get_photo_storage()
+    content_type = content_type or "image/jpeg"
+    photo_path = _new_photo_path(content_type)
+    photo_storage.put_stream(photo_path, fileobj, content_type, size)
+
+    public_url = photo_storage.url(photo_path)
+    print(f"Streamed photo to {public_url}")
+    return public_url
+
+
+def create_photo_upload_session(content_type=None, size=None, origin=None):
+    """Start a resumable upload the client can send bytes to directly.
+
+    Returns ``(upload_url, photo_url)``; the client PUTs the image (in as many
+    Content-Range chunks as it likes) to ``upload_url`` and then submits the
+    report with ``photo_url``. Only for storages whose
+    ``supports_resumable`` is true.
+    """
+    photo_storage = get_photo_storage()
+    content_type = content_type or "image/jpeg"
+    photo_path = _new_photo_path(content_type)
+    upload_url = photo_storage.create_upload_session(
+        photo_path, content_type, size=size, origin=origin
+    )
+    return upload_url, photo_storage.url(photo_path)
+
+
+def store_report_photo(source, content_type=None, size=None):
+    """Store a report photo and return the photo fields for the report.
+
+    ``source`` is bytes or a file-like object. With PHOTO_NORMALIZE on, the
+    photo is re-encoded without EXIF and downscaled, and a thumbnail is stored
+    next to it; the result is ``{"photo_url", "photo_thumbnail_url"}``.
+    Raises ValueError when the data is not a supported image.
+    """
+    if not settings.PHOTO_NORMALIZE:
+        if isinstance(source, (bytes, bytearray)):
+            return {"photo_url": upload_photo(source, content_type), "photo_thumbnail_url": None}
+        return {
+            "photo_url": upload_photo_stream(source, content_type, size),
+            "photo_thumbnail_url": None,
+        }
+
+    photo = normalize_photo(source)
+    print(
+        f"Normalized {photo.source_format} photo to {photo.width}x{photo.height}, "
+        f"{len(photo.data)} bytes (thumbnail {len(photo.thumbnail)} bytes)"
+    )
+
+    photo_storage = get_photo_storage()
+    stem = _new_photo_stem()
+    photo_path = f"{stem}.{photo.extension}"
+    thumbnail_path = f"{stem}_thumb.{photo.extension}"
+    photo_storage.put(photo_path, photo.data, photo.content_type)
+    photo_storage.put(thumbnail_path, photo.thumbnail, photo.content_type)
+    return {
+        "photo_url": photo_storage.url(photo_path),
+        "photo_thumbnail_url": photo_storage.url(thumbnail_path),
+    }
+
+
 def process_report(report_data):
     """Process a report: analyze it and save to Firebase."""
+    drop_foreign_photo_url(report_data)
+
     # Handle photo upload if present
     if "photo_data" in report_data and report_data["photo_data"]:
         try:
             print("Starting photo upload process...")
-            # Get photo data
-            photo_data_url = report_data["photo_data"]
-
-            # Extract base64 string from data URL (e.g., remove 'data:image/jpeg;base64,')
-            if ";base64," in photo_data_url:
-                header, base64_string = photo_data_url.split(",", 1)
-                # Attempt to decode base64 string
-                try:
-                    photo_bytes = base64.b64decode(base64_string)
-                    print("Successfully decoded base64 photo data")
-
-                    # Determine content type from header if possible, otherwise default
-                    content_type = "image/jpeg"  # Default
-                    if header.startswith("data:") and ";" in header:
-                        content_type_part = header[5 : header.index(";")]
-                        if "/" in content_type_part:
-                            content_type = content_type_part
-                    print(f"Determined content type: {content_type}")
-
-                except Exception as decode_error:
-                    print(f"Base64 decode error: {str(decode_error)}")
-                    raise ValueError(
-                        "Invalid base64 data"
-                    )  # Raise error for invalid data
-            else:
-                # If not a data URL with base64, assume it's not a valid photo data to upload
-                print("Photo data is not a valid base64 data URL. Skipping upload.")
-                photo_bytes = None  # Do not upload if data is not in expected format
-                content_type = None
+            photo_bytes, content_type = decode_photo_data(report_data["photo_data"])
 
             if photo_bytes:
-                # Upload photo data to GCP
-                bucket = storage.bucket("public-pulse")
-                timestamp = datetime.now().strftime(
-                    "%Y%m%d_%H%m%S"
-                )  # Fixed time format
-                date_path = datetime.now().strftime("%Y%m%d")
-                blob_path = f"reports/{date_path}/{timestamp}.jpg"  # Keep as jpg for consistency, consider parsing extension from content_type if needed
-                print(f"Uploading to blob path: {blob_path}")
-                blob = bucket.blob(blob_path)
-
-                # Upload from bytes
-                blob.upload_from_string(
-                    photo_bytes, content_type=content_type or "image/jpeg"
-                )  # Use determined content type or default
-                print("Successfully uploaded photo to GCP")
-
-                # Generate the public URL
-                # Construct the URL correctly
-                # Note: Public access to bucket or blob must be configured in GCP
-                public_url = f"https://storage.googleapis.com/{bucket.name}/{blob_path}"
-                print(f"Generated public URL: {public_url}")
-                report_data["photo_url"] = public_url
+                # Normalize and store photo data
+                report_data.update(store_report_photo(photo_bytes, content_type))
                 # Keep photo_data in report_data for now, can remove later if not needed downstream
                 # del report_data["photo_data"]
                 print(
@@ -211,9 +565,10 @@ def process_report(report_data):
                     del report_data["photo_data"]
 
         except Exception as e:
-            print(f"Error uploading photo to GCP: {str(e)}")
+            print(f"Error uploading photo: {str(e)}")
             print(f"Error type: {type(e)}")
             report_data["photo_url"] = None
+            report_data["photo_thumbnail_url"] = None
             if "photo_data" in report_data:
                 del report_data["photo_data"]
 
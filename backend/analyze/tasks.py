@@ -0,0 +1,231 @@
+"""
+Background processing for reports submitted in asynchronous mode.
+
+The HTTP request only validates the report and stores it in Firestore with
+``processing_status = "queued"``; photo upload and classification are queued
+as a ``process_report`` outbox message in the same step. The message holds
+everything the job needs (the photo included), so a queued report survives a
+restart: it is picked up again by ``dispatch_outbox`` or, right after the
+request, by a worker pool. Each delivery is one attempt; failed attempts are
+retried with backoff by the outbox.
+"""
+import base64
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connection, transaction
+from firebase_admin import firestore
+
+from .models import OutboxMessage
+from .outbox import PROCESS_REPORT, UNSENT_STATUSES, dispatch_documents
+from .services import (
+    classify_report_text,
+    decode_photo_data,
+    drop_foreign_photo_url,
+    fallback_classification,
+    generate_report_id,
+    save_to_firebase,
+    store_report_photo,
+    validate_report,
+)
+
+logger = logging.getLogger(__name__)
+
+PROCESSING_QUEUED = "queued"
+PROCESSING_RUNNING = "processing"
+PROCESSING_DONE = "done"
+PROCESSING_FAILED = "failed"
+
+
+class QueueFull(Exception):
+    """Raised when REPORT_QUEUE_MAX_SIZE reports are already waiting"""
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """Return the shared worker pool, creating it on first use."""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=settings.REPORT_WORKER_COUNT,
+                    thread_name_prefix="report-worker",
+                )
+    return _executor
+
+
+def submit_report(report_data, photo_upload=None):
+    """Store a report right away and queue its processing.
+
+    ``photo_upload`` is an optional ``(photo_bytes, content_type)`` pair of a
+    photo sent as a file; it is stored by the worker like ``photo_data``.
+    Returns ``(document_id, stored_data)``. Raises ValueError when the report
+    is invalid, QueueFull when REPORT_QUEUE_MAX_SIZE reports are waiting and
+    RuntimeError when it could not be stored.
+    """
+    validate_report(report_data)
+
+    report_data = dict(report_data)
+    drop_foreign_photo_url(report_data)
+    document_id = report_data.get("rpt") or generate_report_id()
+
+    # The raw photo never goes to Firestore, the worker uploads it instead
+    photo_data = report_data.pop("photo_data", None)
+    photo_bytes, content_type = photo_upload or (None, None)
+    job = {
+        "report_text": report_data["report_text"],
+        "photo_url": report_data.get("photo_url"),
+        "photo_thumbnail_url": report_data.get("photo_thumbnail_url"),
+        "photo_data": photo_data if isinstance(photo_data, str) else None,
+        "photo_upload": {
+            "data": base64.b64encode(photo_bytes).decode("ascii"),
+            "content_type": content_type,
+        } if photo_bytes else None,
+    }
+
+    report_data["processing_status"] = PROCESSING_QUEUED
+    report_data["processing_attempts"] = 0
+
+    with transaction.atomic():
+        queued = OutboxMessage.objects.filter(kind=PROCESS_REPORT, status__in=UNSENT_STATUSES).count()
+        if queued >= settings.REPORT_QUEUE_MAX_SIZE:
+            raise QueueFull(f"{queued} reports are waiting to be processed")
+
+        OutboxMessage.objects.create(kind=PROCESS_REPORT, document_id=document_id, payload=job)
+        # Rolls the job back when the report itself could not be stored
+        if not save_to_firebase(report_data, document_id=document_id):
+            raise RuntimeError("Failed to save report to database")
+
+        transaction.on_commit(lambda: get_executor().submit(_process_report_job, document_id))
+    logger.info(f"Queued report {document_id} for background processing")
+
+    return document_id, report_data
+
+
+def get_report_status(document_id):
+    """Return the processing state of a report, or None if it does not exist."""
+    doc = firestore.client().collection("reports").document(document_id).get()
+    if not doc.exists:
+        return None
+
+    data = doc.to_dict()
+    return {
+        "id": document_id,
+        # Reports stored by the synchronous path are complete when saved
+        "processing_status": data.get("processing_status", PROCESSING_DONE),
+        "processing_attempts": data.get("processing_attempts", 0),
+        "processing_error": data.get("processing_error"),
+        "service": data.get("service"),
+        "agency": data.get("agency"),
+        "importance": data.get("importance"),
+        "photo_url": data.get("photo_url"),
+        "photo_thumbnail_url": data.get("photo_thumbnail_url"),
+    }
+
+
+def _update_report(document_id, fields):
+    firestore.client().collection("reports").document(document_id).update(
+        {**fields, "updated_at": firestore.SERVER_TIMESTAMP}
+    )
+
+
+def _process_report_job(document_id):
+    """Deliver the report's queued messages on the worker pool"""
+    try:
+        dispatch_documents([document_id])
+    except Exception as e:
+        # Still queued, dispatch_outbox picks it up
+        logger.error(f"Error processing report {document_id}: {e}")
+    finally:
+        connection.close()
+
+
+def process_report_message(message):
+    """Upload the photo and classify the report of a ``process_report`` message.
+
+    One attempt per delivery; an exception makes the outbox retry it. The
+    last attempt stores the fallback classification with
+    ``processing_status = "failed"`` before giving up.
+    """
+    document_id = message.document_id
+    job = message.payload
+    attempt = message.attempts + 1
+    photo_fields = {
+        "photo_url": job.get("photo_url"),
+        "photo_thumbnail_url": job.get("photo_thumbnail_url"),
+    }
+    analysis_result = None
+
+    try:
+        _update_report(document_id, {
+            "processing_status": PROCESSING_RUNNING,
+            "processing_attempts": attempt,
+        })
+
+        photo_bytes, content_type = _job_photo(document_id, job)
+        if photo_bytes and photo_fields["photo_url"] is None:
+            try:
+                photo_fields = store_report_photo(photo_bytes, content_type)
+            except ValueError as e:
+                # Not an image we can decode, retrying will not help
+                logger.warning(f"Skipping invalid photo for report {document_id}: {e}")
+            # A retry must not store the photo again
+            OutboxMessage.objects.filter(pk=message.pk).update(
+                payload={**job, **photo_fields, "photo_data": None, "photo_upload": None}
+            )
+
+        analysis_result = classify_report_text(job["report_text"])
+
+        _update_report(document_id, {
+            **photo_fields,
+            "service": analysis_result["service"],
+            "agency": analysis_result["agency"],
+            "importance": analysis_result["importance"],
+            "processing_status": PROCESSING_DONE,
+            "processing_error": None,
+        })
+    except Exception as e:
+        logger.warning(
+            f"Attempt {attempt}/{settings.REPORT_PROCESSING_MAX_ATTEMPTS} "
+            f"for report {document_id} failed: {e}"
+        )
+        if attempt >= settings.REPORT_PROCESSING_MAX_ATTEMPTS:
+            _record_failure(document_id, job, photo_fields, analysis_result, e)
+        raise
+
+    logger.info(f"Processed report {document_id} in {attempt} attempt(s)")
+
+
+def _job_photo(document_id, job):
+    if job.get("photo_upload"):
+        upload = job["photo_upload"]
+        return base64.b64decode(upload["data"]), upload["content_type"]
+    if job.get("photo_data"):
+        try:
+            return decode_photo_data(job["photo_data"])
+        except ValueError as e:
+            # Broken photo data will not get better on retry
+            logger.warning(f"Skipping invalid photo for report {document_id}: {e}")
+    return None, None
+
+
+def _record_failure(document_id, job, photo_fields, analysis_result, error):
+    logger.error(f"Giving up on report {document_id}: {error}")
+    fallback = analysis_result or fallback_classification(job["report_text"])
+    try:
+        _update_report(document_id, {
+            **photo_fields,
+            "service": fallback["service"],
+            "agency": fallback["agency"],
+            "importance": fallback["importance"],
+            "processing_status": PROCESSING_FAILED,
+            "processing_error": str(error),
+        })
+    except Exception as e:
+        logger.error(f"Could not record failure for report {document_id}: {e}")
@@ -0,0 +1,85 @@
+from datetime import datetime, timezone as dt_timezone
+from unittest import mock
+
+from django.db import IntegrityError
+from django.test import TestCase
+
+from analyze import firestore_sync
+from analyze.firestore_sync import advance_sync_watermark, apply_firestore_documents
+from analyze.models import Complaint, SyncState
+
+
+def document(text, **fields):
+    return {
+        'report_text': text,
+        'region': 'Чуйская область',
+        'city': 'Бишкек',
+        'contact_info': '+996 555 000000',
+        'updated_at': datetime(2025, 1, 1, tzinfo=dt_timezone.utc),
+        **fields,
+    }
+
+
+class ApplyFirestoreDocumentsTests(TestCase):
+    def test_malformed_document_does_not_fail_its_chunk(self):
+        result = apply_firestore_documents({
+            'good-1': document('Нет света'),
+            'bad': document('Яма', city={'name': 'Бишкек'}),
+            'good-2': document('Мусор', region=None),
+        })
+
+        self.assertEqual(result.created, 2)
+        self.assertEqual([doc_id for doc_id, _ in result.invalid], ['bad'])
+        self.assertEqual(
+            set(Complaint.objects.values_list('firestore_id', flat=True)),
+            {'good-1', 'good-2'},
+        )
+        # A null in a NOT NULL column is stored as the default
+        self.assertEqual(Complaint.objects.get(firestore_id='good-2').region, '')
+
+    def test_malformed_update_leaves_row_untouched(self):
+        apply_firestore_documents({'doc': document('Нет света')})
+
+        result = apply_firestore_documents({
+            'doc': document('Нет света', status=['resolved']),
+            'other': document('Яма'),
+        })
+
+        self.assertEqual(result.created, 1)
+        self.assertEqual(result.updated, 0)
+        self.assertEqual(len(result.invalid), 1)
+        self.assertEqual(Complaint.objects.get(firestore_id='doc').status, 'new')
+
+    def test_rejected_row_is_skipped_when_written_one_at_a_time(self):
+        write_complaints = firestore_sync.write_complaints
+
+        def reject_poison(new_complaints, changed_complaints):
+            if any(c.firestore_id == 'poison' for c in new_complaints):
+                raise IntegrityError('NOT NULL constraint failed')
+            write_complaints(new_complaints, changed_complaints)
+
+        with mock.patch.object(firestore_sync, 'write_complaints', side_effect=reject_poison):
+            result = apply_firestore_documents({
+                'good': document('Нет света'),
+                'poison': document('Яма'),
+            })
+
+        self.assertEqual(result.created, 1)
+        self.assertEqual([doc_id for doc_id, _ in result.invalid], ['poison'])
+        self.assertTrue(Complaint.objects.filter(firestore_id='good').exists())
+
+
+class AdvanceSyncWatermarkTests(TestCase):
+    def test_watermark_only_moves_forward(self):
+        earlier = datetime(2025, 1, 1, tzinfo=dt_timezone.utc)
+        later = datetime(2025, 1, 2, tzinfo=dt_timezone.utc)
+
+        advance_sync_watermark('reports', later, 'b', synced=3)
+        # A run that started earlier finishes with an older page
+        state = advance_sync_watermark('reports', earlier, 'z', synced=2)
+
+        self.assertEqual((state.watermark_updated_at, state.watermark_document_id), (later, 'b'))
+        self.assertEqual(SyncState.objects.get(name='reports').documents_synced, 5)
+
+        state = advance_sync_watermark('reports', later, 'c')
+        self.assertEqual(state.watermark_document_id, 'c')
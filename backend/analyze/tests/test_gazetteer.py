@@ -0,0 +1,36 @@
+import subprocess
+import sys
+from pathlib import Path
+from unittest import skipUnless
+
+from django.conf import settings
+from django.test import SimpleTestCase
+
+from backend.gazetteer import load_gazetteer
+
+REPO_ROOT = Path(settings.BASE_DIR).parent
+SYNC_SCRIPT = REPO_ROOT / 'scripts' / 'sync_gazetteer.py'
+
+
+class GazetteerTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.gazetteer = load_gazetteer(settings.GAZETTEER_PATH)
+
+    def test_nearest_finds_bishkek(self):
+        place, distance = self.gazetteer.nearest(42.8746, 74.5698, max_km=50)
+
+        self.assertIsNotNone(place)
+        self.assertLess(distance, 50)
+
+    def test_nearest_ignores_places_beyond_max_km(self):
+        self.assertEqual(self.gazetteer.nearest(0.0, 0.0, max_km=50), (None, None))
+
+    @skipUnless(SYNC_SCRIPT.exists() and (REPO_ROOT / 'tg_bot').exists(), 'bot tree is not checked out')
+    def test_bot_copies_match_backend(self):
+        result = subprocess.run(
+            [sys.executable, str(SYNC_SCRIPT), '--check'], capture_output=True, text=True
+        )
+
+        self.assertEqual(result.returncode, 0, result.stdout)
@@ -0,0 +1,61 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+from io import StringIO
+from unittest import mock
+
+from django.test import TestCase
+
+from analyze import firestore_sync
+from analyze.management.commands import listen_firestore
+from analyze.management.commands.sync_firestore import INCREMENTAL_SYNC_NAME
+from analyze.models import Complaint, QuarantinedDocument, SyncState
+
+VERSION = datetime(2025, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def document(minutes, **fields):
+    return {'report_text': 'Нет света', 'updated_at': VERSION + timedelta(minutes=minutes), **fields}
+
+
+class ListenerBatchTests(TestCase):
+    def setUp(self):
+        self.command = listen_firestore.Command(stdout=StringIO())
+        self.command.options = {'no_emails': True, 'max_retries': 1, 'retry_delay': 0.0}
+        self.command.stats = {
+            'batches': 0, 'created': 0, 'updated': 0, 'deleted': 0, 'emails': 0, 'retries': 0, 'quarantined': 0,
+        }
+        self.command.unapplied = {}
+        self.command.retry_attempts = 0
+        self.command.retry_at = 0.0
+
+    def test_invalid_document_is_quarantined_with_the_batch(self):
+        self.command._apply_batch({'good': document(1), 'bad': document(2, city={'name': 'Ош'})})
+
+        self.assertTrue(Complaint.objects.filter(firestore_id='good').exists())
+        quarantined = QuarantinedDocument.objects.get()
+        self.assertEqual(quarantined.document_id, 'bad')
+        self.assertEqual(quarantined.data['city'], {'name': 'Ош'})
+        self.assertEqual(SyncState.objects.get(name=INCREMENTAL_SYNC_NAME).watermark_document_id, 'bad')
+
+    def test_document_that_keeps_failing_is_quarantined_after_retries(self):
+        apply_documents = firestore_sync.apply_firestore_documents
+
+        def fail_on_poison(documents, **kwargs):
+            if 'poison' in documents:
+                raise RuntimeError('poison')
+            return apply_documents(documents, **kwargs)
+
+        batch = {'good': document(1), 'poison': document(2)}
+        with mock.patch.object(listen_firestore, 'apply_firestore_documents', side_effect=fail_on_poison):
+            self.command._apply_batch(batch)
+            self.assertEqual(self.command.unapplied, batch)
+            self.assertFalse(Complaint.objects.exists())
+
+            self.command._apply_batch(self.command.unapplied)
+
+        self.assertEqual(self.command.unapplied, {})
+        self.assertTrue(Complaint.objects.filter(firestore_id='good').exists())
+        self.assertEqual(QuarantinedDocument.objects.get().document_id, 'poison')
+        self.assertEqual(self.command.stats['quarantined'], 1)
+        # A restart resumes after the quarantined document
+        state = SyncState.objects.get(name=INCREMENTAL_SYNC_NAME)
+        self.assertEqual((state.watermark_updated_at, state.watermark_document_id), (VERSION + timedelta(minutes=2), 'poison'))
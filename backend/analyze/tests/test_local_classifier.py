@@ -0,0 +1,53 @@
+from django.test import SimpleTestCase
+
+from analyze.local_classifier import LocalAgencyClassifier, evaluate_classifier, train_classifier
+
+SAMPLES = [
+    (f'{text} {n}', agency, service, importance)
+    for n in range(10)
+    for text, agency, service, importance in (
+        ('не горит фонарь на улице, темно вечером', 'Мэрия', 'Освещение улиц', 'medium'),
+        ('яма на дороге, машины ломают колеса', 'Мэрия', 'Ремонт дорог', 'high'),
+        ('прорвало трубу, вода заливает подвал дома', 'Водоканал', 'Аварии водопровода', 'critical'),
+        ('купите дешевые часы по ссылке', 'Spam', 'Spam', 'low'),
+    )
+]
+
+
+class LocalClassifierTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.classifier = train_classifier(SAMPLES, n_features=2 ** 12)
+
+    def test_service_and_importance_follow_the_text(self):
+        lighting, _ = self.classifier.predict('фонарь не горит, на улице темно')
+        road, _ = self.classifier.predict('глубокая яма на дороге')
+
+        self.assertEqual(lighting, {'agency': 'Мэрия', 'service': 'Освещение улиц', 'importance': 'medium'})
+        self.assertEqual(road, {'agency': 'Мэрия', 'service': 'Ремонт дорог', 'importance': 'high'})
+
+    def test_round_trip_keeps_predictions(self):
+        restored = LocalAgencyClassifier.from_dict(self.classifier.to_dict())
+
+        text = 'прорвало трубу в подвале'
+        self.assertEqual(restored.predict(text)[0], self.classifier.predict(text)[0])
+
+    def test_agency_only_model_is_never_confident(self):
+        classifier = train_classifier([(text, agency, '', '') for text, agency, _, _ in SAMPLES], n_features=2 ** 12)
+
+        result, confidence = classifier.predict('фонарь не горит')
+
+        self.assertEqual(result['service'], 'Мэрия')
+        self.assertEqual(confidence, 0.0)
+
+    def test_old_format_is_rejected(self):
+        with self.assertRaises(ValueError):
+            LocalAgencyClassifier.from_dict({'format_version': 1})
+
+    def test_evaluation_reports_every_head(self):
+        metrics = evaluate_classifier(self.classifier, SAMPLES, threshold=0.0, latency_rounds=1)
+
+        self.assertEqual(metrics['accuracy'], 1.0)
+        self.assertEqual(metrics['service_accuracy'], 1.0)
+        self.assertEqual(metrics['importance_accuracy'], 1.0)
@@ -0,0 +1,87 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+from io import StringIO
+
+from django.test import TestCase
+
+from analyze.management.commands.sync_firestore import INCREMENTAL_SYNC_NAME, Command
+from analyze.models import Complaint, SyncState
+
+
+class FakeDocument:
+    def __init__(self, doc_id, data):
+        self.id = doc_id
+        self._data = data
+
+    def to_dict(self):
+        return dict(self._data)
+
+    def get(self, field):
+        return self._data[field]
+
+
+class FakeQuery:
+    """The part of the Firestore query API used by --incremental"""
+
+    def __init__(self, documents, page_size=None, after=None):
+        self.documents = documents
+        self.page_size = page_size
+        self.after = after
+
+    def where(self, filter):
+        return self
+
+    def order_by(self, field):
+        return self
+
+    def select(self, fields):
+        return self
+
+    def limit(self, page_size):
+        return FakeQuery(self.documents, page_size, self.after)
+
+    def start_after(self, cursor):
+        return FakeQuery(self.documents, self.page_size, (cursor['updated_at'], cursor['__name__']))
+
+    def get(self):
+        docs = sorted(self.documents, key=lambda doc: (doc.get('updated_at'), doc.id))
+        if self.after:
+            docs = [doc for doc in docs if (doc.get('updated_at'), doc.id) > self.after]
+        return docs[:self.page_size]
+
+
+def report(doc_id, minutes, **fields):
+    return FakeDocument(doc_id, {
+        'report_text': f'Обращение {doc_id}',
+        'updated_at': datetime(2025, 1, 1, tzinfo=dt_timezone.utc) + timedelta(minutes=minutes),
+        **fields,
+    })
+
+
+class IncrementalSyncTests(TestCase):
+    def sync(self, documents):
+        command = Command(stdout=StringIO())
+        command._incremental_sync(
+            FakeQuery(documents),
+            {'reset_watermark': False, 'page_size': 2, 'limit': None},
+        )
+        return SyncState.objects.get(name=INCREMENTAL_SYNC_NAME)
+
+    def test_watermark_moves_past_invalid_document(self):
+        documents = [
+            report('a', 1),
+            report('poison', 2, city=['Бишкек']),
+            report('b', 3),
+        ]
+
+        state = self.sync(documents)
+
+        self.assertEqual(state.watermark_document_id, 'b')
+        self.assertEqual(
+            set(Complaint.objects.values_list('firestore_id', flat=True)), {'a', 'b'},
+        )
+
+        # The next run starts after the poison document
+        documents.append(report('c', 4))
+        state = self.sync(documents)
+        self.assertEqual(state.watermark_document_id, 'c')
+        self.assertTrue(Complaint.objects.filter(firestore_id='c').exists())
@@ -0,0 +1,86 @@
+from unittest import mock
+
+from django.test import TestCase, override_settings
+
+from analyze import tasks
+from analyze.models import OutboxMessage
+from analyze.outbox import FAILED, PENDING, PROCESS_REPORT, SENT, dispatch_documents
+
+CLASSIFIED = {'service': 'Освещение улиц', 'agency': 'Мэрия', 'importance': 'medium'}
+PHOTO_FIELDS = {'photo_url': 'https://photos/a.jpg', 'photo_thumbnail_url': 'https://photos/a_thumb.jpg'}
+
+
+@override_settings(OUTBOX_DISPATCH_INLINE=False, REPORT_PROCESSING_MAX_ATTEMPTS=2, REPORT_PROCESSING_RETRY_DELAY=0)
+class AsyncReportProcessingTests(TestCase):
+    def setUp(self):
+        self.firestore_updates = []
+        for name, value in (
+            ('save_to_firebase', mock.Mock(return_value=True)),
+            ('_update_report', mock.Mock(side_effect=lambda doc_id, fields: self.firestore_updates.append(fields))),
+            ('store_report_photo', mock.Mock(return_value=PHOTO_FIELDS)),
+            ('fallback_classification', mock.Mock(return_value={**CLASSIFIED, 'service': 'Spam'})),
+        ):
+            patcher = mock.patch.object(tasks, name, value)
+            self.addCleanup(patcher.stop)
+            setattr(self, name, patcher.start())
+
+    def submit(self, **fields):
+        return tasks.submit_report({'report_text': 'Нет света', **fields}, (b'\xff\xd8jpeg', 'image/jpeg'))
+
+    def test_queued_report_survives_until_it_is_processed(self):
+        with self.captureOnCommitCallbacks():
+            document_id, stored = self.submit()
+
+        # The job, photo included, is in the database rather than in memory
+        message = OutboxMessage.objects.get(kind=PROCESS_REPORT)
+        self.assertEqual(stored['processing_status'], tasks.PROCESSING_QUEUED)
+        self.assertEqual(message.document_id, document_id)
+        self.assertEqual(message.payload['photo_upload']['content_type'], 'image/jpeg')
+
+        with mock.patch.object(tasks, 'classify_report_text', return_value=CLASSIFIED):
+            dispatch_documents([document_id])
+
+        message.refresh_from_db()
+        self.assertEqual(message.status, SENT)
+        self.store_report_photo.assert_called_once_with(b'\xff\xd8jpeg', 'image/jpeg')
+        self.assertEqual(self.firestore_updates[-1]['processing_status'], tasks.PROCESSING_DONE)
+        self.assertEqual(self.firestore_updates[-1]['photo_url'], PHOTO_FIELDS['photo_url'])
+
+    def test_failed_attempts_are_retried_then_recorded(self):
+        document_id, _ = self.submit()
+
+        with mock.patch.object(tasks, 'classify_report_text', side_effect=RuntimeError('OpenAI is down')):
+            dispatch_documents([document_id])
+            message = OutboxMessage.objects.get(kind=PROCESS_REPORT)
+            self.assertEqual((message.status, message.attempts), (PENDING, 1))
+            # The photo stored by the first attempt is not stored again
+            self.assertIsNone(message.payload['photo_upload'])
+
+            dispatch_documents([document_id])
+
+        message.refresh_from_db()
+        self.assertEqual(message.status, FAILED)
+        self.store_report_photo.assert_called_once()
+        self.assertEqual(self.firestore_updates[-1]['processing_status'], tasks.PROCESSING_FAILED)
+        self.assertEqual(self.firestore_updates[-1]['service'], 'Spam')
+        self.assertEqual(self.firestore_updates[-1]['photo_url'], PHOTO_FIELDS['photo_url'])
+
+    def test_report_that_could_not_be_stored_leaves_no_job(self):
+        self.save_to_firebase.return_value = False
+
+        with self.assertRaises(RuntimeError):
+            self.submit()
+
+        self.assertFalse(OutboxMessage.objects.exists())
+
+    @override_settings(REPORT_QUEUE_MAX_SIZE=1)
+    def test_full_queue_is_answered_503(self):
+        self.submit()
+
+        response = self.client.post(
+            '/api/reports/?mode=async', {'report_text': 'Нет света'}, content_type='application/json',
+        )
+
+        self.assertEqual(response.status_code, 503)
+        self.assertIn('Retry-After', response)
+        self.assertEqual(OutboxMessage.objects.filter(kind=PROCESS_REPORT).count(), 1)
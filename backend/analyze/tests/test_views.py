@@ -0,0 +1,45 @@
+import tempfile
+from unittest import mock
+
+from django.test import TestCase
+
+from analyze import services, views
+from analyze.photo_storage import GCSPhotoStorage, LocalPhotoStorage, TieredPhotoStorage
+
+
+class ReportSubmissionViewTests(TestCase):
+    def test_non_object_json_body_is_rejected(self):
+        for body in ('[{"report_text": "Нет света"}]', '"Нет света"', '42'):
+            response = self.client.post('/api/reports/', body, content_type='application/json')
+
+            self.assertEqual(response.status_code, 400, body)
+            self.assertEqual(response.json(), {'error': 'Report must be a JSON object'})
+
+
+class PhotoUploadSessionViewTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.root = directory.name
+
+    def open_session(self, storage):
+        with mock.patch.object(views, 'get_photo_storage', return_value=storage), \
+                mock.patch.object(services, 'get_photo_storage', return_value=storage):
+            return self.client.post(
+                '/api/reports/photos/resumable/', {'content_type': 'image/jpeg'}, content_type='application/json',
+            )
+
+    def test_local_storage_answers_501(self):
+        response = self.open_session(LocalPhotoStorage(self.root, '/media/photos'))
+
+        self.assertEqual(response.status_code, 501)
+
+    def test_local_tier_follows_its_backing_storage(self):
+        gcs = GCSPhotoStorage(bucket_name='photos')
+        gcs.create_upload_session = mock.Mock(return_value='https://upload')
+        storage = TieredPhotoStorage(gcs, LocalPhotoStorage(self.root, '/media/photos'), max_bytes=1024)
+
+        response = self.open_session(storage)
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['upload_url'], 'https://upload')
@@ -0,0 +1,224 @@
+"""
+In-process LRU + TTL cache with an optional shared backing store.
+
+Used by the classification cache (analyze/classification_cache.py) and the
+geocoding cache (backend/geocode_cache.py). Each cache has its own namespace,
+which names its SQLite table and its Django cache key prefix, and its own
+size and TTL settings. Keys are built by the caller; values are JSON-able
+dicts.
+"""
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+class SQLiteStore:
+    """Persistent backing store in a table of a local SQLite file."""
+
+    def __init__(self, path, max_entries, table):
+        self.path = str(path)
+        self.max_entries = max_entries
+        self.table = table
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} ("
+            " key TEXT PRIMARY KEY,"
+            " value TEXT NOT NULL,"
+            " expires_at REAL NOT NULL,"
+            " last_access REAL NOT NULL)"
+        )
+        self._conn.execute(
+            f"CREATE INDEX IF NOT EXISTS {table}_last_access ON {table} (last_access)"
+        )
+        self._conn.commit()
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT value, expires_at FROM {self.table} WHERE key = ?",
+                (key,),
+            ).fetchone()
+            if row is None:
+                return None
+            value, expires_at = row
+            if expires_at <= now:
+                self._conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+            self._conn.execute(
+                f"UPDATE {self.table} SET last_access = ? WHERE key = ?",
+                (now, key),
+            )
+            self._conn.commit()
+        return json.loads(value)
+
+    def set(self, key, value, ttl):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO {self.table}"
+                " (key, value, expires_at, last_access) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value, ensure_ascii=False), now + ttl, now),
+            )
+            self._conn.execute(f"DELETE FROM {self.table} WHERE expires_at <= ?", (now,))
+            # Drop the least recently used rows beyond the size limit
+            self._conn.execute(
+                f"DELETE FROM {self.table} WHERE key IN ("
+                f" SELECT key FROM {self.table}"
+                " ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+            self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute(f"DELETE FROM {self.table}")
+            self._conn.commit()
+
+
+class DjangoCacheStore:
+    """Backing store on top of one of the configured Django caches."""
+
+    def __init__(self, alias, key_prefix):
+        from django.core.cache import caches
+
+        self.cache = caches[alias]
+        self.key_prefix = key_prefix
+
+    def get(self, key):
+        return self.cache.get(self.key_prefix + key)
+
+    def set(self, key, value, ttl):
+        self.cache.set(self.key_prefix + key, value, timeout=ttl)
+
+    def clear(self):
+        # Entries of other users of the same cache must survive, so only the
+        # in-process tier is cleared; stale entries age out through the TTL.
+        pass
+
+
+def make_store(config, namespace, default_max_entries):
+    """Backing store named by ``config["BACKEND"]``: memory (None), sqlite or django."""
+    backend = config.get("BACKEND", "memory")
+    if backend == "sqlite":
+        return SQLiteStore(
+            config["SQLITE_PATH"],
+            config.get("MAX_ENTRIES", default_max_entries),
+            table=f"{namespace}_cache",
+        )
+    if backend == "django":
+        return DjangoCacheStore(config.get("DJANGO_CACHE_ALIAS", "default"), key_prefix=f"{namespace}:")
+    if backend != "memory":
+        raise ValueError(f"Unknown {namespace} cache backend: {backend}")
+    return None
+
+
+class TTLCache:
+    """LRU + TTL cache with hit/miss counters in front of an optional store.
+
+    Subclasses build keys from their own arguments and call get_key/set_key;
+    they may override ttl_for to keep some values for a different time.
+    """
+
+    def __init__(self, namespace, max_entries, ttl, store=None):
+        self.namespace = namespace
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.store = store
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {
+            "hits": 0,
+            "store_hits": 0,
+            "misses": 0,
+            "sets": 0,
+            "evictions": 0,
+            "expirations": 0,
+        }
+
+    def ttl_for(self, value):
+        return self.ttl
+
+    def get_key(self, key):
+        """Return a copy of the cached value, or None."""
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self._count_hit(value)
+                    return dict(value)
+                del self._entries[key]
+                self._stats["expirations"] += 1
+
+        if self.store is not None:
+            try:
+                value = self.store.get(key)
+            except Exception as e:
+                logger.warning(f"{self.namespace.capitalize()} cache store read failed: {e}")
+                value = None
+            if value is not None:
+                with self._lock:
+                    self._count_hit(value)
+                    self._stats["store_hits"] += 1
+                    self._remember(key, value, now)
+                return dict(value)
+
+        with self._lock:
+            self._stats["misses"] += 1
+        return None
+
+    def set_key(self, key, value):
+        """Store a copy of the value in both tiers."""
+        value = dict(value)
+
+        with self._lock:
+            self._count_set(value)
+            self._remember(key, value, time.monotonic())
+
+        if self.store is not None:
+            try:
+                self.store.set(key, value, self.ttl_for(value))
+            except Exception as e:
+                logger.warning(f"{self.namespace.capitalize()} cache store write failed: {e}")
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        if self.store is not None:
+            self.store.clear()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["size"] = len(self._entries)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+        stats["backend"] = type(self.store).__name__ if self.store else "memory"
+        return stats
+
+    def _count_hit(self, value):
+        # Caller holds self._lock
+        self._stats["hits"] += 1
+
+    def _count_set(self, value):
+        # Caller holds self._lock
+        self._stats["sets"] += 1
+
+    def _remember(self, key, value, now):
+        # Caller holds self._lock
+        self._entries[key] = (now + self.ttl_for(value), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._stats["evictions"] += 1
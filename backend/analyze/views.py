@@ -1,10 +1,28 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
+from rest_framework.parsers import MultiPartParser
+from django.conf import settings
+from django.http import Http404, HttpResponse, QueryDict
 from firebase_admin import firestore
-from .services import process_report
-from .email_service import send_status_update_email
+from .services import (
+    ClassificationError,
+    classify_reports_batch,
+    create_photo_upload_session,
+    get_cache,
+    process_report,
+    store_report_photo,
+    update_reports,
+    validate_report,
+)
+from .tasks import QueueFull, submit_report, get_report_status
+from .photo_storage import get_photo_storage
+from .email_service import get_recipient_email, send_status_update_email
+from .models import EMAIL_SUBMISSION_SOURCES
+from .outbox import enqueue_status_email
+import json
 import logging
+import mimetypes
 
 logger = logging.getLogger(__name__)
 
@@ -16,9 +34,33 @@ class HelloWorld(APIView):
 
 class ReportSubmissionView(APIView):
     def post(self, request):
+        try:
+            report_data, photo = self._report_data(request)
+            validate_report(report_data)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        if request.query_params.get("mode") == "async":
+            return self._submit_async(report_data, photo)
+
+        if photo:
+            # Only stored once the report itself is known to be valid
+            try:
+                report_data.update(
+                    store_report_photo(photo, photo.content_type, photo.size)
+                )
+            except ValueError as e:
+                return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+            except Exception as e:
+                logger.error(f"Error storing photo: {str(e)}")
+                return Response(
+                    {"error": "Failed to store photo"},
+                    status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                )
+
         try:
             # Process the report
-            result = process_report(request.data)
+            result = process_report(report_data)
 
             if result["success"]:
                 return Response(result["data"], status=status.HTTP_201_CREATED)
@@ -30,6 +72,282 @@ class ReportSubmissionView(APIView):
         except Exception as e:
             return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
+    def _report_data(self, request):
+        """Report fields and the uploaded photo file from a JSON body or a multipart form
+
+        Multipart requests carry the report either as a JSON "payload" field
+        or as plain form fields, and the image as raw bytes in a "photo" file
+        field instead of base64. The photo is returned as is and stored only
+        after the report has been validated.
+        """
+        if not isinstance(request.data, QueryDict):
+            if not isinstance(request.data, dict):
+                raise ValueError("Report must be a JSON object")
+            return request.data, None
+
+        if 'payload' in request.data:
+            report_data = json.loads(request.data['payload'])
+            if not isinstance(report_data, dict):
+                raise ValueError("payload must be a JSON object")
+        else:
+            report_data = request.data.dict()
+        report_data.pop('photo', None)
+
+        photo = request.FILES.get('photo')
+        if photo and photo.size > settings.PHOTO_MAX_UPLOAD_BYTES:
+            raise ValueError("Photo is too large")
+
+        return report_data, photo
+
+    def _submit_async(self, report_data, photo=None):
+        """Store the report and hand photo upload and classification to workers"""
+        # The upload is gone once the request ends, so the worker gets the bytes
+        photo_upload = (photo.read(), photo.content_type) if photo else None
+        try:
+            report_id, report_data = submit_report(report_data, photo_upload)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except QueueFull as e:
+            logger.warning(f"Rejecting async report: {e}")
+            return Response(
+                {"error": "Too many reports are waiting to be processed"},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                headers={"Retry-After": "30"},
+            )
+        except Exception as e:
+            logger.error(f"Error queueing report: {str(e)}")
+            return Response(
+                {"error": "Failed to save report to database"},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            )
+
+        return Response(
+            {
+                "id": report_id,
+                "processing_status": report_data["processing_status"],
+                "status_url": f"/api/reports/{report_id}/status/",
+            },
+            status=status.HTTP_202_ACCEPTED,
+        )
+
+
+class PhotoUploadView(APIView):
+    parser_classes = [MultiPartParser]
+
+    def post(self, request):
+        """Store a report photo and return its URL and thumbnail URL
+
+        Accepts either a multipart form with a "photo" file field or the raw
+        image bytes as the request body (Content-Type: image/*). The returned
+        photo_url and photo_thumbnail_url can then be sent with the report
+        instead of photo_data.
+        """
+        if request.content_type.startswith('multipart/'):
+            photo = request.FILES.get('photo')
+            if not photo:
+                return Response(
+                    {"error": "photo file is required"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            stream, content_type, size = photo, photo.content_type, photo.size
+        else:
+            # Read the body straight from the WSGI stream, never into memory as a whole
+            content_type = request.content_type.split(';')[0].strip()
+            size = int(request.META.get('CONTENT_LENGTH') or 0)
+            if not size:
+                return Response(
+                    {"error": "Content-Length is required"},
+                    status=status.HTTP_411_LENGTH_REQUIRED
+                )
+            stream = request.stream
+
+        if not (content_type or '').startswith('image/'):
+            return Response(
+                {"error": "Only image uploads are accepted"},
+                status=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE
+            )
+        if size > settings.PHOTO_MAX_UPLOAD_BYTES:
+            return Response(
+                {"error": "Photo is too large"},
+                status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+            )
+
+        try:
+            photo_fields = store_report_photo(stream, content_type, size)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE)
+        except Exception as e:
+            logger.error(f"Error storing photo: {str(e)}")
+            return Response(
+                {"error": "Failed to upload photo"},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+        return Response(photo_fields, status=status.HTTP_201_CREATED)
+
+
+class PhotoUploadSessionView(APIView):
+    def post(self, request):
+        """Open a resumable upload session for a large photo
+
+        The client uploads the bytes directly to upload_url (optionally in
+        several Content-Range chunks, resuming after a dropped connection)
+        and then submits the report with the returned photo_url.
+        """
+        content_type = request.data.get('content_type', 'image/jpeg')
+        size = request.data.get('size')
+
+        if not str(content_type).startswith('image/'):
+            return Response(
+                {"error": "Only image uploads are accepted"},
+                status=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE
+            )
+        try:
+            size = int(size) if size is not None else None
+        except (TypeError, ValueError):
+            return Response(
+                {"error": "size must be an integer"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if size is not None and size > settings.PHOTO_MAX_UPLOAD_BYTES:
+            return Response(
+                {"error": "Photo is too large"},
+                status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+            )
+
+        if not get_photo_storage().supports_resumable:
+            return Response(
+                {"error": "Resumable uploads need the GCS photo storage"},
+                status=status.HTTP_501_NOT_IMPLEMENTED
+            )
+
+        try:
+            upload_url, photo_url = create_photo_upload_session(
+                content_type=content_type,
+                size=size,
+                origin=request.headers.get('Origin'),
+            )
+        except Exception as e:
+            logger.error(f"Error creating upload session: {str(e)}")
+            return Response(
+                {"error": "Failed to create upload session"},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+        return Response(
+            {"upload_url": upload_url, "photo_url": photo_url},
+            status=status.HTTP_201_CREATED
+        )
+
+
+class PhotoFileView(APIView):
+    def get(self, request, path):
+        """Serve a stored photo (used with the local photo storage)"""
+        try:
+            data = get_photo_storage().get(path)
+        except (FileNotFoundError, ValueError):
+            raise Http404("Photo not found")
+
+        content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        response = HttpResponse(data, content_type=content_type)
+        # Photo paths are unique and never rewritten
+        response['Cache-Control'] = 'public, max-age=31536000, immutable'
+        return response
+
+
+class ReportStatusView(APIView):
+    def get(self, request, report_id):
+        """Return the processing status of an asynchronously submitted report"""
+        try:
+            report_status = get_report_status(report_id)
+        except Exception as e:
+            logger.error(f"Error reading status of report {report_id}: {str(e)}")
+            return Response(
+                {"error": str(e)},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+        if report_status is None:
+            return Response(
+                {"error": "Report not found"},
+                status=status.HTTP_404_NOT_FOUND
+            )
+
+        return Response(report_status, status=status.HTTP_200_OK)
+
+
+class BatchClassificationView(APIView):
+    def post(self, request):
+        """Classify many reports with as few model requests as possible
+
+        Body: {"reports": [{"id": "...", "report_text": "..."}], "update": false}
+        With "update": true the results are also written to the Firestore
+        documents named by "id".
+        """
+        reports = request.data.get('reports')
+        if not isinstance(reports, list) or not reports:
+            return Response(
+                {"error": "reports must be a non-empty list"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        max_reports = settings.CLASSIFICATION_BATCH_MAX_REPORTS
+        if len(reports) > max_reports:
+            return Response(
+                {"error": f"At most {max_reports} reports can be classified per request"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        for report in reports:
+            if not isinstance(report, dict) or not str(report.get('report_text') or '').strip():
+                return Response(
+                    {"error": "Every report needs a report_text"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+        try:
+            results = classify_reports_batch([str(r['report_text']) for r in reports])
+        except ClassificationError as e:
+            logger.error(f"Batch classification failed: {str(e)}")
+            return Response(
+                {"error": str(e)},
+                status=status.HTTP_502_BAD_GATEWAY
+            )
+
+        response_data = {
+            "count": len(results),
+            "results": [
+                {"id": report.get('id'), **result}
+                for report, result in zip(reports, results)
+            ],
+        }
+
+        if request.data.get('update'):
+            updates = [
+                (report['id'], {
+                    'service': result['service'],
+                    'agency': result['agency'],
+                    'importance': result['importance'],
+                })
+                for report, result in zip(reports, results)
+                if report.get('id')
+            ]
+            response_data["updated"], error = update_reports(updates)
+            if error is not None:
+                logger.error(f"Error writing batch classification to Firestore: {str(error)}")
+                return Response(
+                    {"error": str(error), **response_data},
+                    status=status.HTTP_500_INTERNAL_SERVER_ERROR
+                )
+
+        return Response(response_data, status=status.HTTP_200_OK)
+
+
+class ClassificationCacheStatsView(APIView):
+    def get(self, request):
+        """Return hit/miss counters of the classification cache"""
+        return Response(get_cache().stats(), status=status.HTTP_200_OK)
+
 
 class StatusUpdateEmailView(APIView):
     def post(self, request):
@@ -70,7 +388,7 @@ class StatusUpdateEmailView(APIView):
             
             # Check if this is a website or mobile submission
             submission_source = complaint_data.get('submission_source', '')
-            if submission_source not in ['website', 'mobile']:
+            if submission_source not in EMAIL_SUBMISSION_SOURCES:
                 return Response(
                     {"message": "Email notification skipped - not a website or mobile submission"},
                     status=status.HTTP_200_OK
@@ -81,6 +399,15 @@ class StatusUpdateEmailView(APIView):
             if notes:
                 complaint_data['notes'] = notes
             
+            if settings.OUTBOX_ENABLED and get_recipient_email(complaint_data):
+                # Coalesced with the other notifications of this change (save,
+                # webhook) and sent within the SMTP rate limits
+                enqueue_status_email(complaint_id, complaint_data, new_status, language)
+                return Response(
+                    {"message": "Email notification queued"},
+                    status=status.HTTP_202_ACCEPTED
+                )
+            
             # Send email notification
             email_sent = send_status_update_email(complaint_data, new_status, language)
             
@@ -1,13 +1,76 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-from .models import Complaint
-from .email_service import send_status_update_email
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+from firebase_admin import firestore
+from .models import EMAIL_SUBMISSION_SOURCES, Complaint, ProcessedWebhookEvent, firestore_version
+from .firestore_sync import apply_firestore_documents, send_status_change_emails
+import hashlib
+import hmac
 import logging
 import json
+import time
 
 logger = logging.getLogger(__name__)
 
+WEBHOOK_ACTIONS = ('create', 'update', 'delete')
+
+
+class EventConflict(Exception):
+    """An event id of the batch was claimed by a concurrent request"""
+
+
+def verify_webhook_signature(request):
+    """Check the X-Webhook-Signature header against FIRESTORE_WEBHOOK_SECRET
+
+    The header is "sha256=<hex HMAC-SHA256 of the raw body>". Returns True for
+    a valid signature, False when the request is unsigned (or no secret is
+    configured) and None when a signature is present but wrong. Must run
+    before request.data is accessed.
+    """
+    signature = request.headers.get('X-Webhook-Signature')
+    secret = settings.FIRESTORE_WEBHOOK_SECRET
+    if not signature or not secret:
+        return False
+    expected = 'sha256=' + hmac.new(secret.encode(), request.body, hashlib.sha256).hexdigest()
+    return True if hmac.compare_digest(signature, expected) else None
+
+
+_last_event_purge = 0.0
+
+
+def purge_processed_events():
+    """Drop expired idempotency keys, at most once per WEBHOOK_EVENT_PURGE_INTERVAL"""
+    global _last_event_purge
+    now = time.monotonic()
+    if now - _last_event_purge < settings.WEBHOOK_EVENT_PURGE_INTERVAL:
+        return
+    _last_event_purge = now
+    try:
+        deleted = ProcessedWebhookEvent.purge_expired(settings.WEBHOOK_EVENT_TTL)
+        if deleted:
+            logger.info(f"Purged {deleted} expired webhook event ids")
+    except Exception as e:
+        logger.error(f"Error purging webhook event ids: {e}")
+
+
+def claim_event(event_id):
+    """Record an event id, return False if it was already processed"""
+    try:
+        with transaction.atomic():
+            ProcessedWebhookEvent.objects.create(event_id=event_id)
+        return True
+    except IntegrityError:
+        return False
+
+
+def applies_payload(signed, action, document_data):
+    """Whether an event is applied from its payload rather than re-read from Firestore"""
+    return action in ('create', 'update') and bool(signed) and bool(firestore_version(document_data))
+
 
 class FirestoreWebhookView(APIView):
     """
@@ -16,7 +79,18 @@ class FirestoreWebhookView(APIView):
     """
     
     def post(self, request):
-        """Handle Firestore document update webhook"""
+        """Handle Firestore document update webhook
+
+        Signed events that carry data.updated_at are trusted and applied from
+        the payload; unsigned ones re-read the document from Firestore.
+        """
+        signed = verify_webhook_signature(request)
+        if signed is None:
+            return Response(
+                {"error": "Invalid webhook signature"},
+                status=status.HTTP_401_UNAUTHORIZED
+            )
+        
         try:
             data = request.data
             document_id = data.get('document_id')
@@ -32,59 +106,291 @@ class FirestoreWebhookView(APIView):
             
             logger.info(f"Received Firestore webhook for document {document_id}, action: {action}")
             
-            if action in ['create', 'update']:
-                # Sync or create the complaint in Django
-                complaint = Complaint.sync_from_firestore(document_id)
-                
-                if complaint and action == 'update':
-                    # Check if status changed
-                    old_status = old_data.get('status')
-                    new_status = document_data.get('status', complaint.status)
-                    
-                    if (old_status and old_status != new_status and 
-                        complaint.submission_source in ['website', 'mobile'] and
-                        new_status in ['pending', 'resolved', 'cancelled']):
-                        
-                        logger.info(f"Status changed for complaint {document_id}: {old_status} -> {new_status}")
-                        
-                        # Send email notification
-                        try:
-                            complaint.send_status_update_email()
-                            logger.info(f"Email notification sent for complaint {document_id}")
-                        except Exception as e:
-                            logger.error(f"Failed to send email for complaint {document_id}: {e}")
-                
+            if action not in WEBHOOK_ACTIONS:
                 return Response(
-                    {"message": f"Successfully processed {action} for document {document_id}"},
-                    status=status.HTTP_200_OK
+                    {"error": f"Unknown action: {action}"},
+                    status=status.HTTP_400_BAD_REQUEST
                 )
             
-            elif action == 'delete':
-                # Remove from Django database
+            if not isinstance(document_data, dict) or not isinstance(old_data, dict):
+                return Response(
+                    {"error": "data and old_data must be objects"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            if applies_payload(signed, action, document_data):
+                # Rejected before the event id is claimed, so a fixed payload can be resent
                 try:
-                    complaint = Complaint.objects.get(firestore_id=document_id)
-                    complaint.delete()
-                    logger.info(f"Deleted complaint {document_id} from Django database")
-                except Complaint.DoesNotExist:
-                    logger.warning(f"Complaint {document_id} not found in Django database")
+                    Complaint.clean_firestore_fields(document_data)
+                except ValueError as e:
+                    return Response(
+                        {"error": f"Invalid data: {e}"},
+                        status=status.HTTP_400_BAD_REQUEST
+                    )
+            
+            # Trigger retries and double posts carry the same event_id
+            event_id = data.get('event_id')
+            if event_id:
+                purge_processed_events()
+                if not claim_event(str(event_id)):
+                    logger.info(f"Ignoring duplicate webhook event {event_id}")
+                    return Response(
+                        {"message": f"Event {event_id} was already processed", "duplicate": True},
+                        status=status.HTTP_200_OK
+                    )
+            
+            try:
+                return self.process_event(signed, document_id, action, document_data, old_data)
+            except Exception:
+                # Let the sender's retry through
+                if event_id:
+                    ProcessedWebhookEvent.objects.filter(event_id=str(event_id)).delete()
+                raise
+                
+        except Exception as e:
+            logger.error(f"Error in Firestore webhook: {str(e)}")
+            return Response(
+                {"error": str(e)},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+    
+    def process_event(self, signed, document_id, action, document_data, old_data):
+        """Apply one create/update/delete event"""
+        if applies_payload(signed, action, document_data):
+            return self.apply_payload(document_id, action, document_data, old_data)
+        
+        if action in ['create', 'update']:
+            # Sync or create the complaint in Django
+            complaint = Complaint.sync_from_firestore(document_id)
+            
+            if complaint and action == 'update':
+                # Check if status changed
+                old_status = old_data.get('status')
+                new_status = document_data.get('status', complaint.status)
                 
+                if (old_status and old_status != new_status and 
+                    complaint.submission_source in EMAIL_SUBMISSION_SOURCES and
+                    new_status in ['pending', 'resolved', 'cancelled']):
+                    
+                    logger.info(f"Status changed for complaint {document_id}: {old_status} -> {new_status}")
+                    
+                    # Send email notification
+                    try:
+                        complaint.send_status_update_email(previous_status=old_status)
+                        logger.info(f"Email notification sent for complaint {document_id}")
+                    except Exception as e:
+                        logger.error(f"Failed to send email for complaint {document_id}: {e}")
+            
+            return Response(
+                {"message": f"Successfully processed {action} for document {document_id}"},
+                status=status.HTTP_200_OK
+            )
+        
+        elif action == 'delete':
+            # Remove from Django database
+            try:
+                complaint = Complaint.objects.get(firestore_id=document_id)
+                complaint.delete()
+                logger.info(f"Deleted complaint {document_id} from Django database")
+            except Complaint.DoesNotExist:
+                logger.warning(f"Complaint {document_id} not found in Django database")
+            
+            return Response(
+                {"message": f"Successfully processed delete for document {document_id}"},
+                status=status.HTTP_200_OK
+            )
+        
+        else:
+            return Response(
+                {"error": f"Unknown action: {action}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+    
+    def apply_payload(self, document_id, action, document_data, old_data):
+        """Write the posted fields with one conditional UPDATE
+
+        Only fields that differ from old_data are written, and only if the
+        event is newer than the version already stored, so a late retry can
+        not overwrite newer state. Nothing is written back to Firestore.
+        """
+        version = firestore_version(document_data)
+        cleaned = Complaint.clean_firestore_fields(document_data)
+        fields = {
+            field: value
+            for field, value in cleaned.items()
+            if field not in old_data or old_data[field] != document_data[field]
+        }
+        
+        updated = (
+            Complaint.objects
+            .filter(firestore_id=document_id)
+            .filter(Q(firestore_updated_at__isnull=True) | Q(firestore_updated_at__lt=version))
+            .update(**fields, firestore_updated_at=version, updated_at=timezone.now())
+        )
+        
+        if not updated:
+            if Complaint.objects.filter(firestore_id=document_id).exists():
+                logger.info(f"Ignoring stale webhook event for document {document_id} ({version})")
                 return Response(
-                    {"message": f"Successfully processed delete for document {document_id}"},
+                    {"message": f"Ignored stale {action} for document {document_id}", "applied": False},
                     status=status.HTTP_200_OK
                 )
-            
-            else:
+            Complaint.from_firestore_data(document_id, {**document_data, **cleaned}).save(sync_firestore=False)
+            logger.info(f"Created complaint {document_id} from webhook payload")
+        else:
+            old_status = old_data.get('status')
+            if 'status' in fields and old_status:
+                complaint = Complaint.objects.get(firestore_id=document_id)
+                send_status_change_emails([(complaint, old_status)])
+        
+        return Response(
+            {
+                "message": f"Successfully processed {action} for document {document_id}",
+                "applied": True,
+                "changed_fields": sorted(fields),
+            },
+            status=status.HTTP_200_OK
+        )
+
+
+class FirestoreWebhookBatchView(APIView):
+    """
+    Apply many Firestore webhook events in one request and one transaction
+    """
+    
+    def post(self, request):
+        """Handle a batch of create/update/delete events
+
+        Body: {"events": [{"event_id", "document_id", "action", "data", "old_data"}, ...]}.
+        Events whose event_id was already processed are skipped; later events
+        for the same document win. Signed batches are applied from the
+        payload, unsigned ones re-read the documents with one batched
+        Firestore read. Status emails go out after the commit.
+        """
+        signed = verify_webhook_signature(request)
+        if signed is None:
+            return Response(
+                {"error": "Invalid webhook signature"},
+                status=status.HTTP_401_UNAUTHORIZED
+            )
+        
+        events = request.data.get('events') if isinstance(request.data, dict) else None
+        if not isinstance(events, list) or not events:
+            return Response(
+                {"error": "events must be a non-empty list"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if len(events) > settings.FIRESTORE_WEBHOOK_BATCH_MAX_EVENTS:
+            return Response(
+                {"error": f"At most {settings.FIRESTORE_WEBHOOK_BATCH_MAX_EVENTS} events per batch"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        for index, event in enumerate(events):
+            if (not isinstance(event, dict) or not event.get('document_id')
+                    or event.get('action', 'update') not in WEBHOOK_ACTIONS):
                 return Response(
-                    {"error": f"Unknown action: {action}"},
+                    {"error": f"Event {index} needs a document_id and a valid action"},
                     status=status.HTTP_400_BAD_REQUEST
                 )
+        
+        purge_processed_events()
+        
+        try:
+            with transaction.atomic():
+                event_ids = {str(e['event_id']) for e in events if e.get('event_id')}
+                already_processed = set(
+                    ProcessedWebhookEvent.objects
+                    .filter(event_id__in=event_ids)
+                    .values_list('event_id', flat=True)
+                )
+                seen = set(already_processed)
+                
+                # Coalesce in order: None marks a delete
+                changes = {}
+                duplicates = 0
+                for event in events:
+                    event_id = str(event['event_id']) if event.get('event_id') else None
+                    if event_id and event_id in seen:
+                        duplicates += 1
+                        continue
+                    if event_id:
+                        seen.add(event_id)
+                    if event.get('action', 'update') == 'delete':
+                        changes[event['document_id']] = None
+                    else:
+                        changes[event['document_id']] = event.get('data') or {}
+                
+                documents = {doc_id: data for doc_id, data in changes.items() if data is not None}
+                deleted_ids = {doc_id for doc_id, data in changes.items() if data is None}
+                if not signed:
+                    documents = self.read_documents(documents)
+                documents = self.clean_documents(documents)
                 
+                try:
+                    # Only a conflict on the idempotency keys means another request
+                    with transaction.atomic():
+                        ProcessedWebhookEvent.objects.bulk_create(
+                            [ProcessedWebhookEvent(event_id=event_id) for event_id in event_ids - already_processed]
+                        )
+                except IntegrityError as e:
+                    raise EventConflict() from e
+                result = apply_firestore_documents(documents, deleted_ids=deleted_ids)
+                
+                if result.status_changes:
+                    transaction.on_commit(lambda: send_status_change_emails(result.status_changes))
+        
+        except EventConflict:
+            # A concurrent request claimed one of the event ids first
+            return Response(
+                {"error": "Events are being processed by another request, retry later"},
+                status=status.HTTP_409_CONFLICT
+            )
+        except ValueError as e:
+            return Response(
+                {"error": f"Invalid data: {e}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         except Exception as e:
-            logger.error(f"Error in Firestore webhook: {str(e)}")
+            logger.error(f"Error in Firestore webhook batch: {str(e)}")
             return Response(
                 {"error": str(e)},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
+        
+        logger.info(
+            f"Applied webhook batch of {len(events)} events: {result.created} created, "
+            f"{result.updated} updated, {result.deleted} deleted, {duplicates} duplicates"
+        )
+        return Response(
+            {
+                "events": len(events),
+                "duplicates": duplicates,
+                "created": result.created,
+                "updated": result.updated,
+                "unchanged": result.unchanged,
+                "deleted": result.deleted,
+            },
+            status=status.HTTP_200_OK
+        )
+    
+    def clean_documents(self, documents):
+        """Documents with their mirrored fields coerced to column values"""
+        cleaned = {}
+        for doc_id, data in documents.items():
+            if not isinstance(data, dict):
+                raise ValueError(f"data of document {doc_id} must be an object")
+            try:
+                cleaned[doc_id] = {**data, **Complaint.clean_firestore_fields(data)}
+            except ValueError as e:
+                raise ValueError(f"document {doc_id}: {e}") from e
+        return cleaned
+    
+    def read_documents(self, documents):
+        """Current Firestore data for the given ids, in one batched read"""
+        if not documents:
+            return {}
+        db = firestore.client()
+        refs = [db.collection('reports').document(doc_id) for doc_id in documents]
+        return {doc.id: doc.to_dict() for doc in db.get_all(refs) if doc.exists}
 
 
 class SyncComplaintView(APIView):
@@ -0,0 +1,101 @@
+"""
+Cache of geocoding results for /api/geocode/.
+
+Entries are keyed on the normalized (house, street, city) of the request, so
+"ул. Киевская 12, г. Бишкек" and "киевская, 12, Бишкек" share one Google Maps
+lookup. Addresses Google could not find are cached too, for a shorter
+NEGATIVE_TTL. The LRU/TTL tiers come from analyze/ttl_cache.py: an in-process
+LRU in front of an optional SQLite file or Django cache alias shared between
+workers.
+"""
+import hashlib
+import re
+import threading
+
+from django.conf import settings
+
+from analyze.ttl_cache import TTLCache, make_store
+
+_PUNCTUATION_RE = re.compile(r"[^\w\s/-]+")
+_WHITESPACE_RE = re.compile(r"\s+")
+
+# Address type words that do not change the place ("ул. Киевская" = "Киевская")
+_ADDRESS_WORDS = {
+    "г", "город", "ул", "улица", "д", "дом", "кыргызстан", "кыргызская", "республика",
+}
+
+# Stored for addresses Google could not find
+NOT_FOUND = {"found": False}
+
+
+def normalize_address_part(value):
+    """Collapse case, punctuation, whitespace and address type words."""
+    value = (value or "").casefold().replace("ё", "е")
+    value = _PUNCTUATION_RE.sub(" ", value)
+    words = [word for word in _WHITESPACE_RE.split(value) if word and word not in _ADDRESS_WORDS]
+    return " ".join(words)
+
+
+def make_geocode_key(house, street, city):
+    """Build the cache key for a geocoding request."""
+    normalized = "\x00".join(normalize_address_part(part) for part in (house, street, city))
+    return hashlib.sha256(f"v1\x00{normalized}".encode("utf-8")).hexdigest()
+
+
+class GeocodeCache(TTLCache):
+    """Cache of geocoding results keyed on the normalized address."""
+
+    def __init__(self, max_entries=5000, ttl=30 * 24 * 3600, negative_ttl=6 * 3600, store=None):
+        super().__init__("geocode", max_entries, ttl, store)
+        self.negative_ttl = negative_ttl
+        self._stats.update({
+            "negative_hits": 0,
+            "negative_sets": 0,
+            "api_calls": 0,
+            "api_errors": 0,
+        })
+
+    def get(self, house, street, city):
+        """Return the cached result, NOT_FOUND for a cached miss, or None."""
+        return self.get_key(make_geocode_key(house, street, city))
+
+    def set(self, house, street, city, result):
+        """Store a geocoding result, or NOT_FOUND when there was none."""
+        self.set_key(make_geocode_key(house, street, city), result)
+
+    def ttl_for(self, value):
+        return self.negative_ttl if value == NOT_FOUND else self.ttl
+
+    def record_api_call(self, failed=False):
+        with self._lock:
+            self._stats["api_calls"] += 1
+            if failed:
+                self._stats["api_errors"] += 1
+
+    def _count_hit(self, value):
+        super()._count_hit(value)
+        if value == NOT_FOUND:
+            self._stats["negative_hits"] += 1
+
+    def _count_set(self, value):
+        self._stats["negative_sets" if value == NOT_FOUND else "sets"] += 1
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_geocode_cache():
+    """Return the process-wide cache configured by ``settings.GEOCODE_CACHE``."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                config = settings.GEOCODE_CACHE
+                _cache = GeocodeCache(
+                    max_entries=config.get("MAX_ENTRIES", 5000),
+                    ttl=config.get("TTL", 30 * 24 * 3600),
+                    negative_ttl=config.get("NEGATIVE_TTL", 6 * 3600),
+                    store=make_store(config, "geocode", 5000),
+                )
+    return _cache
@@ -4,16 +4,49 @@ from rest_framework.decorators import api_view
 from rest_framework.response import Response
 import googlemaps
 from typing import Optional, Dict, Any
+from .gazetteer import load_gazetteer
+from .geocode_cache import NOT_FOUND, get_geocode_cache
 
 # Инициализация клиента Google Maps
 gmaps = googlemaps.Client(key=os.getenv("GOOGLE_MAPS_API_KEY", ""))
 
-# Словарь с предустановленными координатами городов Кыргызстана
-CITY_COORDINATES = {
-    "Бишкек": (42.8746, 74.5698),
-    "Ош": (40.5283, 72.7985),
-    # ... остальные координаты можно добавить при необходимости
-}
+
+def find_place(city_name):
+    """Населенный пункт из локального справочника (backend/data/gazetteer.json) или None"""
+    return load_gazetteer(settings.GAZETTEER_PATH).resolve(city_name)
+
+
+def cached_geocode(house, street, city_name, search_query):
+    """
+    Геокодинг через Google Maps с кэшем по нормализованному адресу.
+    Возвращает {"latitude", "longitude", "address"} или None, если адрес не найден
+    (отрицательный результат тоже кэшируется).
+    """
+    cache = get_geocode_cache()
+    cached = cache.get(house, street, city_name)
+    if cached is not None:
+        return None if cached == NOT_FOUND else cached
+
+    try:
+        result = gmaps.geocode(search_query)
+    except Exception:
+        # Ошибки API не кэшируем
+        cache.record_api_call(failed=True)
+        raise
+    cache.record_api_call()
+
+    if not result:
+        cache.set(house, street, city_name, NOT_FOUND)
+        return None
+
+    location = result[0]["geometry"]["location"]
+    value = {
+        "latitude": location["lat"],
+        "longitude": location["lng"],
+        "address": result[0]["formatted_address"],
+    }
+    cache.set(house, street, city_name, value)
+    return value
 
 
 @api_view(["GET"])
@@ -25,12 +58,6 @@ def geocode_location(request):
     - street: название улицы (опциональный)
     - house: номер дома (опциональный)
     """
-    print("Request data:", request.data)
-    print("Request GET params:", request.GET)
-    print("Request headers:", request.headers)
-    print("Request method:", request.method)
-    print("Request user:", request.user)
-    print("Request auth:", request.auth)
     city_name = request.GET.get("city")
     street = request.GET.get("street", "")
     house = request.GET.get("house", "")
@@ -49,30 +76,42 @@ def geocode_location(request):
         address_parts.append("Кыргызстан")
 
         search_query = ", ".join(address_parts)
+        place = find_place(city_name)
 
-        # Сначала пробуем получить координаты через Google Maps
-        result = gmaps.geocode(search_query)
+        # Город, район или микрорайон без улицы определяем по справочнику без Google Maps
+        if place is not None and not street and not house:
+            return Response(
+                {
+                    "latitude": place.latitude,
+                    "longitude": place.longitude,
+                    "address": place.address(),
+                    "source": "gazetteer",
+                    "full_query": search_query,
+                    "place_type": place.type,
+                    "region": place.region,
+                }
+            )
+
+        # Для улиц и домов пробуем получить координаты через Google Maps (с кэшем)
+        result = cached_geocode(house, street, city_name, search_query)
 
-        if result:
-            location = result[0]["geometry"]["location"]
+        if result is not None:
             return Response(
                 {
-                    "latitude": location["lat"],
-                    "longitude": location["lng"],
-                    "address": result[0]["formatted_address"],
+                    "latitude": result["latitude"],
+                    "longitude": result["longitude"],
+                    "address": result["address"],
                     "source": "google_maps",
                     "full_query": search_query,
                 }
             )
 
-        # Если Google Maps не нашел результат, используем предустановленные координаты города
-        coordinates = CITY_COORDINATES.get(city_name)
-        if coordinates:
-            latitude, longitude = coordinates
+        # Если Google Maps не нашел результат, используем координаты города из справочника
+        if place is not None:
             return Response(
                 {
-                    "latitude": latitude,
-                    "longitude": longitude,
+                    "latitude": place.latitude,
+                    "longitude": place.longitude,
                     "address": f"{search_query}",
                     "source": "fallback_coordinates",
                     "full_query": search_query,
@@ -84,3 +123,9 @@ def geocode_location(request):
 
     except Exception as e:
         return Response({"error": str(e)}, status=500)
+
+
+@api_view(["GET"])
+def geocode_cache_stats(request):
+    """Счетчики попаданий и промахов кэша геокодинга"""
+    return Response(get_geocode_cache().stats())
@@ -170,3 +170,130 @@ EMAIL_USE_TLS = True
 EMAIL_HOST_USER = os.getenv('EMAIL_HOST_USER', '')
 EMAIL_HOST_PASSWORD = os.getenv('EMAIL_HOST_PASSWORD', '')
 DEFAULT_FROM_EMAIL = os.getenv('DEFAULT_FROM_EMAIL', 'noreply@publicpulse.kg')
+
+# Asynchronous report processing
+# /api/reports/?mode=async answers 202 right away and photo upload and
+# classification run in the background. Async mode is opt-in per request:
+# clients that expect 201 keep getting it. The jobs are outbox messages, so
+# they survive restarts: REPORT_WORKER_COUNT threads run them right after the
+# request and dispatch_outbox runs whatever is left. With
+# REPORT_QUEUE_MAX_SIZE jobs waiting, async submissions are answered 503.
+REPORT_WORKER_COUNT = int(os.getenv('REPORT_WORKER_COUNT', '4'))
+REPORT_QUEUE_MAX_SIZE = int(os.getenv('REPORT_QUEUE_MAX_SIZE', '1000'))
+REPORT_PROCESSING_MAX_ATTEMPTS = int(os.getenv('REPORT_PROCESSING_MAX_ATTEMPTS', '3'))
+REPORT_PROCESSING_RETRY_DELAY = float(os.getenv('REPORT_PROCESSING_RETRY_DELAY', '2'))
+
+# Classification cache in front of OpenAI
+# BACKEND: "memory" (in-process only), "sqlite" (persistent file) or
+# "django" (the Django cache named by DJANGO_CACHE_ALIAS).
+CLASSIFICATION_CACHE = {
+    'BACKEND': os.getenv('CLASSIFICATION_CACHE_BACKEND', 'sqlite'),
+    'MAX_ENTRIES': int(os.getenv('CLASSIFICATION_CACHE_MAX_ENTRIES', '10000')),
+    'TTL': int(os.getenv('CLASSIFICATION_CACHE_TTL', str(30 * 24 * 3600))),
+    'SQLITE_PATH': os.getenv('CLASSIFICATION_CACHE_PATH', str(BASE_DIR / 'classification_cache.sqlite3')),
+    'DJANGO_CACHE_ALIAS': os.getenv('CLASSIFICATION_CACHE_ALIAS', 'default'),
+}
+
+# Batched classification (/api/reports/batch/ and classify_backlog)
+CLASSIFICATION_BATCH_SIZE = int(os.getenv('CLASSIFICATION_BATCH_SIZE', '20'))
+CLASSIFICATION_BATCH_MAX_REPORTS = int(os.getenv('CLASSIFICATION_BATCH_MAX_REPORTS', '500'))
+
+# Offline classifier (python manage.py train_classifier)
+# Separate heads predict the agency, the service and the importance. Reports
+# all three heads classify with at least LOCAL_CLASSIFIER_THRESHOLD confidence
+# never reach OpenAI. Services and importances it never saw in training are
+# never predicted, so retrain after the AGENCIES catalogue changes; models
+# saved in the older agency-only format are ignored until retrained.
+LOCAL_CLASSIFIER_ENABLED = os.getenv('LOCAL_CLASSIFIER_ENABLED', 'true').lower() == 'true'
+LOCAL_CLASSIFIER_PATH = Path(os.getenv('LOCAL_CLASSIFIER_PATH', str(BASE_DIR / 'models' / 'agency_classifier.json.gz')))
+LOCAL_CLASSIFIER_THRESHOLD = float(os.getenv('LOCAL_CLASSIFIER_THRESHOLD', '0.85'))
+
+# Photo uploads
+# Photos up to PHOTO_UPLOAD_CHUNK_SIZE are sent to storage in one request,
+# larger ones in resumable chunks of that size (must be a multiple of 256 KB).
+PHOTO_UPLOAD_CHUNK_SIZE = int(os.getenv('PHOTO_UPLOAD_CHUNK_SIZE', str(1024 * 1024)))
+PHOTO_MAX_UPLOAD_BYTES = int(os.getenv('PHOTO_MAX_UPLOAD_BYTES', str(20 * 1024 * 1024)))
+
+# Photo normalization: re-encode as JPEG without EXIF, downscale to
+# PHOTO_MAX_DIMENSION and store a PHOTO_THUMBNAIL_DIMENSION thumbnail next to it
+PHOTO_NORMALIZE = os.getenv('PHOTO_NORMALIZE', 'true').lower() == 'true'
+PHOTO_MAX_DIMENSION = int(os.getenv('PHOTO_MAX_DIMENSION', '1600'))
+PHOTO_JPEG_QUALITY = int(os.getenv('PHOTO_JPEG_QUALITY', '82'))
+PHOTO_THUMBNAIL_DIMENSION = int(os.getenv('PHOTO_THUMBNAIL_DIMENSION', '320'))
+PHOTO_THUMBNAIL_QUALITY = int(os.getenv('PHOTO_THUMBNAIL_QUALITY', '75'))
+
+# Photo storage backend (dotted path to a class in analyze.photo_storage)
+# analyze.photo_storage.GCSPhotoStorage stores photos in PHOTO_BUCKET_NAME,
+# analyze.photo_storage.LocalPhotoStorage under PHOTO_LOCAL_ROOT, served at
+# PHOTO_LOCAL_BASE_URL by /media/photos/ (no cloud credentials needed).
+PHOTO_STORAGE_BACKEND = os.getenv('PHOTO_STORAGE_BACKEND', 'analyze.photo_storage.GCSPhotoStorage')
+PHOTO_BUCKET_NAME = os.getenv('PHOTO_BUCKET_NAME', 'public-pulse')
+PHOTO_LOCAL_ROOT = Path(os.getenv('PHOTO_LOCAL_ROOT', str(BASE_DIR / 'media' / 'photos')))
+PHOTO_LOCAL_BASE_URL = os.getenv('PHOTO_LOCAL_BASE_URL', 'http://localhost:8000/media/photos')
+
+# Local tier in front of the photo storage: keeps up to
+# PHOTO_LOCAL_TIER_MAX_BYTES of recently stored photos on disk for reads.
+PHOTO_LOCAL_TIER = os.getenv('PHOTO_LOCAL_TIER', 'false').lower() == 'true'
+PHOTO_LOCAL_TIER_ROOT = Path(os.getenv('PHOTO_LOCAL_TIER_ROOT', str(BASE_DIR / 'media' / 'photo_cache')))
+PHOTO_LOCAL_TIER_MAX_BYTES = int(os.getenv('PHOTO_LOCAL_TIER_MAX_BYTES', str(512 * 1024 * 1024)))
+
+# Firestore webhook: events signed with this secret (X-Webhook-Signature:
+# sha256=<HMAC-SHA256 of the body>) are applied from the posted payload
+# instead of re-reading the document from Firestore.
+FIRESTORE_WEBHOOK_SECRET = os.getenv('FIRESTORE_WEBHOOK_SECRET', '')
+FIRESTORE_WEBHOOK_BATCH_MAX_EVENTS = int(os.getenv('FIRESTORE_WEBHOOK_BATCH_MAX_EVENTS', '500'))
+
+# Idempotency keys of processed webhook events are kept for WEBHOOK_EVENT_TTL
+# seconds; expired ones are purged at most every WEBHOOK_EVENT_PURGE_INTERVAL.
+WEBHOOK_EVENT_TTL = int(os.getenv('WEBHOOK_EVENT_TTL', str(7 * 24 * 3600)))
+WEBHOOK_EVENT_PURGE_INTERVAL = int(os.getenv('WEBHOOK_EVENT_PURGE_INTERVAL', '600'))
+
+# Transactional outbox for complaint side effects (Firestore updates, status
+# emails). Messages are delivered by `manage.py dispatch_outbox` and, with
+# OUTBOX_DISPATCH_INLINE, by OUTBOX_INLINE_WORKERS threads right after commit.
+# Failed deliveries are retried after OUTBOX_RETRY_DELAY * 2^n seconds (at most
+# OUTBOX_RETRY_MAX_DELAY) and marked failed after OUTBOX_MAX_ATTEMPTS.
+OUTBOX_ENABLED = os.getenv('OUTBOX_ENABLED', 'true').lower() == 'true'
+OUTBOX_DISPATCH_INLINE = os.getenv('OUTBOX_DISPATCH_INLINE', 'true').lower() == 'true'
+OUTBOX_INLINE_WORKERS = int(os.getenv('OUTBOX_INLINE_WORKERS', '2'))
+OUTBOX_BATCH_SIZE = int(os.getenv('OUTBOX_BATCH_SIZE', '100'))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv('OUTBOX_MAX_ATTEMPTS', '8'))
+OUTBOX_RETRY_DELAY = int(os.getenv('OUTBOX_RETRY_DELAY', '5'))
+OUTBOX_RETRY_MAX_DELAY = int(os.getenv('OUTBOX_RETRY_MAX_DELAY', '3600'))
+OUTBOX_LOCK_TIMEOUT = int(os.getenv('OUTBOX_LOCK_TIMEOUT', '300'))
+
+# Outgoing mail goes through a pool of up to MAIL_POOL_SIZE persistent SMTP
+# connections. Idle connections are checked with NOOP after
+# MAIL_KEEPALIVE_INTERVAL seconds and rotated after
+# MAIL_MAX_MESSAGES_PER_CONNECTION messages.
+EMAIL_TIMEOUT = int(os.getenv('EMAIL_TIMEOUT', '30'))
+MAIL_POOL_SIZE = int(os.getenv('MAIL_POOL_SIZE', '2'))
+MAIL_KEEPALIVE_INTERVAL = int(os.getenv('MAIL_KEEPALIVE_INTERVAL', '60'))
+MAIL_MAX_MESSAGES_PER_CONNECTION = int(os.getenv('MAIL_MAX_MESSAGES_PER_CONNECTION', '100'))
+
+# Status email queue: changes of one complaint within EMAIL_DIGEST_WINDOW
+# seconds are sent as one email about the latest status, and sending is kept
+# within EMAIL_RATE_LIMIT_PER_MINUTE and EMAIL_DAILY_QUOTA (0 = no limit;
+# Gmail accounts may send 500 messages a day).
+EMAIL_DIGEST_WINDOW = int(os.getenv('EMAIL_DIGEST_WINDOW', '120'))
+EMAIL_RATE_LIMIT_PER_MINUTE = int(os.getenv('EMAIL_RATE_LIMIT_PER_MINUTE', '20'))
+EMAIL_DAILY_QUOTA = int(os.getenv('EMAIL_DAILY_QUOTA', '500'))
+
+# Geocoding cache in front of Google Maps (/api/geocode/)
+# BACKEND: "memory" (in-process only), "sqlite" (persistent file) or "django"
+# (the Django cache named by DJANGO_CACHE_ALIAS, shared between workers).
+# Addresses Google could not find are remembered for NEGATIVE_TTL seconds.
+GEOCODE_CACHE = {
+    'BACKEND': os.getenv('GEOCODE_CACHE_BACKEND', 'memory'),
+    'MAX_ENTRIES': int(os.getenv('GEOCODE_CACHE_MAX_ENTRIES', '5000')),
+    'TTL': int(os.getenv('GEOCODE_CACHE_TTL', str(30 * 24 * 3600))),
+    'NEGATIVE_TTL': int(os.getenv('GEOCODE_CACHE_NEGATIVE_TTL', str(6 * 3600))),
+    'SQLITE_PATH': os.getenv('GEOCODE_CACHE_PATH', str(BASE_DIR / 'geocode_cache.sqlite3')),
+    'DJANGO_CACHE_ALIAS': os.getenv('GEOCODE_CACHE_ALIAS', 'default'),
+}
+
+# Offline gazetteer of regions, cities, districts and microdistricts. City-level
+# geocoding requests are answered from it; Google Maps is only called for
+# street addresses. The bot ships a copy in tg_bot/data/gazetteer.json, kept in
+# sync by scripts/sync_gazetteer.py.
+GAZETTEER_PATH = os.getenv('GAZETTEER_PATH', str(BASE_DIR / 'backend' / 'data' / 'gazetteer.json'))
@@ -17,16 +17,34 @@ Including another URLconf
 
 from django.contrib import admin
 from django.urls import path
-from analyze.views import HelloWorld, ReportSubmissionView, StatusUpdateEmailView
-from analyze.webhook_views import FirestoreWebhookView, SyncComplaintView
-from .geocoding import geocode_location
+from analyze.views import (
+    HelloWorld,
+    ReportSubmissionView,
+    ReportStatusView,
+    PhotoUploadView,
+    PhotoUploadSessionView,
+    PhotoFileView,
+    BatchClassificationView,
+    ClassificationCacheStatsView,
+    StatusUpdateEmailView,
+)
+from analyze.webhook_views import FirestoreWebhookView, FirestoreWebhookBatchView, SyncComplaintView
+from .geocoding import geocode_cache_stats, geocode_location
 
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("api/hello/", HelloWorld.as_view(), name="hello"),
     path("api/reports/", ReportSubmissionView.as_view(), name="submit_report"),
+    path("api/reports/photos/", PhotoUploadView.as_view(), name="upload_photo"),
+    path("api/reports/photos/resumable/", PhotoUploadSessionView.as_view(), name="photo_upload_session"),
+    path("media/photos/<path:path>", PhotoFileView.as_view(), name="photo_file"),
+    path("api/reports/batch/", BatchClassificationView.as_view(), name="classify_batch"),
+    path("api/reports/<str:report_id>/status/", ReportStatusView.as_view(), name="report_status"),
     path("api/geocode/", geocode_location, name="geocode"),
+    path("api/geocode/stats/", geocode_cache_stats, name="geocode_cache_stats"),
+    path("api/classification-cache/stats/", ClassificationCacheStatsView.as_view(), name="classification_cache_stats"),
     path("api/send-status-email/", StatusUpdateEmailView.as_view(), name="send_status_email"),
     path("api/firestore-webhook/", FirestoreWebhookView.as_view(), name="firestore_webhook"),
+    path("api/firestore-webhook/batch/", FirestoreWebhookBatchView.as_view(), name="firestore_webhook_batch"),
     path("api/sync-complaint/", SyncComplaintView.as_view(), name="sync_complaint"),
 ]
@@ -3,191 +3,30 @@ import random
 import time
 from datetime import datetime, timedelta
 import json
+import os
 
 # Базовый URL API
 API_BASE_URL = "https://publicpulse-back-739844766362.asia-southeast2.run.app"
 
-# Список регионов и городов
-REGIONS = [
-    "Бишкек",
-    "Ош",
-    "Чуйская область",
-    "Иссык-Кульская область",
-    "Нарынская область",
-    "Таласская область",
-    "Джалал-Абадская область",
-    "Ошская область",
-    "Баткенская область",
-]
-
-CITIES = {
-    "Бишкек": [
-        "Аламединский район",
-        "Ленинский район",
-        "Октябрьский район",
-        "Первомайский район",
-        "Свердловский район",
-        "Ала-Арча",
-        "Аламедин",
-        "Арча-Бешик",
-        "Бакай-Ата",
-        "Байтик",
-        "Бирдик",
-        "Восток-5",
-        "Джал",
-        "Дордой",
-        "Кок-Жар",
-        "Кок-Джар",
-        "Кызыл-Аскер",
-        "Манас",
-        "Орто-Сай",
-        "Сокулук",
-        "Токольдош",
-        "Чон-Арык",
-        "Чуй",
-        "Эне-Сай",
-    ],
-    "Ош": [
-        "Алмалык",
-        "Араван",
-        "Араванский район",
-        "Кара-Суу",
-        "Кара-Сууский район",
-        "Кара-Кульджа",
-        "Кара-Кульджинский район",
-        "Ноокат",
-        "Ноокатский район",
-        "Узген",
-        "Узгенский район",
-        "Чон-Алай",
-        "Чон-Алайский район",
-    ],
-    "Чуйская область": [
-        "Токмок",
-        "Кара-Балта",
-        "Кант",
-        "Аламудунский район",
-        "Жайылский район",
-        "Кеминский район",
-        "Московский район",
-        "Панфиловский район",
-        "Сокулукский район",
-        "Чуйский район",
-    ],
-    "Иссык-Кульская область": [
-        "Каракол",
-        "Балыкчы",
-        "Чолпон-Ата",
-        "Ак-Суйский район",
-        "Джети-Огузский район",
-        "Иссык-Кульский район",
-        "Тонский район",
-        "Тюпский район",
-    ],
-    "Нарынская область": [
-        "Нарын",
-        "Ак-Талинский район",
-        "Ат-Башинский район",
-        "Жумгальский район",
-        "Кочкорский район",
-        "Нарынский район",
-    ],
-    "Таласская область": [
-        "Талас",
-        "Бакай-Атинский район",
-        "Кара-Бууринский район",
-        "Манасский район",
-        "Таласский район",
-    ],
-    "Джалал-Абадская область": [
-        "Джалал-Абад",
-        "Таш-Кумыр",
-        "Майлуу-Суу",
-        "Кара-Куль",
-        "Аксыйский район",
-        "Ала-Букинский район",
-        "Базар-Коргонский район",
-        "Ноокенский район",
-        "Сузакский район",
-        "Тогуз-Тороуский район",
-        "Токтогульский район",
-        "Чаткальский район",
-    ],
-    "Ошская область": [
-        "Ноокат",
-        "Узген",
-        "Алайский район",
-        "Араванский район",
-        "Кара-Кульджинский район",
-        "Кара-Сууский район",
-        "Ноокатский район",
-        "Узгенский район",
-        "Чон-Алайский район",
-    ],
-    "Баткенская область": [
-        "Баткен",
-        "Кызыл-Кыя",
-        "Сулюкта",
-        "Баткенский район",
-        "Кадамжайский район",
-        "Лейлекский район",
-    ],
-}
-
-# Добавляем микрорайоны для крупных городов
-MICRODISTRICTS = {
-    "Бишкек": [
-        "Аламедин",
-        "Ала-Арча",
-        "Арча-Бешик",
-        "Бакай-Ата",
-        "Байтик",
-        "Бирдик",
-        "Восток-5",
-        "Джал",
-        "Дордой",
-        "Кок-Жар",
-        "Кок-Джар",
-        "Кызыл-Аскер",
-        "Манас",
-        "Орто-Сай",
-        "Сокулук",
-        "Токольдош",
-        "Чон-Арык",
-        "Чуй",
-        "Эне-Сай",
-    ],
-    "Ош": [
-        "Алмалык",
-        "Араван",
-        "Кара-Суу",
-        "Кара-Кульджа",
-        "Ноокат",
-        "Узген",
-        "Чон-Алай",
-    ],
-    "Каракол": [
-        "Ак-Терек",
-        "Боз-Учук",
-        "Джети-Огуз",
-        "Каракол",
-        "Оргочор",
-        "Тепке",
-        "Тосор",
-    ],
-    "Нарын": ["Ак-Талаа", "Ат-Баши", "Джумгал", "Кочкор", "Нарын", "Эмгекчил"],
-    "Талас": ["Бакай-Ата", "Кара-Буура", "Манас", "Талас"],
-    "Джалал-Абад": [
-        "Аксый",
-        "Ала-Бука",
-        "Базар-Коргон",
-        "Ноокен",
-        "Сузак",
-        "Тогуз-Тороо",
-        "Токтогул",
-        "Чаткал",
-    ],
-}
+# Регионы, города и микрорайоны берем из общего справочника населенных пунктов
+GAZETTEER_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    "..", "backend", "backend", "data", "gazetteer.json",
+)
+with open(GAZETTEER_PATH, encoding="utf-8") as f:
+    GAZETTEER = json.load(f)
+
+REGIONS = [region["name"] for region in GAZETTEER["regions"]]
+
+# Города, села и районы каждого региона
+CITIES = {region: [] for region in REGIONS}
+# Микрорайоны крупных городов
+MICRODISTRICTS = {}
+for place in GAZETTEER["places"]:
+    if place["type"] == "microdistrict":
+        MICRODISTRICTS.setdefault(place["city"], []).append(place["name"])
+    else:
+        CITIES[place["region"]].append(place["name"])
 
 # Структура жалоб с соответствующими типами и текстами
 COMPLAINTS = {
@@ -0,0 +1,54 @@
+"""
+Copy the gazetteer module and data from the backend to the bot.
+
+The backend and the bot are deployed separately, so tg_bot keeps its own
+copy of backend/backend/gazetteer.py and backend/backend/data/gazetteer.json.
+Edit the backend files, then run
+
+    python scripts/sync_gazetteer.py
+
+``--check`` only compares the copies and exits with status 1 when they
+differ; the backend tests run it.
+"""
+import filecmp
+import os
+import shutil
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+# (source in the backend, copy in the bot)
+FILES = [
+    (os.path.join("backend", "backend", "gazetteer.py"), os.path.join("tg_bot", "gazetteer.py")),
+    (
+        os.path.join("backend", "backend", "data", "gazetteer.json"),
+        os.path.join("tg_bot", "data", "gazetteer.json"),
+    ),
+]
+
+
+def stale_copies(root=ROOT):
+    """Bot copies that differ from their backend source"""
+    return [
+        copy for source, copy in FILES
+        if not os.path.exists(os.path.join(root, copy))
+        or not filecmp.cmp(os.path.join(root, source), os.path.join(root, copy), shallow=False)
+    ]
+
+
+def main():
+    stale = stale_copies()
+    if "--check" in sys.argv[1:]:
+        for copy in stale:
+            print(f"{copy} differs from its backend source, run scripts/sync_gazetteer.py")
+        return 1 if stale else 0
+
+    for source, copy in FILES:
+        if copy in stale:
+            shutil.copyfile(os.path.join(ROOT, source), os.path.join(ROOT, copy))
+            print(f"Updated {copy}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
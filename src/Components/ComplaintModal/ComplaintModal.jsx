@@ -1,6 +1,6 @@
 import React, { useState, useEffect } from "react";
 import { createPortal } from "react-dom";
-import { doc, updateDoc } from "firebase/firestore";
+import { doc, updateDoc, serverTimestamp } from "firebase/firestore";
 import { db } from "../../firebase/config";
 import "./ComplaintModal.scss";
 import { useTranslation } from "react-i18next";
@@ -183,6 +183,8 @@ const ComplaintModal = ({ complaint, isOpen, onClose, onUpdate }) => {
                   'Content-Type': 'application/json',
                 },
                 body: JSON.stringify({
+                  // Повторная отправка того же события не обрабатывается дважды
+                  event_id: `${complaint.id}:${formData.status}:${Date.now()}`,
                   document_id: complaint.id,
                   action: 'update',
                   data: { ...complaint, status: formData.status, notes: formData.notes },
@@ -212,7 +214,8 @@ const ComplaintModal = ({ complaint, isOpen, onClose, onUpdate }) => {
 
       // Если есть что обновлять
       if (Object.keys(updateData).length > 0) {
-        await updateDoc(complaintRef, updateData);
+        // updated_at нужен для инкрементальной синхронизации с Django
+        await updateDoc(complaintRef, { ...updateData, updated_at: serverTimestamp() });
 
         // Вызываем коллбэк обновления с обновленными данными
         if (onUpdate) {
@@ -33,8 +33,9 @@ export const useComplaintApi = () => {
       const geocodeData = await geocodeResponse.json();
 
       // Подготавливаем данные для отправки жалобы
+      const { photo_file: photoFile, ...fields } = formData;
       const complaintData = {
-        ...formData,
+        ...fields,
         latitude: geocodeData.latitude,
         longitude: geocodeData.longitude,
         contact_info:
@@ -55,14 +56,24 @@ export const useComplaintApi = () => {
         agency: "default",
       };
 
-      // Отправляем жалобу
-      const response = await fetch(`${API_BASE_URL}/api/reports/`, {
-        method: "POST",
-        headers: {
-          "Content-Type": "application/json",
-        },
-        body: JSON.stringify(complaintData),
-      });
+      // Отправляем жалобу; фото уходит отдельной частью multipart без base64
+      let requestOptions;
+      if (photoFile) {
+        const body = new FormData();
+        body.append("payload", JSON.stringify(complaintData));
+        body.append("photo", photoFile, photoFile.name);
+        requestOptions = { method: "POST", body };
+      } else {
+        requestOptions = {
+          method: "POST",
+          headers: {
+            "Content-Type": "application/json",
+          },
+          body: JSON.stringify(complaintData),
+        };
+      }
+
+      const response = await fetch(`${API_BASE_URL}/api/reports/`, requestOptions);
 
       if (!response.ok) {
         throw new Error("Ошибка при отправке жалобы");
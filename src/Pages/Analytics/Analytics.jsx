@@ -538,7 +538,7 @@ const Analytics = () => {
             {report.photo_url && (
               <div className="detail-row">
                 <span className="detail-label">Фото:</span>
-                <img src={report.photo_url} alt={t('complaints.complaintPhoto')} style={{ width: '100px', height: 'auto' }} />
+                <img src={report.photo_thumbnail_url || report.photo_url} alt={t('complaints.complaintPhoto')} style={{ width: '100px', height: 'auto' }} />
               </div>
             )}
             
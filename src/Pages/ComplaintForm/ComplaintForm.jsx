@@ -38,7 +38,7 @@ const ComplaintForm = () => {
     email: '',
     importance: 'medium',
     language: 'ru',
-    photo_data: null,
+    photo_file: null,
     id: null
   });
 
@@ -136,7 +136,7 @@ const ComplaintForm = () => {
         email: '',
         importance: 'medium',
         language: 'ru',
-        photo_data: null,
+        photo_file: null,
         id: null
       });
 
@@ -164,24 +164,23 @@ const ComplaintForm = () => {
         return;
       }
 
-      // Создаем превью
-      const reader = new FileReader();
-      reader.onloadend = () => {
-        setPreviewUrl(reader.result);
-        setFormData(prev => ({
-          ...prev,
-          photo_data: reader.result
-        }));
-      };
-      reader.readAsDataURL(file);
+      // Создаем превью, сам файл отправляется как есть (multipart), без base64
+      setPreviewUrl(URL.createObjectURL(file));
+      setFormData(prev => ({
+        ...prev,
+        photo_file: file
+      }));
     }
   };
 
   const handleRemovePhoto = () => {
+    if (previewUrl) {
+      URL.revokeObjectURL(previewUrl);
+    }
     setPreviewUrl(null);
     setFormData(prev => ({
       ...prev,
-      photo_data: null
+      photo_file: null
     }));
     if (fileInputRef.current) {
       fileInputRef.current.value = '';
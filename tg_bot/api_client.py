@@ -1,28 +1,136 @@
 import aiohttp
+import asyncio
 import json
 import logging
 import hashlib
-import base64
+import time
+import uuid
+from collections import deque
+from contextlib import asynccontextmanager
 from typing import Dict, Any, Optional
-from config import BOT_TOKEN, API_BASE_URL, API_KEY
+from config import (
+    BOT_TOKEN,
+    API_BASE_URL,
+    API_KEY,
+    API_MAX_CONNECTIONS,
+    API_KEEPALIVE_TIMEOUT,
+    API_DNS_CACHE_TTL,
+)
+
+
+class RequestMetrics:
+    """Latency and outcome of backend requests, per endpoint"""
+    
+    def __init__(self, window: int = 500):
+        self.window = window
+        self.connections = {'created': 0, 'reused': 0}
+        self._endpoints = {}
+    
+    def observe(self, endpoint: str, elapsed: float, status: Optional[int] = None):
+        """Record one request; no status means it failed before a response"""
+        entry = self._endpoints.get(endpoint)
+        if entry is None:
+            entry = self._endpoints[endpoint] = {
+                'count': 0,
+                'errors': 0,
+                'total_ms': 0.0,
+                'max_ms': 0.0,
+                'last_status': None,
+                'samples': deque(maxlen=self.window),
+            }
+        elapsed_ms = elapsed * 1000
+        entry['count'] += 1
+        entry['total_ms'] += elapsed_ms
+        entry['max_ms'] = max(entry['max_ms'], elapsed_ms)
+        entry['last_status'] = status
+        entry['samples'].append(elapsed_ms)
+        if status is None or status >= 400:
+            entry['errors'] += 1
+    
+    def snapshot(self) -> Dict[str, Any]:
+        """Counters and latency percentiles over the last ``window`` requests"""
+        endpoints = {}
+        for endpoint, entry in self._endpoints.items():
+            samples = sorted(entry['samples'])
+            endpoints[endpoint] = {
+                'count': entry['count'],
+                'errors': entry['errors'],
+                'last_status': entry['last_status'],
+                'avg_ms': round(entry['total_ms'] / entry['count'], 1),
+                'p50_ms': round(samples[len(samples) // 2], 1),
+                'p95_ms': round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 1),
+                'max_ms': round(entry['max_ms'], 1),
+            }
+        return {'endpoints': endpoints, 'connections': dict(self.connections)}
 
 
 class APIClient:
-    """Client for sending reports to backend API"""
+    """Client for sending reports to backend API
+    
+    One long-lived session is opened at startup (see main.py) and shared by
+    all handlers, so submissions reuse kept-alive connections to the
+    backend instead of paying a TCP and TLS handshake each time.
+    """
     
     def __init__(self, base_url: str = None):
         self.base_url = base_url or API_BASE_URL
         self.session = None
+        self.metrics = RequestMetrics()
         
     async def __aenter__(self):
         """Async context manager entry"""
-        self.session = aiohttp.ClientSession()
-        return self
+        return await self.open()
         
     async def __aexit__(self, exc_type, exc_val, exc_tb):
         """Async context manager exit"""
-        if self.session:
+        await self.close()
+    
+    async def open(self):
+        """Create the pooled session (no-op when it is already open)"""
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=API_MAX_CONNECTIONS,
+                limit_per_host=API_MAX_CONNECTIONS,
+                ttl_dns_cache=API_DNS_CACHE_TTL,
+                keepalive_timeout=API_KEEPALIVE_TIMEOUT,
+            )
+            trace_config = aiohttp.TraceConfig()
+            trace_config.on_connection_create_end.append(self._on_connection_created)
+            trace_config.on_connection_reuseconn.append(self._on_connection_reused)
+            self.session = aiohttp.ClientSession(
+                connector=connector, trace_configs=[trace_config]
+            )
+        return self
+    
+    async def close(self):
+        """Close the session and its connections"""
+        if self.session and not self.session.closed:
             await self.session.close()
+        self.session = None
+    
+    @asynccontextmanager
+    async def _request(self, method: str, path: str, endpoint: str = None, **kwargs):
+        """Make a request on the shared session and record its latency"""
+        if self.session is None or self.session.closed:
+            await self.open()
+        started = time.perf_counter()
+        status = None
+        try:
+            async with self.session.request(method, f"{self.base_url}{path}", **kwargs) as response:
+                status = response.status
+                yield response
+        finally:
+            self.metrics.observe(f"{method} {endpoint or path}", time.perf_counter() - started, status)
+    
+    async def _on_connection_created(self, session, trace_config_ctx, params):
+        self.metrics.connections['created'] += 1
+    
+    async def _on_connection_reused(self, session, trace_config_ctx, params):
+        self.metrics.connections['reused'] += 1
+    
+    def stats(self) -> Dict[str, Any]:
+        """Request latency and connection reuse metrics"""
+        return self.metrics.snapshot()
     
     async def send_report(self, report_data: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -37,10 +145,10 @@ class APIClient:
         try:
             # Prepare payload for API
             payload = self._prepare_payload(report_data)
+            photo_bytes = report_data.get('photo_data')
             
             # Headers for Django API request
             headers = {
-                'Content-Type': 'application/json',
                 'User-Agent': 'GovServices-TelegramBot/1.0',
                 'Accept': 'application/json'
             }
@@ -49,12 +157,32 @@ class APIClient:
             if API_KEY:
                 headers['Authorization'] = f'Bearer {API_KEY}'
             
+            if isinstance(photo_bytes, bytes) and photo_bytes:
+                # Send the photo as a raw multipart file part instead of base64 in JSON
+                body = aiohttp.FormData()
+                body.add_field(
+                    'payload',
+                    json.dumps(payload, ensure_ascii=False),
+                    content_type='application/json'
+                )
+                body.add_field(
+                    'photo',
+                    photo_bytes,
+                    filename=f"{payload['rpt']}.jpg",
+                    content_type='image/jpeg'
+                )
+                request_kwargs = {'data': body}
+            else:
+                headers['Content-Type'] = 'application/json'
+                request_kwargs = {'json': payload}
+            
             # Make API request
-            async with self.session.post(
-                f"{self.base_url}/api/reports/",  # Django expects trailing slash
-                json=payload,
+            async with self._request(
+                'POST',
+                "/api/reports/",  # Django expects trailing slash
                 headers=headers,
-                timeout=aiohttp.ClientTimeout(total=30)
+                timeout=aiohttp.ClientTimeout(total=30),
+                **request_kwargs
             ) as response:
                 
                 if response.status == 201:  # Django returns 201 for created
@@ -94,10 +222,11 @@ class APIClient:
                     return {
                         'success': False,
                         'error': f"Django API error: {response.status}",
+                        'status': response.status,
                         'message': 'Failed to send report to server'
                     }
                     
-        except aiohttp.ClientTimeout:
+        except asyncio.TimeoutError:
             logging.error("API request timeout")
             return {
                 'success': False,
@@ -153,8 +282,9 @@ class APIClient:
         created_at = report_data.get('created_at')
         user_id = report_data.get('user_id')
         
-        # Generate RPT hash
-        rpt_hash = self._generate_rpt_hash(str(user_id), str(created_at))
+        # The RPT hash is assigned once per report (generate_rpt) so retries
+        # overwrite the same backend document instead of duplicating it
+        rpt_hash = report_data.get('rpt') or self._generate_rpt_hash(str(user_id), str(created_at))
         
         # Format payload according to Django backend expectations
         payload = {
@@ -177,18 +307,11 @@ class APIClient:
             'solution': report_data.get('solution')  # Add solution to payload
         }
         
-        # Handle photo data if present
-        if 'photo_data' in report_data and report_data['photo_data']:
-            try:
-                # Convert bytes to base64 string
-                photo_data = report_data['photo_data']
-                if isinstance(photo_data, bytes):
-                    payload['photo_data'] = base64.b64encode(photo_data).decode('utf-8')
-                else:
-                    payload['photo_data'] = photo_data
-            except Exception as e:
-                logging.error(f"Error encoding photo data: {e}")
-                payload['photo_data'] = None
+        # Photo bytes travel as a separate multipart part (see send_report);
+        # only an already encoded data URL is passed through in the JSON body
+        photo_data = report_data.get('photo_data')
+        if photo_data and isinstance(photo_data, str):
+            payload['photo_data'] = photo_data
         
         return payload
     
@@ -205,8 +328,9 @@ class APIClient:
                 'Accept': 'application/json'
             }
             
-            async with self.session.get(
-                f"{self.base_url}/api/hello/",
+            async with self._request(
+                'GET',
+                "/api/hello/",
                 headers=headers,
                 timeout=aiohttp.ClientTimeout(total=10)
             ) as response:
@@ -254,8 +378,10 @@ class APIClient:
                 headers['Authorization'] = f'Bearer {API_KEY}'
             
             # Note: This endpoint doesn't exist in the Django backend yet
-            async with self.session.get(
-                f"{self.base_url}/api/reports/{report_id}/",
+            async with self._request(
+                'GET',
+                f"/api/reports/{report_id}/",
+                endpoint="/api/reports/{id}/",
                 headers=headers,
                 timeout=aiohttp.ClientTimeout(total=15)
             ) as response:
@@ -280,7 +406,18 @@ class APIClient:
             }
 
 
-# Global API client instance
+def generate_rpt(report_data: Dict[str, Any]) -> str:
+    """
+    Generate the idempotency key of a new report
+    
+    created_at only has minute precision, so a random part keeps two reports
+    of one user in the same minute apart
+    """
+    data = f"{report_data.get('user_id')}:{report_data.get('created_at')}:{uuid.uuid4().hex}"
+    return hashlib.sha256(data.encode()).hexdigest()[:16]
+
+
+# Global API client instance, opened at startup and closed at shutdown (main.py)
 api_client = APIClient()
 
 
@@ -294,8 +431,7 @@ async def send_report_to_api(report_data: Dict[str, Any]) -> Dict[str, Any]:
     Returns:
         API response
     """
-    async with APIClient() as client:
-        return await client.send_report(report_data)
+    return await api_client.send_report(report_data)
 
 
 async def check_report_status(report_id: str) -> Dict[str, Any]:
@@ -308,8 +444,7 @@ async def check_report_status(report_id: str) -> Dict[str, Any]:
     Returns:
         Status information
     """
-    async with APIClient() as client:
-        return await client.get_report_status(report_id)
+    return await api_client.get_report_status(report_id)
 
 
 async def check_backend_health() -> Dict[str, Any]:
@@ -319,5 +454,4 @@ async def check_backend_health() -> Dict[str, Any]:
     Returns:
         Health check result
     """
-    async with APIClient() as client:
-        return await client.check_backend_health() 
\ No newline at end of file
+    return await api_client.check_backend_health() 
\ No newline at end of file
@@ -1,3 +1,4 @@
+import asyncio
 import logging
 from typing import Dict, Any
 from fastapi import APIRouter, HTTPException
@@ -5,6 +6,10 @@ from pydantic import BaseModel
 
 from notifications import send_status_update_notification
 from instances import bot
+from api_client import api_client
+from geocoding import geocoding_client, reverse_geocoder
+from health import health_monitor
+from spool import report_spool, spool_drainer
 
 router = APIRouter()
 
@@ -62,4 +67,22 @@ async def notify_status_update(request: StatusUpdateRequest) -> Dict[str, Any]:
         raise HTTPException(
             status_code=500,
             detail=str(e)
-        ) 
\ No newline at end of file
+        ) 
+
+
+@router.get("/api/metrics")
+async def get_metrics() -> Dict[str, Any]:
+    """
+    Backend health and circuit breaker state, report spool depth, request
+    latency, connection reuse and geocoding cache counters
+    """
+    return {
+        "backend_health": health_monitor.snapshot(),
+        "report_spool": {
+            **await asyncio.to_thread(report_spool.stats),
+            "drainer": spool_drainer.stats(),
+        },
+        "backend_api": api_client.stats(),
+        "geocoding": geocoding_client.stats(),
+        "reverse_geocoding": reverse_geocoder.stats(),
+    }
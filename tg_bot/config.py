@@ -1,6 +1,7 @@
 import os
 from dotenv import load_dotenv
 from typing import Optional, Tuple, Dict, Any
+from gazetteer import DEFAULT_PATH as DEFAULT_GAZETTEER_PATH, Gazetteer, load_gazetteer
 
 load_dotenv()
 
@@ -17,138 +18,150 @@ API_BASE_URL = os.getenv("API_BASE_URL", "https://publicpulse-back-739844766362.
 API_KEY = os.getenv("API_KEY", "")
 API_ENABLED = os.getenv("API_ENABLED", "true").lower() == "true"
 
-# Kyrgyzstan regions and cities with coordinates
-REGIONS_CITIES = {
-    "Бишкек": ["Бишкек"],
-    "Ош": ["Ош"],
-    "Чуйская область": [
-        "Токмок",
-        "Кант",
-        "Кара-Балта",
-        "Шопоков",
-        "Беловодское",
-        "Сокулук",
-        "Жайыл",
-        "Кемин",
-        "Панфилов",
-        "Московский",
-    ],
-    "Ошская область": [
-        "Узген",
-        "Кара-Суу",
-        "Ноокат",
-        "Кара-Кульджа",
-        "Араван",
-        "Чон-Алай",
-        "Алай",
-        "Кызыл-Кия",
-    ],
-    "Джалал-Абадская область": [
-        "Джалал-Абад",
-        "Кербен",
-        "Майлуу-Суу",
-        "Таш-Кумыр",
-        "Кок-Жангак",
-        "Казарман",
-        "Чаткал",
-        "Токтогул",
-    ],
-    "Баткенская область": [
-        "Баткен",
-        "Сулюкта",
-        "Кызыл-Кия",
-        "Кадамжай",
-        "Лейлек",
-        "Кадамжай",
-    ],
-    "Нарынская область": ["Нарын", "Ат-Башы", "Жумгал", "Кочкор", "Ак-Талаа"],
-    "Иссык-Кульская область": [
-        "Каракол",
-        "Балыкчы",
-        "Чолпон-Ата",
-        "Кызыл-Суу",
-        "Тюп",
-        "Ак-Суу",
-        "Жети-Огуз",
-        "Тон",
-    ],
-    "Таласская область": ["Талас", "Кара-Буура", "Бакай-Ата", "Манас", "Кызыл-Адыр"],
-}
-
-# City coordinates (latitude, longitude) - fallback coordinates
-CITY_COORDINATES = {
-    # Бишкек
-    "Бишкек": (42.8746, 74.5698),
-    # Ош
-    "Ош": (40.5283, 72.7985),
-    # Чуйская область
-    "Токмок": (42.8421, 75.3008),
-    "Кант": (42.8911, 74.8508),
-    "Кара-Балта": (42.8144, 73.8486),
-    "Шопоков": (42.8833, 74.8667),
-    "Беловодское": (42.8283, 74.1019),
-    "Сокулук": (42.6833, 74.2833),
-    "Жайыл": (42.9667, 75.7333),
-    "Кемин": (42.8500, 75.6333),
-    "Панфилов": (42.9167, 75.9167),
-    "Московский": (42.8667, 74.6833),
-    # Ошская область
-    "Узген": (40.7697, 73.3014),
-    "Кара-Суу": (40.7042, 72.8653),
-    "Ноокат": (39.8742, 72.8181),
-    "Кара-Кульджа": (40.5500, 72.9167),
-    "Араван": (40.2833, 72.4500),
-    "Чон-Алай": (39.9167, 72.9500),
-    "Алай": (39.5333, 72.8667),
-    "Кызыл-Кия": (40.2567, 72.1281),
-    # Джалал-Абадская область
-    "Джалал-Абад": (40.9333, 72.9333),
-    "Кербен": (41.0167, 72.4833),
-    "Майлуу-Суу": (41.0167, 72.4833),
-    "Таш-Кумыр": (41.3472, 71.6139),
-    "Кок-Жангак": (41.1833, 72.4833),
-    "Казарман": (41.4000, 73.5000),
-    "Чаткал": (41.7833, 71.0833),
-    "Токтогул": (41.8742, 72.9431),
-    # Баткенская область
-    "Баткен": (40.0617, 70.8181),
-    "Сулюкта": (39.9333, 69.5667),
-    "Кадамжай": (39.6333, 71.3500),
-    "Лейлек": (39.7167, 71.1333),
-    # Нарынская область
-    "Нарын": (41.4286, 75.9911),
-    "Ат-Башы": (41.1667, 75.8167),
-    "Жумгал": (41.8000, 75.6000),
-    "Кочкор": (42.0500, 75.5833),
-    "Ак-Талаа": (41.5833, 75.7833),
-    # Иссык-Кульская область
-    "Каракол": (42.4906, 78.3931),
-    "Балыкчы": (42.4603, 76.1844),
-    "Чолпон-Ата": (42.6489, 77.0814),
-    "Кызыл-Суу": (42.3500, 78.0167),
-    "Тюп": (42.7333, 78.3667),
-    "Ак-Суу": (42.5000, 77.5000),
-    "Жети-Огуз": (42.4333, 78.2000),
-    "Тон": (42.2833, 77.1833),
-    # Таласская область
-    "Талас": (42.5228, 72.2419),
-    "Кара-Буура": (42.7833, 73.6500),
-    "Бакай-Ата": (42.8167, 73.1833),
-    "Манас": (42.7000, 73.9167),
-    "Кызыл-Адыр": (42.4833, 72.1167),
-}
+# Connection pool of the long-lived backend API session: open connections,
+# how long an idle one is kept alive and how long DNS answers are cached
+API_MAX_CONNECTIONS = int(os.getenv("API_MAX_CONNECTIONS", "10"))
+API_KEEPALIVE_TIMEOUT = float(os.getenv("API_KEEPALIVE_TIMEOUT", "60"))
+API_DNS_CACHE_TTL = int(os.getenv("API_DNS_CACHE_TTL", "300"))
+
+# Backend health: probed every BACKEND_HEALTH_INTERVAL seconds in the
+# background. After BREAKER_FAILURE_THRESHOLD failed submissions or probes in
+# a row, submissions go straight to the local backup for
+# BREAKER_RESET_TIMEOUT seconds, then one trial submission is let through
+BACKEND_HEALTH_INTERVAL = float(os.getenv("BACKEND_HEALTH_INTERVAL", "30"))
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "3"))
+BREAKER_RESET_TIMEOUT = float(os.getenv("BREAKER_RESET_TIMEOUT", "30"))
+
+# Reports the backend did not accept are spooled to SQLite at SPOOL_PATH and
+# resent every SPOOL_DRAIN_INTERVAL seconds, backing off from
+# SPOOL_RETRY_DELAY to SPOOL_RETRY_MAX_DELAY seconds, up to SPOOL_MAX_ATTEMPTS
+SPOOL_PATH = os.getenv("SPOOL_PATH", os.path.join("reports", "spool.sqlite3"))
+SPOOL_DRAIN_INTERVAL = float(os.getenv("SPOOL_DRAIN_INTERVAL", "15"))
+SPOOL_BATCH_SIZE = int(os.getenv("SPOOL_BATCH_SIZE", "20"))
+SPOOL_RETRY_DELAY = float(os.getenv("SPOOL_RETRY_DELAY", "30"))
+SPOOL_RETRY_MAX_DELAY = float(os.getenv("SPOOL_RETRY_MAX_DELAY", "3600"))
+SPOOL_MAX_ATTEMPTS = int(os.getenv("SPOOL_MAX_ATTEMPTS", "20"))
+
+# Offline gazetteer of regions, cities, districts and microdistricts. The bot
+# ships its own copy (tg_bot/data/gazetteer.json) of the backend's
+# backend/backend/data/gazetteer.json; it is loaded on first use
+GAZETTEER_PATH = os.getenv("GAZETTEER_PATH", DEFAULT_GAZETTEER_PATH)
+
+
+def get_gazetteer() -> Gazetteer:
+    """The gazetteer at GAZETTEER_PATH, loaded and indexed on first use"""
+    try:
+        return load_gazetteer(GAZETTEER_PATH)
+    except FileNotFoundError as e:
+        raise RuntimeError(
+            f"Gazetteer data not found at {GAZETTEER_PATH}: "
+            f"set GAZETTEER_PATH or ship tg_bot/data/gazetteer.json with the bot"
+        ) from e
+
+
+def regions_cities() -> Dict[str, list]:
+    """Kyrgyzstan regions and the cities offered for selection in each of them"""
+    return get_gazetteer().cities_by_region()
+
+
+def __getattr__(name):
+    # GAZETTEER, REGIONS_CITIES and CITY_COORDINATES are built on first access
+    # so that importing config never reads the data file
+    if name == "GAZETTEER":
+        return get_gazetteer()
+    if name == "REGIONS_CITIES":
+        return regions_cities()
+    if name == "CITY_COORDINATES":
+        # City coordinates (latitude, longitude) - fallback coordinates
+        return {place.name: place.coordinates for place in get_gazetteer().settlements()}
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+# Geocoding requests to the backend: timeout in seconds, and how many results
+# are kept in memory and for how long
+GEOCODE_TIMEOUT = float(os.getenv("GEOCODE_TIMEOUT", "5"))
+GEOCODE_CACHE_SIZE = int(os.getenv("GEOCODE_CACHE_SIZE", "1024"))
+GEOCODE_CACHE_TTL = int(os.getenv("GEOCODE_CACHE_TTL", "3600"))
+
+# Reverse geocoding of shared locations. The nearest settlement comes from
+# the gazetteer (within NEAREST_PLACE_MAX_KM); the street address from
+# Nominatim, at most one request per NOMINATIM_MIN_INTERVAL seconds, no more
+# than REVERSE_GEOCODE_MAX_PENDING queued and waited for up to
+# REVERSE_GEOCODE_TIMEOUT seconds
+NEAREST_PLACE_MAX_KM = float(os.getenv("NEAREST_PLACE_MAX_KM", "100"))
+NOMINATIM_USER_AGENT = os.getenv("NOMINATIM_USER_AGENT", "gov_services_bot")
+NOMINATIM_MIN_INTERVAL = float(os.getenv("NOMINATIM_MIN_INTERVAL", "1.0"))
+REVERSE_GEOCODE_TIMEOUT = float(os.getenv("REVERSE_GEOCODE_TIMEOUT", "3"))
+REVERSE_GEOCODE_MAX_PENDING = int(os.getenv("REVERSE_GEOCODE_MAX_PENDING", "10"))
+REVERSE_GEOCODE_CACHE_SIZE = int(os.getenv("REVERSE_GEOCODE_CACHE_SIZE", "2048"))
+
+
+def local_coordinates(city_name: str) -> Optional[Dict[str, Any]]:
+    """Coordinates of a city, village or district from the gazetteer"""
+    gazetteer = get_gazetteer()
+    place = gazetteer.resolve(city_name)
+    if place is None:
+        return None
+    return {
+        "latitude": place.latitude,
+        "longitude": place.longitude,
+        "address": place.address(gazetteer.country),
+        "source": "gazetteer",
+    }
+
+
+def fallback_coordinates(
+    city_name: str, street: str = "", house: str = ""
+) -> Optional[Dict[str, Any]]:
+    """Coordinates of the city center for an address the backend could not find"""
+    place = get_gazetteer().resolve(city_name)
+    if not place:
+        return None
+    latitude, longitude = place.coordinates
+    address_parts = []
+    if house:
+        address_parts.append(house)
+    if street:
+        address_parts.append(street)
+    address_parts.append(city_name)
+    address_parts.append("Кыргызстан")
+    full_address = ", ".join(address_parts)
+
+    return {
+        "latitude": latitude,
+        "longitude": longitude,
+        "address": full_address,
+        "source": "fallback_coordinates",
+        "warning": "Точные координаты не найдены, использованы координаты центра города",
+    }
+
+
+def nearest_place(latitude: float, longitude: float):
+    """The closest city or village from the gazetteer, or None when too far away"""
+    place, _ = get_gazetteer().nearest(latitude, longitude, max_km=NEAREST_PLACE_MAX_KM)
+    return place
 
 
 def config_get_coordinates(
     city_name: str, street: str = "", house: str = ""
 ) -> Optional[Dict[str, Any]]:
     """
-    Get coordinates for a location using the backend API
+    Get coordinates for a location using the backend API (blocking)
+
+    Kept for scripts and other synchronous code; handlers use the async
+    geocoding.get_coordinates, which does not block the event loop.
     Args:
         city_name: название города
         street: название улицы (опционально)
         house: номер дома (опционально)
     """
+    # Cities, villages and districts are resolved locally, only street
+    # addresses need the backend (and Google Maps behind it)
+    if not street and not house:
+        location = local_coordinates(city_name)
+        if location is not None:
+            return location
+
     if API_ENABLED:
         try:
             import requests
@@ -163,6 +176,7 @@ def config_get_coordinates(
                 f"{API_BASE_URL}/api/geocode/",
                 params=params,
                 headers={"Authorization": f"Bearer {API_KEY}"} if API_KEY else {},
+                timeout=GEOCODE_TIMEOUT,
             )
 
             if response.status_code == 200:
@@ -172,27 +186,8 @@ def config_get_coordinates(
         except Exception as e:
             print(f"Error calling geocoding API: {e}")
 
-    # Fallback to predefined coordinates
-    coordinates = CITY_COORDINATES.get(city_name)
-    if coordinates:
-        latitude, longitude = coordinates
-        address_parts = []
-        if house:
-            address_parts.append(house)
-        if street:
-            address_parts.append(street)
-        address_parts.append(city_name)
-        address_parts.append("Кыргызстан")
-        full_address = ", ".join(address_parts)
-
-        return {
-            "latitude": latitude,
-            "longitude": longitude,
-            "address": full_address,
-            "source": "fallback_coordinates",
-            "warning": "Точные координаты не найдены, использованы координаты центра города",
-        }
-    return None
+    # Fallback to the coordinates of the city center
+    return fallback_coordinates(city_name, street, house)
 
 
 REPORT_TYPES = ["Жалоба"]
@@ -0,0 +1,350 @@
+"""
+Offline gazetteer of Kyrgyzstan: regions, cities, villages, districts and
+microdistricts with coordinates and Russian/Kyrgyz names.
+
+The data is one file, data/gazetteer.json next to this module. The backend
+and the bot are deployed separately, so both ship a copy: this module has no
+dependencies beyond the standard library and is kept identical in
+backend/backend/gazetteer.py and tg_bot/gazetteer.py, and tg_bot/data holds a
+copy of backend/backend/data/gazetteer.json. Edit the backend files and copy
+them to the bot with scripts/sync_gazetteer.py; ``--check`` (run by the
+backend tests) fails while the copies differ.
+
+Names are normalized before indexing, so "г. Жалал-Абад", "джалал абад" and
+"Жалал-Абад" share one key. Lookups go exact key -> unique prefix -> trigram
+similarity, which is enough to answer city-level queries without Google Maps.
+"""
+import bisect
+import json
+import math
+import os
+import re
+import threading
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from typing import Dict, List, Tuple
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "gazetteer.json")
+
+# Kyrgyz letters are matched as their nearest Russian ones
+_LETTERS = str.maketrans({"ё": "е", "ө": "о", "ү": "у", "ң": "н"})
+_TOKEN_RE = re.compile(r"[^\w-]+")
+
+# Words that name the kind of place and not the place itself
+_TYPE_WORDS = {
+    "г", "город", "шаары", "ш", "с", "село", "айылы", "пгт", "поселок", "пос",
+    "область", "обл", "облусу", "район", "р-н", "району", "мкр", "мкрн", "микрорайон",
+    "кыргызстан", "кыргызская", "республика",
+}
+
+# Places sharing a name are ranked by type ("Манас" is a village before a microdistrict)
+TYPE_RANK = {"city": 0, "village": 1, "district": 2, "microdistrict": 3}
+SETTLEMENT_TYPES = ("city", "village")
+
+# Minimum Dice coefficient over trigrams for a fuzzy match
+FUZZY_THRESHOLD = 0.55
+MIN_PREFIX_LENGTH = 3
+
+# Cell size of the grid used for nearest place lookups, in degrees
+GRID_CELL_DEGREES = 0.5
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+
+def normalize_name(value):
+    """Lowercase and drop punctuation, spaces, hyphens and place type words."""
+    value = (value or "").casefold().translate(_LETTERS).replace("дж", "ж")
+    tokens = (token.strip("-") for token in _TOKEN_RE.split(value))
+    return "".join(token.replace("-", "") for token in tokens if token and token not in _TYPE_WORDS)
+
+
+def distance_km(latitude1, longitude1, latitude2, longitude2):
+    """Great-circle distance between two points."""
+    lat1, lon1, lat2, lon2 = map(math.radians, (latitude1, longitude1, latitude2, longitude2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def _cell(latitude, longitude):
+    return math.floor(latitude / GRID_CELL_DEGREES), math.floor(longitude / GRID_CELL_DEGREES)
+
+
+def _trigrams(key):
+    padded = f"  {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+@dataclass(frozen=True)
+class Region:
+    name: str
+    latitude: float
+    longitude: float
+    ky: str = ""
+    aliases: Tuple[str, ...] = ()
+
+    @property
+    def coordinates(self):
+        return self.latitude, self.longitude
+
+
+@dataclass(frozen=True)
+class Place:
+    name: str
+    type: str
+    region: str
+    latitude: float
+    longitude: float
+    ky: str = ""
+    city: str = ""
+    aliases: Tuple[str, ...] = ()
+    menu: bool = False
+
+    @property
+    def coordinates(self):
+        return self.latitude, self.longitude
+
+    def address(self, country="Кыргызстан"):
+        parts = [self.name]
+        if self.city and self.city != self.name:
+            parts.append(self.city)
+        if self.region not in parts:
+            parts.append(self.region)
+        parts.append(country)
+        return ", ".join(parts)
+
+
+class Gazetteer:
+    """In-memory index over the gazetteer data."""
+
+    def __init__(self, data):
+        self.country = data.get("country", "Кыргызстан")
+        self.regions = [
+            Region(
+                name=item["name"],
+                latitude=item["center"][0],
+                longitude=item["center"][1],
+                ky=item.get("ky", ""),
+                aliases=tuple(item.get("aliases", ())),
+            )
+            for item in data["regions"]
+        ]
+        self.places = [
+            Place(
+                name=item["name"],
+                type=item["type"],
+                region=item["region"],
+                latitude=item["coordinates"][0],
+                longitude=item["coordinates"][1],
+                ky=item.get("ky", ""),
+                city=item.get("city", ""),
+                aliases=tuple(item.get("aliases", ())),
+                menu=item.get("menu", False),
+            )
+            for item in data["places"]
+        ]
+
+        self._regions = {}
+        for region in self.regions:
+            for name in (region.name, region.ky, *region.aliases):
+                key = normalize_name(name)
+                if key:
+                    self._regions.setdefault(key, region)
+
+        # Matches on the main name come before Kyrgyz names and aliases
+        # ("Кара-Көл" must not shadow "Каракол"), then by type
+        ranked = defaultdict(dict)
+        for place in self.places:
+            type_rank = TYPE_RANK.get(place.type, len(TYPE_RANK))
+            for alias_rank, names in enumerate(((place.name,), (place.ky, *place.aliases))):
+                for name in names:
+                    key = normalize_name(name)
+                    if key and place not in ranked[key]:
+                        ranked[key][place] = (alias_rank, type_rank)
+        self._places = {
+            key: sorted(places, key=places.get) for key, places in ranked.items()
+        }
+
+        self._grids = {}
+        self._keys = sorted(self._places)
+        self._postings = defaultdict(list)
+        self._trigram_counts = {}
+        for key in self._keys:
+            grams = _trigrams(key)
+            self._trigram_counts[key] = len(grams)
+            for gram in grams:
+                self._postings[gram].append(key)
+
+    def __len__(self):
+        return len(self.places)
+
+    def lookup(self, name, region=None, types=None):
+        """Places whose name, Kyrgyz name or alias normalizes to the same key."""
+        return self._filter(self._places.get(normalize_name(name), ()), region, types)
+
+    def prefix(self, text, limit=10, region=None, types=None):
+        """Places with a name starting with ``text``, shortest names first."""
+        key = normalize_name(text)
+        if not key:
+            return []
+        start = bisect.bisect_left(self._keys, key)
+        keys = []
+        for candidate in self._keys[start:]:
+            if not candidate.startswith(key):
+                break
+            keys.append(candidate)
+        keys.sort(key=len)
+        return self._collect(keys, limit, region, types)
+
+    def fuzzy(self, text, limit=5, region=None, types=None, threshold=FUZZY_THRESHOLD):
+        """Places ranked by trigram similarity, as (score, place) pairs."""
+        key = normalize_name(text)
+        if not key:
+            return []
+        grams = _trigrams(key)
+        shared = Counter(candidate for gram in grams for candidate in self._postings.get(gram, ()))
+
+        scored = []
+        for candidate, common in shared.items():
+            score = 2 * common / (len(grams) + self._trigram_counts[candidate])
+            if score >= threshold:
+                scored.append((score, candidate))
+        scored.sort(key=lambda item: (-item[0], item[1]))
+
+        results = []
+        seen = set()
+        for score, candidate in scored:
+            for place in self._filter(self._places[candidate], region, types):
+                if place not in seen:
+                    seen.add(place)
+                    results.append((round(score, 3), place))
+            if len(results) >= limit:
+                break
+        return results[:limit]
+
+    def resolve(self, text, region=None, types=None):
+        """The best matching place, or None"""
+        matches = self.lookup(text, region, types)
+        if matches:
+            return matches[0]
+
+        if len(normalize_name(text)) >= MIN_PREFIX_LENGTH:
+            matches = self.prefix(text, limit=2, region=region, types=types)
+            if len(matches) == 1:
+                return matches[0]
+
+        matches = self.fuzzy(text, limit=2, region=region, types=types)
+        if not matches or (len(matches) > 1 and matches[0][0] == matches[1][0]):
+            # Nothing close enough, or two places equally close
+            return None
+        return matches[0][1]
+
+    def resolve_region(self, text):
+        """The region named by ``text`` (Russian or Kyrgyz), or None"""
+        key = normalize_name(text)
+        region = self._regions.get(key)
+        if region is not None or not key:
+            return region
+
+        grams = _trigrams(key)
+        best = None
+        for region_key, region in self._regions.items():
+            region_grams = _trigrams(region_key)
+            score = 2 * len(grams & region_grams) / (len(grams) + len(region_grams))
+            if score >= FUZZY_THRESHOLD and (best is None or score > best[0]):
+                best = (score, region)
+        return best[1] if best else None
+
+    def nearest(self, latitude, longitude, types=SETTLEMENT_TYPES, max_km=None):
+        """The closest place of the given types and the distance to it in km
+
+        Places are bucketed into a grid of GRID_CELL_DEGREES cells; the search
+        walks rings of cells outwards until no unvisited cell can hold a
+        closer place. Returns (None, None) for an empty gazetteer and, with
+        ``max_km``, when no place is that close (e.g. coordinates outside
+        Kyrgyzstan); the search then stops once the rings are out of reach.
+        """
+        grid, bounds = self._grid(tuple(types))
+        if not grid:
+            return None, None
+        row, column = _cell(latitude, longitude)
+        min_row, max_row, min_column, max_column = bounds
+        last_ring = max(abs(row - min_row), abs(row - max_row), abs(column - min_column), abs(column - max_column))
+
+        best, best_distance = None, None
+        for ring in range(last_ring + 1):
+            for cell_row in range(row - ring, row + ring + 1):
+                step = 1 if abs(cell_row - row) == ring else 2 * ring
+                for cell_column in range(column - ring, column + ring + 1, max(step, 1)):
+                    for place in grid.get((cell_row, cell_column), ()):
+                        distance = distance_km(latitude, longitude, place.latitude, place.longitude)
+                        if best_distance is None or distance < best_distance:
+                            best, best_distance = place, distance
+            # Cells past this ring are at least ``ring`` cells away on one axis
+            widest_latitude = min(89.0, abs(latitude) + (ring + 1) * GRID_CELL_DEGREES)
+            reach = ring * GRID_CELL_DEGREES * KM_PER_DEGREE * math.cos(math.radians(widest_latitude))
+            if best is not None and best_distance <= reach:
+                break
+            if max_km is not None and reach > max_km:
+                break
+        if best is None or (max_km is not None and best_distance > max_km):
+            return None, None
+        return best, best_distance
+
+    def cities_by_region(self) -> Dict[str, List[str]]:
+        """Settlements offered for selection, grouped by region in data order"""
+        cities = {region.name: [] for region in self.regions}
+        for place in self.places:
+            if place.menu:
+                cities[place.region].append(place.name)
+        return cities
+
+    def settlements(self) -> List[Place]:
+        return [place for place in self.places if place.type in SETTLEMENT_TYPES]
+
+    def _grid(self, types):
+        grid = self._grids.get(types)
+        if grid is None:
+            cells = defaultdict(list)
+            for place in self.places:
+                if place.type in types:
+                    cells[_cell(place.latitude, place.longitude)].append(place)
+            rows = [cell[0] for cell in cells] or [0]
+            columns = [cell[1] for cell in cells] or [0]
+            grid = self._grids[types] = (dict(cells), (min(rows), max(rows), min(columns), max(columns)))
+        return grid
+
+    def _collect(self, keys, limit, region, types):
+        results = []
+        for key in keys:
+            for place in self._filter(self._places[key], region, types):
+                if place not in results:
+                    results.append(place)
+            if len(results) >= limit:
+                break
+        return results[:limit]
+
+    @staticmethod
+    def _filter(places, region, types):
+        return [
+            place for place in places
+            if (region is None or place.region == region) and (types is None or place.type in types)
+        ]
+
+
+_gazetteers = {}
+_gazetteers_lock = threading.Lock()
+
+
+def load_gazetteer(path=None) -> Gazetteer:
+    """Load and index the gazetteer file once per process."""
+    path = os.path.abspath(path or DEFAULT_PATH)
+    gazetteer = _gazetteers.get(path)
+    if gazetteer is None:
+        with _gazetteers_lock:
+            gazetteer = _gazetteers.get(path)
+            if gazetteer is None:
+                with open(path, encoding="utf-8") as f:
+                    gazetteer = Gazetteer(json.load(f))
+                _gazetteers[path] = gazetteer
+    return gazetteer
+
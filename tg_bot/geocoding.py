@@ -0,0 +1,287 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Optional, Tuple
+
+import aiohttp
+from geopy.geocoders import Nominatim
+
+from config import (
+    API_BASE_URL,
+    API_ENABLED,
+    API_KEY,
+    GEOCODE_CACHE_SIZE,
+    GEOCODE_CACHE_TTL,
+    GEOCODE_TIMEOUT,
+    NOMINATIM_MIN_INTERVAL,
+    NOMINATIM_USER_AGENT,
+    REVERSE_GEOCODE_CACHE_SIZE,
+    REVERSE_GEOCODE_MAX_PENDING,
+    REVERSE_GEOCODE_TIMEOUT,
+    fallback_coordinates,
+    local_coordinates,
+)
+
+
+class GeocodingClient:
+    """Async client for the backend /api/geocode/ endpoint
+
+    Handlers call it from the event loop, so nothing here blocks:
+    - cities and villages are answered from the local gazetteer;
+    - street addresses go to the backend over one shared pooled session with
+      a timeout;
+    - results are kept in an LRU for GEOCODE_CACHE_TTL seconds;
+    - concurrent lookups of the same address wait for one request.
+    """
+
+    def __init__(
+        self,
+        base_url: str = None,
+        timeout: float = None,
+        cache_size: int = None,
+        cache_ttl: int = None,
+    ):
+        self.base_url = base_url or API_BASE_URL
+        self.timeout = timeout or GEOCODE_TIMEOUT
+        self.cache_size = cache_size or GEOCODE_CACHE_SIZE
+        self.cache_ttl = cache_ttl or GEOCODE_CACHE_TTL
+        self.session = None
+        self._cache = OrderedDict()
+        self._inflight = {}
+        self._stats = {
+            'local': 0,
+            'hits': 0,
+            'misses': 0,
+            'coalesced': 0,
+            'requests': 0,
+            'errors': 0,
+        }
+
+    async def get_coordinates(
+        self, city_name: str, street: str = '', house: str = ''
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Get coordinates for a location
+
+        Args:
+            city_name: название города (или полный адрес)
+            street: название улицы (опционально)
+            house: номер дома (опционально)
+        """
+        if not street and not house:
+            location = local_coordinates(city_name)
+            if location is not None:
+                self._stats['local'] += 1
+                return location
+
+        if API_ENABLED:
+            key = self._cache_key(city_name, street, house)
+            cached = self._cache_get(key)
+            if cached is not None:
+                self._stats['hits'] += 1
+                return dict(cached)
+            self._stats['misses'] += 1
+
+            task = self._inflight.get(key)
+            if task is None:
+                task = asyncio.ensure_future(self._fetch(key, city_name, street, house))
+                self._inflight[key] = task
+                task.add_done_callback(lambda _: self._inflight.pop(key, None))
+            else:
+                self._stats['coalesced'] += 1
+
+            # A cancelled handler must not cancel the request other handlers wait for
+            result = await asyncio.shield(task)
+            if result is not None:
+                return dict(result)
+
+        return fallback_coordinates(city_name, street, house)
+
+    async def _fetch(self, key, city_name, street, house) -> Optional[Dict[str, Any]]:
+        params = {'city': city_name}
+        if street:
+            params['street'] = street
+        if house:
+            params['house'] = house
+        headers = {'Authorization': f'Bearer {API_KEY}'} if API_KEY else {}
+
+        self._stats['requests'] += 1
+        try:
+            session = await self._get_session()
+            async with session.get(
+                f"{self.base_url}/api/geocode/", params=params, headers=headers
+            ) as response:
+                if response.status != 200:
+                    error_text = await response.text()
+                    logging.error(f"Geocoding API error {response.status}: {error_text}")
+                    self._stats['errors'] += 1
+                    return None
+                result = await response.json()
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logging.error(f"Error calling geocoding API: {e!r}")
+            self._stats['errors'] += 1
+            return None
+
+        self._cache_set(key, result)
+        return result
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        if self.session is None or self.session.closed:
+            self.session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=20, ttl_dns_cache=300),
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                headers={'User-Agent': 'GovServices-TelegramBot/1.0', 'Accept': 'application/json'},
+            )
+        return self.session
+
+    async def close(self):
+        """Close the shared session"""
+        if self.session and not self.session.closed:
+            await self.session.close()
+        self.session = None
+
+    @staticmethod
+    def _cache_key(city_name, street, house) -> Tuple[str, str, str]:
+        return tuple(' '.join((part or '').casefold().split()) for part in (city_name, street, house))
+
+    def _cache_get(self, key):
+        entry = self._cache.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._cache[key]
+            return None
+        self._cache.move_to_end(key)
+        return value
+
+    def _cache_set(self, key, value):
+        self._cache[key] = (time.monotonic() + self.cache_ttl, value)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def stats(self) -> Dict[str, int]:
+        return {**self._stats, 'cached': len(self._cache), 'inflight': len(self._inflight)}
+
+
+class ReverseGeocoder:
+    """Street addresses for shared locations from Nominatim
+
+    geopy's Nominatim client blocks, so lookups run in one worker thread,
+    no more often than once per NOMINATIM_MIN_INTERVAL seconds (Nominatim
+    usage policy), with at most REVERSE_GEOCODE_MAX_PENDING of them queued.
+    Callers wait up to REVERSE_GEOCODE_TIMEOUT seconds; a lookup that takes
+    longer still finishes and is cached. Results are cached by coordinates
+    rounded to about 10 m.
+    """
+
+    def __init__(
+        self,
+        timeout: float = None,
+        min_interval: float = None,
+        max_pending: int = None,
+        cache_size: int = None,
+    ):
+        self.timeout = timeout or REVERSE_GEOCODE_TIMEOUT
+        self.min_interval = NOMINATIM_MIN_INTERVAL if min_interval is None else min_interval
+        self.max_pending = max_pending or REVERSE_GEOCODE_MAX_PENDING
+        self.cache_size = cache_size or REVERSE_GEOCODE_CACHE_SIZE
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='nominatim')
+        # Only used by the worker thread
+        self._geolocator = None
+        self._last_request = 0.0
+        self._cache = OrderedDict()
+        self._inflight = {}
+        self._stats = {
+            'hits': 0,
+            'requests': 0,
+            'coalesced': 0,
+            'timeouts': 0,
+            'errors': 0,
+            'rejected': 0,
+        }
+
+    async def reverse(self, latitude: float, longitude: float) -> Optional[str]:
+        """Address at the coordinates, or None if it is not known in time"""
+        key = (round(latitude, 4), round(longitude, 4))
+        address = self._cache.get(key)
+        if address is not None:
+            self._cache.move_to_end(key)
+            self._stats['hits'] += 1
+            return address
+
+        task = self._inflight.get(key)
+        if task is None:
+            if len(self._inflight) >= self.max_pending:
+                # Queue already holds more than the rate limit can serve in time
+                self._stats['rejected'] += 1
+                return None
+            task = asyncio.ensure_future(self._lookup(key, latitude, longitude))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self._stats['coalesced'] += 1
+
+        try:
+            return await asyncio.wait_for(asyncio.shield(task), self.timeout)
+        except asyncio.TimeoutError:
+            self._stats['timeouts'] += 1
+            return None
+
+    async def _lookup(self, key, latitude, longitude) -> Optional[str]:
+        loop = asyncio.get_running_loop()
+        self._stats['requests'] += 1
+        try:
+            address = await loop.run_in_executor(
+                self._executor, self._reverse_blocking, latitude, longitude
+            )
+        except Exception as e:
+            logging.error(f"Error getting address: {e!r}")
+            self._stats['errors'] += 1
+            return None
+
+        if address:
+            self._cache[key] = address
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return address
+
+    def _reverse_blocking(self, latitude, longitude):
+        # Runs in the worker thread, one request at a time
+        wait = self._last_request + self.min_interval - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+        try:
+            if self._geolocator is None:
+                self._geolocator = Nominatim(user_agent=NOMINATIM_USER_AGENT, timeout=self.timeout)
+            location = self._geolocator.reverse(f"{latitude}, {longitude}", language='ru')
+        finally:
+            self._last_request = time.monotonic()
+        return location.address if location else None
+
+    def close(self):
+        """Drop queued lookups and stop the worker thread"""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> Dict[str, int]:
+        return {**self._stats, 'cached': len(self._cache), 'inflight': len(self._inflight)}
+
+
+# Global geocoding clients, closed at shutdown
+geocoding_client = GeocodingClient()
+reverse_geocoder = ReverseGeocoder()
+
+
+async def get_coordinates(
+    city_name: str, street: str = '', house: str = ''
+) -> Optional[Dict[str, Any]]:
+    """
+    Convenience function to geocode a location without blocking the event loop
+
+    Returns:
+        Location dictionary or None
+    """
+    return await geocoding_client.get_coordinates(city_name, street, house)
@@ -1,3 +1,4 @@
+import asyncio
 import logging
 from datetime import datetime
 from typing import Dict, Any
@@ -28,8 +29,17 @@ from utils import (
     escape_markdown,
     get_city_coordinates,
 )
-from config import ADMIN_USER_ID, API_ENABLED, REGIONS_CITIES
-from api_client import send_report_to_api, check_backend_health
+from config import (
+    ADMIN_USER_ID,
+    API_ENABLED,
+    NEAREST_PLACE_MAX_KM,
+    get_gazetteer,
+    nearest_place,
+)
+from gazetteer import SETTLEMENT_TYPES, distance_km
+from api_client import generate_rpt
+from health import submit_report
+from spool import spool_report
 from localization import (
     get_text,
     get_user_language,
@@ -210,91 +220,77 @@ async def skip_location_inline(callback: CallbackQuery, state: FSMContext):
     await state.set_state(ReportStates.waiting_for_region)
 
 
+def _location_summary(report_type, region, city, street_address) -> str:
+    return (
+        f"✅ Тип обращения: **{report_type}**\n"
+        f"✅ Регион: **{region}**\n"
+        f"✅ Населенный пункт: **{city}**\n"
+        f"✅ Адрес: **{street_address or 'Не указан'}**\n\n"
+        f"Изложите суть обращения:"
+    )
+
+
+def _place_from_address(address: str, latitude: float, longitude: float, nearest):
+    """Settlement named in a street address (else ``nearest``) and the street part"""
+    gazetteer = get_gazetteer()
+    address_parts = [part.strip() for part in address.split(",")]
+    place = nearest
+    for part in address_parts:
+        matches = gazetteer.lookup(part, types=SETTLEMENT_TYPES)
+        if matches and (
+            distance_km(latitude, longitude, *matches[0].coordinates) <= NEAREST_PLACE_MAX_KM
+        ):
+            place = matches[0]
+            break
+
+    # Формируем адрес улицы (все части адреса до района или города);
+    # в адресе без известного населенного пункта улицу не выделяем
+    street_address = ""
+    if place is not None:
+        street_parts = []
+        for part in address_parts:
+            if part == place.name or gazetteer.lookup(part):
+                street_address = ", ".join(street_parts)
+                break
+            street_parts.append(part)
+    return place, street_address
+
+
+# Street address lookups still running after the handler answered
+_address_tasks = set()
+
+
 @router.message(ReportStates.waiting_for_location, F.location)
 async def process_location(message: Message, state: FSMContext):
-    """Process location from user"""
+    """Process location from user
+
+    The region and settlement come from the gazetteer right away; the street
+    address is looked up in the background and filled in when it arrives.
+    """
     data = await state.get_data()
     lang = get_user_language(data)
 
-    # Сохраняем геолокацию
+    latitude = message.location.latitude
+    longitude = message.location.longitude
+
+    # Ближайший населенный пункт из справочника определяется сразу, без сети
+    nearest = nearest_place(latitude, longitude)
+    region = nearest.region if nearest else "Не определен"
+    city = nearest.name if nearest else "Не определен"
+
+    # Сохраняем точную геолокацию пользователя
     location_data = {
-        "latitude": message.location.latitude,
-        "longitude": message.location.longitude,
+        "latitude": latitude,
+        "longitude": longitude,
+        "address": nearest.address(get_gazetteer().country) if nearest else "Адрес не найден",
         "source": "user_location",
     }
 
-    # Получаем адрес по координатам
-    address = await get_address_from_coordinates(
-        message.location.latitude, message.location.longitude
-    )
-    location_data["address"] = address
-
-    # Определяем регион и город из адреса
-    region = "Не определен"
-    city = "Не определен"
-    street_address = ""
-
-    # Пытаемся определить регион и город из адреса
-    if address:
-        # Разбиваем адрес на части
-        address_parts = [part.strip() for part in address.split(",")]
-
-        # Сначала ищем город
-        for part in address_parts:
-            for reg, cities in REGIONS_CITIES.items():
-                if part in cities:
-                    region = reg
-                    city = part
-                    break
-            if region != "Не определен":
-                break
-
-        # Если город не найден, ищем регион
-        if region == "Не определен":
-            for part in address_parts:
-                if part in REGIONS_CITIES:
-                    region = part
-                    # Берем первый город из списка городов региона
-                    if REGIONS_CITIES[region]:
-                        city = REGIONS_CITIES[region][0]
-                    break
-
-        # Формируем адрес улицы (все части адреса до города)
-        street_parts = []
-        for part in address_parts:
-            if part == city:
-                break
-            street_parts.append(part)
-        street_address = ", ".join(street_parts)
-
-    # Если регион и город все еще не определены, используем координаты для определения
-    if region == "Не определен" or city == "Не определен":
-        # Определяем регион по координатам
-        for reg, cities in REGIONS_CITIES.items():
-            for city_name in cities:
-                city_coords = get_city_coordinates("", city_name)
-                if city_coords:
-                    # Простая проверка на близость координат
-                    lat_diff = abs(city_coords["latitude"] - message.location.latitude)
-                    lon_diff = abs(
-                        city_coords["longitude"] - message.location.longitude
-                    )
-                    if lat_diff < 1 and lon_diff < 1:  # Примерно 100 км
-                        region = reg
-                        city = city_name
-                        break
-            if region != "Не определен":
-                break
-
-    # Получаем координаты с учетом полного адреса
-    full_address = f"{street_address}, {city}" if street_address else city
-    location_data = get_city_coordinates(full_address, city)
-
     await state.update_data(
         location=location_data,
         region=region,
         city=city,
-        address=street_address if street_address else "Не указан",
+        address="Не указан",
     )
 
     await message.answer(
@@ -302,17 +298,54 @@ async def process_location(message: Message, state: FSMContext):
     )
 
     # Переходим к вводу текста обращения
-    await message.answer(
-        f"✅ Тип обращения: **{data.get('type')}**\n"
-        f"✅ Регион: **{region}**\n"
-        f"✅ Населенный пункт: **{city}**\n"
-        f"✅ Адрес: **{street_address if street_address else 'Не указан'}**\n\n"
-        f"Изложите суть обращения:",
+    summary = await message.answer(
+        _location_summary(data.get("type"), region, city, ""),
         parse_mode="Markdown",
     )
 
     await state.set_state(ReportStates.waiting_for_report_text)
 
+    task = asyncio.create_task(
+        _fill_street_address(state, summary, data.get("type"), latitude, longitude, nearest)
+    )
+    _address_tasks.add(task)
+    task.add_done_callback(_address_tasks.discard)
+
+
+async def _fill_street_address(state: FSMContext, summary: Message, report_type, latitude, longitude, nearest):
+    """Add the Nominatim street address to the report and the summary message"""
+    address = await get_address_from_coordinates(latitude, longitude)
+    if not address:
+        return
+
+    try:
+        data = await state.get_data()
+        location = data.get("location") or {}
+        if (location.get("latitude"), location.get("longitude")) != (latitude, longitude):
+            # The report was sent or the user shared another location meanwhile
+            return
+
+        place, street_address = _place_from_address(address, latitude, longitude, nearest)
+        region = place.region if place else "Не определен"
+        city = place.name if place else "Не определен"
+        await state.update_data(
+            location={**location, "address": address},
+            region=region,
+            city=city,
+            address=street_address or "Не указан",
+        )
+        if (region, city, street_address or "Не указан") == (
+            data.get("region"), data.get("city"), data.get("address")
+        ):
+            # Telegram refuses edits that change nothing
+            return
+        await summary.edit_text(
+            _location_summary(report_type, region, city, street_address),
+            parse_mode="Markdown",
+        )
+    except Exception as e:
+        logging.error(f"Error filling in street address: {e}")
+
 
 @router.callback_query(F.data == "back_to_main")
 async def back_to_main(callback: CallbackQuery, state: FSMContext):
@@ -555,19 +588,18 @@ async def confirm_report(callback: CallbackQuery, state: FSMContext):
     # Initialize variables
     api_response = None
     registration_number = None
+    submit_error = ""
+
+    # The idempotency key is assigned once: spooled retries of this report
+    # reuse it and overwrite the same backend document
+    data["rpt"] = data.get("rpt") or generate_rpt(data)
 
     # Try to send to Django backend first
     if API_ENABLED:
         try:
-            # First check if backend is healthy
-            health_check = await check_backend_health()
-            if not health_check.get("success"):
-                logging.warning(
-                    f"Backend health check failed: {health_check.get('message')}"
-                )
-
-            # Send the report
-            api_response = await send_report_to_api(data)
+            # Send the report; while the backend is known to be down the
+            # circuit breaker skips straight to the local backup
+            api_response = await submit_report(data)
             if api_response.get("success"):
                 registration_number = api_response.get("data", {}).get(
                     "id", "API_SUCCESS"
@@ -582,15 +614,21 @@ async def confirm_report(callback: CallbackQuery, state: FSMContext):
                 logging.error(
                     f"Django API submission failed: {api_response.get('message')}"
                 )
+                submit_error = api_response.get("message", "")
         except Exception as e:
             logging.error(f"Error sending to Django API: {e}")
+            submit_error = str(e)
 
-    # Save report to file as backup
-    filename = await save_report_to_file(data)
-
-    # Use API registration number if available, otherwise use filename
+    # Only failed submissions touch the disk: the report goes to the spool and
+    # is resent in the background; the JSON file is the last resort. With the
+    # API disabled nothing is resent, so the report only goes to the file.
     if not registration_number:
-        registration_number = filename.split("/")[-1] if filename else "LOCAL_BACKUP"
+        if API_ENABLED and await spool_report(data, submit_error):
+            registration_number = f"RPT-{data['rpt']}"
+        else:
+            backup = {key: value for key, value in data.items() if key != "photo_data"}
+            filename = await save_report_to_file(backup)
+            registration_number = filename.split("/")[-1] if filename else "LOCAL_BACKUP"
 
     # Format final report
     final_report = await format_report(data, lang)
@@ -752,11 +790,11 @@ async def process_address(message: Message, state: FSMContext):
     full_address = f"{address}, {city}" if address else city
 
     # Пытаемся получить координаты по введенному адресу
-    location_data = get_city_coordinates(address, city)
+    location_data = await get_city_coordinates(address, city)
 
     # Если координаты не найдены или произошла ошибка, используем координаты города
     if not location_data or location_data.get("source") != "google_maps":
-        location_data = get_city_coordinates("", city)
+        location_data = await get_city_coordinates("", city)
         if location_data:
             location_data["address"] = full_address
             location_data["warning"] = (
@@ -798,7 +836,7 @@ async def skip_address_inline(callback: CallbackQuery, state: FSMContext):
     await callback.message.delete()
 
     # Используем координаты города, если адрес пропущен
-    location_data = get_city_coordinates("", city)
+    location_data = await get_city_coordinates("", city)
     await state.update_data(
         address="Не указан",  # Сохраняем, что адрес не указан
         location=location_data,  # Сохраняем координаты города
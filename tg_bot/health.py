@@ -0,0 +1,178 @@
+import asyncio
+import logging
+import time
+from typing import Dict, Any, Optional
+
+from api_client import api_client
+from config import BACKEND_HEALTH_INTERVAL, BREAKER_FAILURE_THRESHOLD, BREAKER_RESET_TIMEOUT
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+# Submission errors that say nothing about backend health (bad request data)
+CLIENT_ERROR_STATUSES = range(400, 500)
+
+
+class CircuitBreaker:
+    """Circuit breaker over backend submissions
+
+    closed    - submissions go to the backend;
+    open      - after ``failure_threshold`` failures in a row submissions are
+                not attempted for ``reset_timeout`` seconds;
+    half_open - one trial submission is let through; its outcome closes or
+                reopens the breaker.
+    """
+
+    def __init__(self, failure_threshold: int = None, reset_timeout: float = None):
+        self.failure_threshold = failure_threshold or BREAKER_FAILURE_THRESHOLD
+        self.reset_timeout = reset_timeout or BREAKER_RESET_TIMEOUT
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_started_at = None
+        self._stats = {'opened': 0, 'rejected': 0, 'successes': 0, 'failures': 0}
+
+    @property
+    def state(self) -> str:
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self._state = HALF_OPEN
+            self._trial_started_at = None
+        return self._state
+
+    def allow_request(self) -> bool:
+        """Whether a submission should be attempted now"""
+        state = self.state
+        if state == CLOSED:
+            return True
+        if state == HALF_OPEN:
+            # One trial at a time; a trial that never reported back is replaced
+            now = time.monotonic()
+            if self._trial_started_at is None or now - self._trial_started_at >= self.reset_timeout:
+                self._trial_started_at = now
+                return True
+        self._stats['rejected'] += 1
+        return False
+
+    def record_success(self):
+        self._stats['successes'] += 1
+        if self._state != CLOSED:
+            logging.info("Backend circuit breaker closed")
+        self._state = CLOSED
+        self._failures = 0
+        self._trial_started_at = None
+
+    def record_failure(self):
+        self._stats['failures'] += 1
+        self._failures += 1
+        if self.state == HALF_OPEN or (self._state == CLOSED and self._failures >= self.failure_threshold):
+            self._open()
+
+    def record_probe(self, healthy: bool):
+        """Outcome of a background health probe"""
+        if not healthy:
+            self.record_failure()
+        elif self._state == OPEN:
+            # The backend answers again: let the next submission try it
+            self._state = HALF_OPEN
+            self._trial_started_at = None
+        elif self._state == CLOSED:
+            self._failures = 0
+
+    def _open(self):
+        if self._state != OPEN:
+            self._stats['opened'] += 1
+            logging.warning(
+                f"Backend circuit breaker opened after {self._failures} failures, "
+                f"retrying in {self.reset_timeout:g}s"
+            )
+        self._state = OPEN
+        self._opened_at = time.monotonic()
+        self._trial_started_at = None
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {**self._stats, 'state': self.state, 'consecutive_failures': self._failures}
+
+
+class BackendHealthMonitor:
+    """Background task probing GET /api/hello/ every ``interval`` seconds"""
+
+    def __init__(self, breaker: CircuitBreaker, interval: float = None):
+        self.breaker = breaker
+        self.interval = interval or BACKEND_HEALTH_INTERVAL
+        self.healthy = None
+        self.last_check_at = None
+        self._task = None
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                result = await api_client.check_backend_health()
+                healthy = bool(result.get('success'))
+                if healthy != self.healthy:
+                    log = logging.info if healthy else logging.warning
+                    log(f"Backend health: {result.get('message')}")
+                self.healthy = healthy
+                self.last_check_at = time.time()
+                self.breaker.record_probe(healthy)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.error(f"Backend health probe failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            'healthy': self.healthy,
+            'last_check_at': self.last_check_at,
+            'breaker': self.breaker.snapshot(),
+        }
+
+
+def is_backend_failure(api_response: Optional[Dict[str, Any]]) -> bool:
+    """Whether a failed submission points at the backend rather than the data"""
+    if not api_response or api_response.get('success'):
+        return False
+    return api_response.get('status') not in CLIENT_ERROR_STATUSES
+
+
+# Shared by the handlers and the background monitor started in main.py
+backend_breaker = CircuitBreaker()
+health_monitor = BackendHealthMonitor(backend_breaker)
+
+
+async def submit_report(report_data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Send a report unless the breaker is open, and feed the outcome back to it
+
+    Returns:
+        API response; when the breaker is open, a failure with
+        error 'circuit_open' without any network round trip
+    """
+    if not backend_breaker.allow_request():
+        return {
+            'success': False,
+            'error': 'circuit_open',
+            'message': 'Backend is unavailable, report saved locally'
+        }
+
+    api_response = await api_client.send_report(report_data)
+    if is_backend_failure(api_response):
+        backend_breaker.record_failure()
+    else:
+        # Accepted, or rejected by a backend that is up
+        backend_breaker.record_success()
+    return api_response
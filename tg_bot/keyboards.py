@@ -5,7 +5,7 @@ from aiogram.types import (
     KeyboardButton,
 )
 from aiogram.utils.keyboard import InlineKeyboardBuilder, ReplyKeyboardBuilder
-from config import REGIONS_CITIES, REPORT_TYPES
+from config import REPORT_TYPES, regions_cities
 from localization import get_text, get_region_name, get_report_type_name, LANGUAGES
 
 
@@ -36,7 +36,7 @@ def get_regions_keyboard(lang: str = "ru") -> InlineKeyboardMarkup:
     """Create keyboard for regions selection"""
     builder = InlineKeyboardBuilder()
 
-    for region in REGIONS_CITIES.keys():
+    for region in regions_cities().keys():
         localized_name = get_region_name(region, lang)
         builder.add(
             InlineKeyboardButton(text=localized_name, callback_data=f"region:{region}")
@@ -58,7 +58,7 @@ def get_cities_keyboard(region: str, lang: str = "ru") -> InlineKeyboardMarkup:
     """Create keyboard for cities selection based on region"""
     builder = InlineKeyboardBuilder()
 
-    cities = REGIONS_CITIES.get(region, [])
+    cities = regions_cities().get(region, [])
     for city in cities:
         builder.add(InlineKeyboardButton(text=city, callback_data=f"city:{city}"))
 
@@ -6,10 +6,14 @@ from aiogram.fsm.storage.memory import MemoryStorage
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
-from config import BOT_TOKEN
+from config import API_ENABLED, BOT_TOKEN
 from handlers import router as bot_router
 from api_endpoints import router as api_router
 from instances import bot
+from geocoding import geocoding_client, reverse_geocoder
+from api_client import api_client
+from health import health_monitor
+from spool import report_spool, spool_drainer
 
 # Configure logging
 logging.basicConfig(
@@ -49,6 +53,13 @@ app.include_router(api_router)
 async def startup():
     """Startup event handler"""
     logging.info("Starting bot...")
+    # One pooled backend session for the lifetime of the process
+    await api_client.open()
+    if API_ENABLED:
+        # Backend health is probed in the background, not before each submission
+        health_monitor.start()
+        # Reports the backend did not accept are resent from the local spool
+        spool_drainer.start()
     try:
         # Start polling in background
         asyncio.create_task(dp.start_polling(bot))
@@ -60,6 +71,12 @@ async def startup():
 async def shutdown():
     """Shutdown event handler"""
     logging.info("Shutting down bot...")
+    await spool_drainer.stop()
+    report_spool.close()
+    await health_monitor.stop()
+    await api_client.close()
+    await geocoding_client.close()
+    reverse_geocoder.close()
     await bot.session.close()
 
 if __name__ == "__main__":
@@ -0,0 +1,249 @@
+import asyncio
+import json
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+from typing import Dict, Any, List, Optional, Tuple
+
+from config import (
+    SPOOL_PATH,
+    SPOOL_BATCH_SIZE,
+    SPOOL_DRAIN_INTERVAL,
+    SPOOL_MAX_ATTEMPTS,
+    SPOOL_RETRY_DELAY,
+    SPOOL_RETRY_MAX_DELAY,
+)
+from health import is_backend_failure, submit_report
+
+PENDING = 'pending'
+FAILED = 'failed'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS reports (
+    rpt TEXT PRIMARY KEY,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    last_error TEXT NOT NULL DEFAULT '',
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS reports_due ON reports (status, next_attempt_at);
+CREATE TABLE IF NOT EXISTS photos (
+    rpt TEXT PRIMARY KEY,
+    data BLOB NOT NULL
+);
+"""
+
+
+class ReportSpool:
+    """Durable local queue of reports the backend did not accept
+
+    Reports are stored in SQLite (WAL) keyed by their ``rpt``, which the
+    backend uses as the document ID, so resending a report that did reach
+    the backend overwrites it instead of creating a duplicate. Photos are
+    kept as separate blobs. A delivered report is deleted together with its
+    photo, so the file only holds pending and given-up reports. Only failed
+    submissions are written here; the success path does no disk I/O.
+
+    Methods block on the database; async code calls them through
+    ``asyncio.to_thread``.
+    """
+
+    def __init__(self, path: str = None):
+        self.path = path or SPOOL_PATH
+        self._connection = None
+        self._lock = threading.Lock()
+
+    def _db(self) -> sqlite3.Connection:
+        # Caller holds self._lock
+        if self._connection is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.executescript(SCHEMA)
+            self._connection = connection
+        return self._connection
+
+    def add(self, report_data: Dict[str, Any], error: str = '') -> str:
+        """Store a report for resending; adding the same rpt again is a no-op"""
+        rpt = report_data['rpt']
+        photo = report_data.get('photo_data')
+        payload = {key: value for key, value in report_data.items() if key != 'photo_data'}
+        if isinstance(photo, str):
+            # An already encoded data URL travels in the JSON body
+            payload['photo_data'] = photo
+        now = time.time()
+
+        with self._lock:
+            db = self._db()
+            with db:
+                db.execute('BEGIN IMMEDIATE')
+                db.execute(
+                    'INSERT OR IGNORE INTO reports (rpt, payload, next_attempt_at, last_error, created_at) '
+                    'VALUES (?, ?, ?, ?, ?)',
+                    (rpt, json.dumps(payload, ensure_ascii=False), now + SPOOL_RETRY_DELAY, error or '', now),
+                )
+                if isinstance(photo, bytes) and photo:
+                    db.execute('INSERT OR IGNORE INTO photos (rpt, data) VALUES (?, ?)', (rpt, photo))
+        return rpt
+
+    def due(self, limit: int = None, now: float = None) -> List[Tuple[str, int, Dict[str, Any]]]:
+        """Pending reports whose retry time has come, oldest first, with their photos"""
+        now = time.time() if now is None else now
+        with self._lock:
+            rows = self._db().execute(
+                'SELECT r.rpt, r.attempts, r.payload, p.data FROM reports r '
+                'LEFT JOIN photos p ON p.rpt = r.rpt '
+                'WHERE r.status = ? AND r.next_attempt_at <= ? '
+                'ORDER BY r.next_attempt_at LIMIT ?',
+                (PENDING, now, limit or SPOOL_BATCH_SIZE),
+            ).fetchall()
+
+        reports = []
+        for rpt, attempts, payload, photo in rows:
+            report_data = json.loads(payload)
+            if photo is not None:
+                report_data['photo_data'] = bytes(photo)
+            reports.append((rpt, attempts, report_data))
+        return reports
+
+    def mark_sent(self, rpt: str):
+        """Forget a delivered report and its photo"""
+        with self._lock:
+            db = self._db()
+            with db:
+                db.execute('BEGIN IMMEDIATE')
+                db.execute('DELETE FROM reports WHERE rpt = ?', (rpt,))
+                db.execute('DELETE FROM photos WHERE rpt = ?', (rpt,))
+
+    def mark_failed(self, rpt: str, attempts: int, error: str, give_up: bool = False) -> str:
+        """Schedule the next attempt with exponential backoff and jitter
+
+        Returns the new status: failed once SPOOL_MAX_ATTEMPTS are used up or
+        when ``give_up`` is set.
+        """
+        attempts += 1
+        delay = min(SPOOL_RETRY_MAX_DELAY, SPOOL_RETRY_DELAY * 2 ** (attempts - 1))
+        delay *= random.uniform(0.8, 1.2)
+        status = FAILED if give_up or attempts >= SPOOL_MAX_ATTEMPTS else PENDING
+        with self._lock:
+            self._db().execute(
+                'UPDATE reports SET status = ?, attempts = ?, next_attempt_at = ?, last_error = ? '
+                'WHERE rpt = ?',
+                (status, attempts, time.time() + delay, error or '', rpt),
+            )
+        return status
+
+    def stats(self) -> Dict[str, Any]:
+        """Spool depth: reports per status, age of the oldest pending one and photo bytes"""
+        if not os.path.exists(self.path):
+            return {PENDING: 0, FAILED: 0, 'oldest_pending_age': None, 'photo_bytes': 0}
+        with self._lock:
+            db = self._db()
+            counts = dict(db.execute('SELECT status, COUNT(*) FROM reports GROUP BY status').fetchall())
+            oldest = db.execute(
+                'SELECT MIN(created_at) FROM reports WHERE status = ?', (PENDING,)
+            ).fetchone()[0]
+            photo_bytes = db.execute('SELECT COALESCE(SUM(LENGTH(data)), 0) FROM photos').fetchone()[0]
+        return {
+            PENDING: counts.get(PENDING, 0),
+            FAILED: counts.get(FAILED, 0),
+            'oldest_pending_age': round(time.time() - oldest, 1) if oldest else None,
+            'photo_bytes': photo_bytes,
+        }
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+
+class SpoolDrainer:
+    """Background task resending spooled reports every ``interval`` seconds
+
+    Reports go through health.submit_report, so nothing is sent while the
+    backend circuit breaker is open and the outcomes keep feeding it.
+    """
+
+    def __init__(self, spool: ReportSpool, interval: float = None):
+        self.spool = spool
+        self.interval = interval or SPOOL_DRAIN_INTERVAL
+        self._task = None
+        self._stats = {'rounds': 0, 'sent': 0, 'retried': 0, 'given_up': 0}
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await self.drain()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.error(f"Error draining report spool: {e}")
+            await asyncio.sleep(self.interval)
+
+    async def drain(self) -> int:
+        """Resend the reports that are due; returns how many were delivered"""
+        self._stats['rounds'] += 1
+        delivered = 0
+        reports = await asyncio.to_thread(self.spool.due)
+        for rpt, attempts, report_data in reports:
+            api_response = await submit_report(report_data)
+            if api_response.get('success'):
+                await asyncio.to_thread(self.spool.mark_sent, rpt)
+                self._stats['sent'] += 1
+                delivered += 1
+                logging.info(f"Spooled report {rpt} delivered after {attempts + 1} attempts")
+                continue
+            if api_response.get('error') == 'circuit_open':
+                # Backend is down: leave the rest for a later round
+                break
+            # A report the backend rejected as invalid will not get better
+            status = await asyncio.to_thread(
+                self.spool.mark_failed, rpt, attempts, api_response.get('message', ''),
+                not is_backend_failure(api_response),
+            )
+            if status == FAILED:
+                self._stats['given_up'] += 1
+                logging.error(f"Giving up on spooled report {rpt}: {api_response.get('message')}")
+            else:
+                self._stats['retried'] += 1
+        return delivered
+
+    def stats(self) -> Dict[str, Any]:
+        return dict(self._stats)
+
+
+# Shared by confirm_report and the drainer started in main.py
+report_spool = ReportSpool()
+spool_drainer = SpoolDrainer(report_spool)
+
+
+async def spool_report(report_data: Dict[str, Any], error: str = '') -> Optional[str]:
+    """Store a failed submission for resending; returns its rpt or None"""
+    try:
+        rpt = await asyncio.to_thread(report_spool.add, report_data, error)
+    except Exception as e:
+        logging.error(f"Error spooling report {report_data.get('rpt')}: {e}")
+        return None
+    return rpt
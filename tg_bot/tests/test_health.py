@@ -0,0 +1,83 @@
+import unittest
+from unittest import mock
+
+import health
+from health import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, is_backend_failure
+
+
+class CircuitBreakerTests(unittest.TestCase):
+    def setUp(self):
+        self.now = 1000.0
+        patcher = mock.patch.object(health.time, 'monotonic', side_effect=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.breaker = CircuitBreaker(failure_threshold=3, reset_timeout=30)
+
+    def open_breaker(self):
+        for _ in range(3):
+            self.breaker.record_failure()
+
+    def test_opens_after_threshold_failures_in_a_row(self):
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, CLOSED)
+        self.assertTrue(self.breaker.allow_request())
+
+        self.breaker.record_failure()
+
+        self.assertEqual(self.breaker.state, OPEN)
+        self.assertFalse(self.breaker.allow_request())
+        self.assertEqual(self.breaker.snapshot()['rejected'], 1)
+
+    def test_success_resets_the_failure_count(self):
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.breaker.record_success()
+        self.breaker.record_failure()
+
+        self.assertEqual(self.breaker.state, CLOSED)
+
+    def test_half_open_after_reset_timeout_lets_one_trial_through(self):
+        self.open_breaker()
+        self.now += 30
+
+        self.assertEqual(self.breaker.state, HALF_OPEN)
+        self.assertTrue(self.breaker.allow_request())
+        self.assertFalse(self.breaker.allow_request())
+
+    def test_trial_outcome_closes_or_reopens(self):
+        self.open_breaker()
+        self.now += 30
+        self.breaker.allow_request()
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, OPEN)
+
+        self.now += 30
+        self.breaker.allow_request()
+        self.breaker.record_success()
+        self.assertEqual(self.breaker.state, CLOSED)
+
+    def test_healthy_probe_half_opens_an_open_breaker(self):
+        self.open_breaker()
+
+        self.breaker.record_probe(healthy=True)
+
+        self.assertEqual(self.breaker.state, HALF_OPEN)
+
+    def test_failed_probes_open_the_breaker(self):
+        for _ in range(3):
+            self.breaker.record_probe(healthy=False)
+
+        self.assertEqual(self.breaker.state, OPEN)
+
+
+class BackendFailureTests(unittest.TestCase):
+    def test_client_errors_do_not_count_against_the_backend(self):
+        self.assertFalse(is_backend_failure({'success': False, 'status': 400}))
+        self.assertTrue(is_backend_failure({'success': False, 'status': 503}))
+        self.assertTrue(is_backend_failure({'success': False, 'error': 'timeout'}))
+        self.assertFalse(is_backend_failure({'success': True}))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import spool
+from spool import FAILED, PENDING, ReportSpool, SpoolDrainer
+
+DELIVERED = {'success': True, 'data': {'id': 'RPT-1'}}
+BACKEND_DOWN = {'success': False, 'status': 503, 'message': 'Service Unavailable'}
+REJECTED = {'success': False, 'status': 400, 'message': 'report_text is required'}
+CIRCUIT_OPEN = {'success': False, 'error': 'circuit_open', 'message': 'Backend unavailable'}
+
+
+def report(rpt, **fields):
+    return {'rpt': rpt, 'user_id': 1, 'report_text': 'Нет света на улице', **fields}
+
+
+class SpoolDrainerTests(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.spool = ReportSpool(os.path.join(directory.name, 'spool.sqlite3'))
+        self.addCleanup(self.spool.close)
+        self.drainer = SpoolDrainer(self.spool, interval=1)
+        # Every report is due right away
+        patcher = mock.patch.object(spool, 'SPOOL_RETRY_DELAY', 0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def submit(self, *responses):
+        return mock.patch.object(spool, 'submit_report', mock.AsyncMock(side_effect=responses))
+
+    async def test_delivered_report_is_deleted_with_its_photo(self):
+        self.spool.add(report('a', photo_data=b'\xff\xd8jpeg'), 'timeout')
+
+        with self.submit(DELIVERED) as submit_report:
+            self.assertEqual(await self.drainer.drain(), 1)
+
+        self.assertEqual(submit_report.call_args.args[0]['photo_data'], b'\xff\xd8jpeg')
+        stats = self.spool.stats()
+        self.assertEqual((stats[PENDING], stats[FAILED], stats['photo_bytes']), (0, 0, 0))
+        self.assertEqual(self.drainer.stats()['sent'], 1)
+
+    async def test_backend_failures_are_retried_until_max_attempts(self):
+        self.spool.add(report('a'), 'timeout')
+
+        with mock.patch.object(spool, 'SPOOL_MAX_ATTEMPTS', 2), self.submit(BACKEND_DOWN, BACKEND_DOWN):
+            await self.drainer.drain()
+            self.assertEqual(self.spool.stats()[PENDING], 1)
+            await self.drainer.drain()
+
+        self.assertEqual(self.spool.stats()[FAILED], 1)
+        self.assertEqual(self.drainer.stats()['retried'], 1)
+        self.assertEqual(self.drainer.stats()['given_up'], 1)
+        self.assertEqual(self.spool.due(), [])
+
+    async def test_rejected_report_is_given_up_at_once(self):
+        self.spool.add(report('a'), 'timeout')
+
+        with self.submit(REJECTED):
+            await self.drainer.drain()
+
+        self.assertEqual(self.spool.stats()[FAILED], 1)
+
+    async def test_open_circuit_leaves_the_rest_for_later(self):
+        self.spool.add(report('a'), 'timeout')
+        self.spool.add(report('b'), 'timeout')
+
+        with self.submit(CIRCUIT_OPEN) as submit_report:
+            self.assertEqual(await self.drainer.drain(), 0)
+
+        self.assertEqual(submit_report.call_count, 1)
+        self.assertEqual(len(self.spool.due()), 2)
+
+    async def test_adding_the_same_report_twice_keeps_one(self):
+        self.spool.add(report('a'), 'timeout')
+        self.spool.add(report('a'), 'timeout')
+
+        self.assertEqual(self.spool.stats()[PENDING], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,8 +2,7 @@ import json
 import aiofiles
 from datetime import datetime
 from typing import Dict, Any, Optional
-from geopy.geocoders import Nominatim
-from config import config_get_coordinates
+from geocoding import get_coordinates, reverse_geocoder
 from localization import get_text, get_region_name, get_report_type_name
 
 
@@ -116,9 +115,9 @@ def format_location_info(
         )
 
 
-def get_city_coordinates(address: str, city: str = "") -> Optional[Dict[str, Any]]:
+async def get_city_coordinates(address: str, city: str = "") -> Optional[Dict[str, Any]]:
     """
-    Get coordinates for a location
+    Get coordinates for a location without blocking the event loop
     Args:
         address: полный адрес или название улицы
         city: название города (опционально)
@@ -126,7 +125,7 @@ def get_city_coordinates(address: str, city: str = "") -> Optional[Dict[str, Any
     try:
         # Если передан только город без адреса
         if not address and city:
-            return config_get_coordinates(city)
+            return await get_coordinates(city)
 
         # Если передан полный адрес
         if address:
@@ -135,26 +134,29 @@ def get_city_coordinates(address: str, city: str = "") -> Optional[Dict[str, Any
                 full_address = f"{address}, {city}"
             else:
                 full_address = address
-            return config_get_coordinates(full_address)
+            return await get_coordinates(full_address)
 
         return None
     except Exception as e:
         print(f"Error in get_city_coordinates: {e}")
         # В случае ошибки возвращаем координаты города
         if city:
-            return config_get_coordinates(city)
+            return await get_coordinates(city)
         return None
 
 
-async def get_address_from_coordinates(latitude: float, longitude: float) -> str:
-    """Get address from coordinates using geocoding"""
+async def get_address_from_coordinates(latitude: float, longitude: float) -> Optional[str]:
+    """
+    Get the street address at the coordinates from Nominatim
+
+    Returns None when it is not known in time; the nearest settlement from
+    the gazetteer (config.nearest_place) is available without waiting.
+    """
     try:
-        geolocator = Nominatim(user_agent="gov_services_bot")
-        location = geolocator.reverse(f"{latitude}, {longitude}")
-        return location.address if location else "Адрес не найден"
+        return await reverse_geocoder.reverse(latitude, longitude)
     except Exception as e:
         print(f"Error getting address: {e}")
-        return "Ошибка определения адреса"
+        return None
 
 
 async def save_report_to_file(report_data: Dict[str, Any]) -> str: